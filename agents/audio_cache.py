@@ -0,0 +1,127 @@
+"""
+Audio cache
+-----------
+Content-addressed store for synthesized narration, so a rerun never pays
+ElevenLabs twice for the same text.
+
+Each clip is keyed on sha256 of the full TTS request (text, voice_id,
+model_id, voice_settings, output_format) and stored as <key>.<ext> under
+TTS_CACHE_DIR (default .cache/tts). manifest.json records size and last
+use of every clip; once the total exceeds TTS_CACHE_MB (default 512) the
+least recently used clips are deleted. Sidecar files stored with a clip
+(its word timings) share its key and are evicted with it. All manifest access happens under
+an flock so parallel narrators can share the cache.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+from typing import Dict, Optional, Sequence
+
+try:
+    from agents import metrics
+    from agents.fileio import atomic_write_json, file_lock, read_json
+except ImportError:  # run as a script from agents/
+    import metrics
+    from fileio import atomic_write_json, file_lock, read_json
+
+DEFAULT_CACHE_DIR = ".cache/tts"
+DEFAULT_CACHE_MB = 512
+
+
+def place_file(src: str, dst: str) -> None:
+    """Hard-link *src* to *dst* (copy across filesystems), replacing *dst*."""
+    tmp = os.path.join(os.path.dirname(dst) or ".", f".{os.path.basename(dst)}.link")
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+class AudioCache:
+    def __init__(self, cache_dir: str = None, max_mb: float = None):
+        self.cache_dir = cache_dir or os.getenv("TTS_CACHE_DIR", DEFAULT_CACHE_DIR)
+        self.max_bytes = int(float(max_mb or os.getenv("TTS_CACHE_MB", DEFAULT_CACHE_MB)) * 2**20)
+        self.manifest_path = os.path.join(self.cache_dir, "manifest.json")
+        self.lock_path = os.path.join(self.cache_dir, ".lock")
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(request: Dict) -> str:
+        blob = json.dumps(request, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def _load(self) -> Dict:
+        return read_json(self.manifest_path) or {"clock": 0, "entries": {}}
+
+    # ──────────────────────────────────────────────────────────────────
+    def lookup(self, key: str) -> Optional[str]:
+        """Path of the cached clip for *key*, or None on a miss."""
+        with file_lock(self.lock_path):
+            manifest = self._load()
+            entry = manifest["entries"].get(key)
+            if entry is not None:
+                path = os.path.join(self.cache_dir, entry["file"])
+                if os.path.exists(path):
+                    manifest["clock"] += 1
+                    entry["last_used"] = manifest["clock"]
+                else:
+                    del manifest["entries"][key]
+                    entry = None
+                atomic_write_json(self.manifest_path, manifest, indent=1)
+        if entry:
+            self.hits += 1
+            metrics.cache("audio", 1)
+            return path
+        self.misses += 1
+        metrics.cache("audio", 0, 1)
+        return None
+
+    def store(self, key: str, src: str, extras: Sequence[str] = ()) -> str:
+        """Add the clip at *src* under *key*; return its path in the cache.
+
+        Each existing path in *extras* is kept beside the clip, renamed from
+        <stem><suffix> to <key><suffix> (audio/a.timings.json -> <key>.timings.json).
+        """
+        stem, ext = os.path.splitext(src)
+        name = key + ext
+        path = os.path.join(self.cache_dir, name)
+        with file_lock(self.lock_path):
+            place_file(src, path)
+            extra_names = []
+            for extra in extras:
+                if extra.startswith(stem) and os.path.exists(extra):
+                    extra_names.append(key + extra[len(stem):])
+                    place_file(extra, os.path.join(self.cache_dir, extra_names[-1]))
+            manifest = self._load()
+            entries = manifest["entries"]
+            manifest["clock"] += 1
+            entries[key] = {
+                "file": name,
+                "extras": extra_names,
+                "bytes": sum(os.path.getsize(os.path.join(self.cache_dir, n))
+                             for n in [name] + extra_names),
+                "last_used": manifest["clock"],
+            }
+            total = sum(e["bytes"] for e in entries.values())
+            for victim in sorted(entries, key=lambda k: entries[k]["last_used"])[:-1]:
+                if total <= self.max_bytes:
+                    break
+                evicted = entries.pop(victim)
+                total -= evicted["bytes"]
+                for victim_name in [evicted["file"]] + evicted.get("extras", []):
+                    try:
+                        os.remove(os.path.join(self.cache_dir, victim_name))
+                    except FileNotFoundError:
+                        pass
+            atomic_write_json(self.manifest_path, manifest, indent=1)
+        return path
+
+    def stats(self) -> str:
+        return f"{self.hits} hits / {self.misses} misses"
@@ -1,15 +1,177 @@
 import os
+import re
 import json
+import time
+import asyncio
+import argparse
+import numpy as np
 import openai
-from rapidfuzz import fuzz
+from rapidfuzz import fuzz, process
 from dotenv import load_dotenv
-from typing import List, Dict
+from typing import List, Dict, Optional
+
+try:
+    from agents import metrics
+    from agents.filter_planner import Check, FilterPlanner
+    from agents.llm_cache import LLMCache, cached_chat
+    from agents.originality_index import OriginalityIndex
+    from agents.quota import QuotaGovernor, governor
+    from agents.seen_posts import SeenPosts
+    from agents.state_store import COMPLIANCE, DONE, NARRATION, REJECTED, StateStore
+    from agents.tokens import pack_by_tokens
+except ImportError:  # run as `python agents/compliance_editor.py`
+    import metrics
+    from filter_planner import Check, FilterPlanner
+    from llm_cache import LLMCache, cached_chat
+    from originality_index import OriginalityIndex
+    from quota import QuotaGovernor, governor
+    from seen_posts import SeenPosts
+    from state_store import COMPLIANCE, DONE, NARRATION, REJECTED, StateStore
+    from tokens import pack_by_tokens
 
 load_dotenv()
 
+# fuzz.ratio score (0-100) above which two stories count as near-copies,
+# i.e. an originality distance below 0.35.
+ORIGINALITY_CUTOFF = 65
+QUALITY_MODEL = "gpt-4o-mini"
+QUALITY_THRESHOLD = 70
+# Batched quality scoring: stories per request and the prompt budget for
+# them, counted with tiktoken; the reply needs ~15 tokens per story.
+QUALITY_BATCH_ITEMS = 10
+QUALITY_BATCH_TOKENS = 6_000
+QUALITY_STORY_OVERHEAD = 12  # <story id="n"> wrapper tokens
+MAX_RETRIES = 4
+# Moderation accepts a list of inputs; keep each request within the
+# endpoint's per-call item and token limits.
+MODERATION_BATCH_ITEMS = 32
+MODERATION_BATCH_TOKENS = 32_000
+# Local pre-gates: bounds loose enough to reject only stories that could
+# never make a short (empty, truncated, rambling, unreadable).
+MIN_WORDS = 10
+MAX_WORDS = 400
+MIN_READING_EASE = 10
+# Priors for the filter planner: seconds per script, share rejected, paid
+# requests per script. Moderation is free; quality scoring is one paid call
+# per batch.
+CHECKS = [
+    Check('length', 1e-5, 0.01),
+    Check('readability', 1e-4, 0.01),
+    Check('originality', 1e-3, 0.05),
+    Check('history', 2e-3, 0.05),
+    Check('moderation', 0.01, 0.02),
+    Check('quality', 0.1, 0.3, paid=1.0 / QUALITY_BATCH_ITEMS),
+]
+CHECK_NAMES = [check.name for check in CHECKS]
+
+
+class AdaptiveLimiter:
+    """Async concurrency gate that narrows on 429s and widens on success.
+
+    A rate-limit response halves the number of in-flight requests and pauses
+    new ones for the server's Retry-After; every `limit` successes in a row
+    let one more request back in, up to the configured maximum.
+    """
+
+    def __init__(self, limit: int):
+        self.max_limit = max(1, limit)
+        self.limit = self.max_limit
+        self.active = 0
+        self.successes = 0
+        self.pause_until = 0.0
+        self.cond = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self.cond:
+            await self.cond.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+        delay = self.pause_until - asyncio.get_running_loop().time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return self
+
+    async def __aexit__(self, *exc):
+        async with self.cond:
+            self.active -= 1
+            self.cond.notify_all()
+
+    def throttle(self, retry_after: float):
+        self.limit = max(1, self.limit // 2)
+        self.successes = 0
+        resume = asyncio.get_running_loop().time() + retry_after
+        self.pause_until = max(self.pause_until, resume)
+
+    def success(self):
+        self.successes += 1
+        if self.successes >= self.limit and self.limit < self.max_limit:
+            self.limit += 1
+            self.successes = 0
+
+
+def flagged_categories(result) -> List[str]:
+    """Names of the moderation categories that fired for one result."""
+    categories = result.categories
+    if hasattr(categories, 'model_dump'):
+        categories = categories.model_dump(by_alias=True)
+    elif not isinstance(categories, dict):
+        categories = vars(categories)
+    return sorted(name for name, hit in categories.items() if hit)
+
+
+def syllables(word: str) -> int:
+    groups = re.findall(r'[aeiouy]+', word.lower())
+    count = len(groups) - (1 if word.lower().endswith('e') and len(groups) > 1 else 0)
+    return max(1, count)
+
+
+def reading_ease(text: str) -> float:
+    """Flesch reading ease: ~60-80 is plain conversational English."""
+    words = re.findall(r"[A-Za-z']+", text)
+    if not words:
+        return 0.0
+    sentences = max(1, len(re.findall(r'[.!?]+', text)))
+    return (206.835 - 1.015 * len(words) / sentences
+            - 84.6 * sum(syllables(w) for w in words) / len(words))
+
+
+class Screening:
+    """Scripts of one compliance run plus every check verdict known so far."""
+
+    def __init__(self, scripts: List[Dict] = None):
+        self.scripts: List[Dict] = list(scripts or [])
+        self.verdicts: Dict[str, Dict[int, bool]] = {}
+        self.earlier: Dict[int, List[int]] = {}  # near-copies among earlier scripts
+        self.anchor: Dict[int, bool] = {}  # counts for the keep-first rule
+
+    def add(self, script: Dict) -> int:
+        self.scripts.append(script)
+        return len(self.scripts) - 1
+
+    def add_accepted(self, script: Dict) -> int:
+        """Add a script accepted on an earlier run: every check passed."""
+        i = self.add(script)
+        for name in CHECK_NAMES:
+            self.verdicts.setdefault(name, {})[i] = True
+        self.earlier[i] = []
+        self.anchor[i] = True
+        return i
+
+
 class ComplianceEditor:
-    def __init__(self):
-        self.openai_client = openai.OpenAI(api_key=os.getenv('OPENAI_KEY'))
+    def __init__(self, use_history: bool = True, concurrency: int = 1,
+                 request_timeout: float = 30.0, use_cache: bool = True,
+                 use_state: bool = True):
+        self.quota = governor()
+        self.openai_client = self.quota.openai_client(api_key=os.getenv('OPENAI_KEY'))
+        self.llm_cache = LLMCache() if use_cache else None
+        self.state = StateStore() if use_state else None
+        self.seen = SeenPosts() if use_state else None
+        self.history = OriginalityIndex(cutoff=ORIGINALITY_CUTOFF) if use_history else None
+        self.concurrency = concurrency
+        self.request_timeout = request_timeout
+        self.rejections: Dict[str, List[str]] = {}
+        self.judged: set = set()  # ids screened by this editor, not replayed
+        self.planner = FilterPlanner(CHECKS)
         
     def read_scripts(self) -> List[Dict]:
         """Read scripts from JSON file."""
@@ -20,32 +182,21 @@ class ComplianceEditor:
             print("scripts.json not found. Run story_writer.py first.")
             return []
     
-    def check_originality(self, scripts: List[Dict]) -> List[Dict]:
-        """Check originality using Levenshtein distance."""
-        filtered_scripts = []
-        
-        for i, script in enumerate(scripts):
-            is_original = True
-            current_story = script['story']
-            
-            for j, other_script in enumerate(scripts):
-                if i != j:
-                    other_story = other_script['story']
-                    similarity = fuzz.ratio(current_story, other_story) / 100.0
-                    
-                    if similarity > 0.65:  # 1 - 0.35 = 0.65
-                        is_original = False
-                        break
-            
-            if is_original:
-                filtered_scripts.append(script)
+    def check_history(self, scripts: List[Dict]) -> List[Dict]:
+        """Drop scripts that near-copy a story published on an earlier run."""
+        if self.history is None:
+            return scripts
+        fresh = []
+        for script in scripts:
+            match = self.history.find_duplicate(script['story'])
+            if match is None:
+                fresh.append(script)
             else:
-                print(f"Script {i+1} filtered out due to low originality")
-        
-        return filtered_scripts
-    
-    def check_quality(self, script: Dict) -> int:
-        """Check story quality using GPT and return score 0-100."""
+                print(f"Script filtered out as a near-copy of published story {match}: {script['title'][:50]}...")
+        return fresh
+
+    @staticmethod
+    def quality_messages(script: Dict) -> List[Dict]:
         prompt = f"""
         Rate this story on a scale of 0-100 based on:
         1. Engagement potential (hooks the audience)
@@ -58,39 +209,498 @@ class ComplianceEditor:
         
         Respond with only a number between 0-100.
         """
+        return [
+            {"role": "system", "content": "You are a content quality evaluator for viral short-form videos."},
+            {"role": "user", "content": prompt}
+        ]
+
+    @staticmethod
+    def batch_quality_messages(scripts: List[Dict]) -> List[Dict]:
+        stories = "\n".join(
+            f'<story id="{n}">{script["story"]}</story>' for n, script in enumerate(scripts, 1)
+        )
+        prompt = f"""
+        Rate each story below on a scale of 0-100 based on:
+        1. Engagement potential (hooks the audience)
+        2. Narrative structure (clear beginning, middle, end)
+        3. Emotional impact
+        4. Clarity and readability
+        5. Appropriateness for short-form video content
+        
+        Score every story on its own merits.
+        
+        {stories}
         
+        Respond with only JSON: {{"scores": [{{"id": <story id>, "score": <0-100>}}, ...]}}
+        with exactly one entry per story.
+        """
+        return [
+            {"role": "system", "content": "You are a content quality evaluator for viral short-form videos."},
+            {"role": "user", "content": prompt}
+        ]
+
+    def batch_quality_request(self, scripts: List[Dict]) -> Dict:
+        return dict(model=QUALITY_MODEL, messages=self.batch_quality_messages(scripts),
+                    max_tokens=20 + 15 * len(scripts), temperature=0.3,
+                    response_format={"type": "json_object"})
+
+    @staticmethod
+    def parse_batch_scores(text: str, count: int) -> List[Optional[int]]:
+        """Scores by story position; None for any entry that is missing or malformed."""
+        scores: List[Optional[int]] = [None] * count
         try:
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are a content quality evaluator for viral short-form videos."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=10,
-                temperature=0.3
-            )
-            
-            score_text = response.choices[0].message.content.strip()
-            score = int(''.join(filter(str.isdigit, score_text)))
-            return min(max(score, 0), 100)  # Clamp between 0-100
+            items = json.loads(text)["scores"]
+        except (ValueError, KeyError, TypeError):
+            return scores
+        if not isinstance(items, list):
+            return scores
+        if len(items) != count:
+            print(f"Quality batch returned {len(items)} scores for {count} stories")
+        for item in items:
+            try:
+                idx, score = int(item["id"]) - 1, int(item["score"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if 0 <= idx < count and scores[idx] is None:
+                scores[idx] = min(max(score, 0), 100)
+        return scores
+
+    def quality_batches(self, scripts: List[Dict]) -> List[List[int]]:
+        return list(pack_by_tokens([s['story'] for s in scripts], QUALITY_BATCH_TOKENS,
+                                   QUALITY_BATCH_ITEMS, overhead=QUALITY_STORY_OVERHEAD))
+
+    def _remember_batch(self, key: Optional[str], text: str, scores: List[Optional[int]]):
+        # A reply that didn't fully parse is not worth replaying.
+        if key and None not in scores:
+            self.llm_cache.put(key, QUALITY_MODEL, text)
+
+    def score_batch(self, scripts: List[Dict]) -> List[int]:
+        """Quality scores for *scripts*, several stories per request.
+
+        Entries a batch reply fails to cover are rescored one by one.
+        """
+        scores: List[Optional[int]] = [None] * len(scripts)
+        for batch in self.quality_batches(scripts):
+            request = self.batch_quality_request([scripts[i] for i in batch])
+            key = LLMCache.key(**request) if self.llm_cache is not None else None
+            text = self.llm_cache.get(key) if key else None
+            parsed = self.parse_batch_scores(text, len(batch)) if text is not None else None
+            if parsed is None:
+                try:
+                    with metrics.call("openai", "chat"):
+                        response = self.openai_client.chat.completions.create(**request)
+                    metrics.usage("openai", "chat", response)
+                    text = response.choices[0].message.content
+                except Exception as e:
+                    print(f"Error evaluating quality batch: {e}")
+                    text = ""
+                parsed = self.parse_batch_scores(text, len(batch))
+                self._remember_batch(key, text, parsed)
+            for i, score in zip(batch, parsed):
+                scores[i] = score if score is not None else self.check_quality(scripts[i])
+        return scores
+
+    async def ascore_batch(self, client: openai.AsyncOpenAI, limiter: AdaptiveLimiter,
+                           scripts: List[Dict]) -> List[int]:
+        scores: List[Optional[int]] = [None] * len(scripts)
+
+        async def score(batch: List[int]):
+            request = self.batch_quality_request([scripts[i] for i in batch])
+            key = LLMCache.key(**request) if self.llm_cache is not None else None
+            text = self.llm_cache.get(key) if key else None
+            parsed = self.parse_batch_scores(text, len(batch)) if text is not None else None
+            if parsed is None:
+                try:
+                    response = await self._call(
+                        limiter, lambda: client.chat.completions.create(**request), "chat"
+                    )
+                    text = response.choices[0].message.content
+                except Exception as e:
+                    print(f"Error evaluating quality batch: {e!r}")
+                    text = ""
+                parsed = self.parse_batch_scores(text, len(batch))
+                self._remember_batch(key, text, parsed)
+            retry = [i for i, p in zip(batch, parsed) if p is None]
+            for i, p in zip(batch, parsed):
+                scores[i] = p
+            for i, p in zip(retry, await asyncio.gather(
+                    *(self.acheck_quality(client, limiter, scripts[i]) for i in retry))):
+                scores[i] = p
+
+        await asyncio.gather(*(score(batch) for batch in self.quality_batches(scripts)))
+        return scores
+
+    @staticmethod
+    def parse_score(score_text: str) -> int:
+        score = int(''.join(filter(str.isdigit, score_text.strip())))
+        return min(max(score, 0), 100)  # Clamp between 0-100
+
+    def quality_request(self, script: Dict) -> Dict:
+        return dict(model=QUALITY_MODEL, messages=self.quality_messages(script),
+                    max_tokens=10, temperature=0.3)
+
+    def check_quality(self, script: Dict, use_cache: bool = True) -> int:
+        """Check story quality using GPT and return score 0-100."""
+        try:
+            text = cached_chat(self.openai_client, self.llm_cache, use_cache,
+                               **self.quality_request(script))
+            return self.parse_score(text)
             
         except Exception as e:
             print(f"Error evaluating quality: {e}")
             return 50  # Default score if evaluation fails
     
-    def moderate_content(self, script: Dict) -> bool:
-        """Check if content passes moderation guidelines."""
+    def moderate_batch(self, scripts: List[Dict]) -> List[bool]:
+        """Moderate all scripts in as few requests as the endpoint allows.
+
+        Returns one verdict per script, in order. Categories behind each
+        rejection are recorded in self.rejections by script id.
+        """
+        verdicts = [True] * len(scripts)
+        stories = [script['story'] for script in scripts]
+        for batch in pack_by_tokens(stories, MODERATION_BATCH_TOKENS, MODERATION_BATCH_ITEMS):
+            self._moderate_chunk(scripts, batch, verdicts)
+        return verdicts
+
+    def _moderate_chunk(self, scripts: List[Dict], idxs: List[int], verdicts: List[bool]):
         try:
-            response = self.openai_client.moderations.create(
-                input=script['story']
+            with metrics.call("openai", "moderation"):
+                response = self.openai_client.moderations.create(
+                    input=[scripts[i]['story'] for i in idxs]
+                )
+            self._apply_moderation(scripts, idxs, response.results, verdicts)
+        except Exception as e:
+            if len(idxs) == 1:
+                print(f"Error in moderation check: {e}")
+                return  # Default to safe if check fails
+            # Oversized or malformed batch: split it and try each half.
+            mid = len(idxs) // 2
+            self._moderate_chunk(scripts, idxs[:mid], verdicts)
+            self._moderate_chunk(scripts, idxs[mid:], verdicts)
+
+    def _apply_moderation(self, scripts: List[Dict], idxs: List[int], results,
+                          verdicts: List[bool]):
+        if len(results) != len(idxs):
+            raise ValueError(f"moderation returned {len(results)} results for {len(idxs)} inputs")
+        for i, result in zip(idxs, results):
+            verdicts[i] = not result.flagged
+            if result.flagged:
+                script = scripts[i]
+                self.rejections[script.get('id', str(i))] = flagged_categories(result)
+
+    # ── async mode ────────────────────────────────────────────────────
+    async def _call(self, limiter: AdaptiveLimiter, make_request, op: str):
+        """Run one API request under the limiter with timeout and 429 backoff."""
+        for attempt in range(MAX_RETRIES):
+            if attempt:
+                metrics.count("retries", provider="openai", op=op)
+            async with limiter:
+                try:
+                    with metrics.call("openai", op):
+                        result = await asyncio.wait_for(make_request(), self.request_timeout)
+                except openai.RateLimitError as e:
+                    # The client's response hook has counted the 429.
+                    response = getattr(e, 'response', None)
+                    wait = QuotaGovernor.retry_delay(response.headers if response is not None else None, attempt)
+                    print(f"Rate limit hit. Narrowing to {max(1, limiter.limit // 2)} in flight, retry in {wait:.1f}s")
+                    limiter.throttle(wait)
+                    continue
+                limiter.success()
+                metrics.usage("openai", op, result)
+                return result
+        raise RuntimeError(f"still rate limited after {MAX_RETRIES} attempts")
+
+    async def amoderate_batch(self, client: openai.AsyncOpenAI,
+                              limiter: AdaptiveLimiter, scripts: List[Dict]) -> List[bool]:
+        verdicts = [True] * len(scripts)
+        stories = [script['story'] for script in scripts]
+        await asyncio.gather(*(
+            self._amoderate_chunk(client, limiter, scripts, batch, verdicts)
+            for batch in pack_by_tokens(stories, MODERATION_BATCH_TOKENS, MODERATION_BATCH_ITEMS)
+        ))
+        return verdicts
+
+    async def _amoderate_chunk(self, client: openai.AsyncOpenAI, limiter: AdaptiveLimiter,
+                               scripts: List[Dict], idxs: List[int], verdicts: List[bool]):
+        try:
+            response = await self._call(
+                limiter,
+                lambda: client.moderations.create(input=[scripts[i]['story'] for i in idxs]),
+                "moderation",
             )
-            
-            return not response.results[0].flagged
-            
+            self._apply_moderation(scripts, idxs, response.results, verdicts)
         except Exception as e:
-            print(f"Error in moderation check: {e}")
-            return True  # Default to safe if check fails
-    
+            if len(idxs) == 1:
+                print(f"Error in moderation check: {e!r}")
+                return  # Default to safe if check fails
+            mid = len(idxs) // 2
+            await asyncio.gather(
+                self._amoderate_chunk(client, limiter, scripts, idxs[:mid], verdicts),
+                self._amoderate_chunk(client, limiter, scripts, idxs[mid:], verdicts),
+            )
+
+    async def acheck_quality(self, client: openai.AsyncOpenAI,
+                             limiter: AdaptiveLimiter, script: Dict) -> int:
+        request = self.quality_request(script)
+        key = LLMCache.key(**request) if self.llm_cache is not None else None
+        cached = self.llm_cache.get(key) if key else None
+        if cached is not None:
+            return self.parse_score(cached)
+        try:
+            response = await self._call(
+                limiter, lambda: client.chat.completions.create(**request), "chat"
+            )
+            text = response.choices[0].message.content
+            if key:
+                self.llm_cache.put(key, QUALITY_MODEL, text)
+            return self.parse_score(text)
+        except Exception as e:
+            print(f"Error evaluating quality: {e!r}")
+            return 50  # Default score if evaluation fails
+
+    async def _run_gates_async(self, scripts: List[Dict]):
+        """Concurrent moderation/quality; gather() keeps results in script order.
+
+        The planned checks run on a worker thread; each remote batch they
+        ask for is run on this loop, under one limiter.
+        """
+        client = self.quota.async_openai_client(
+            api_key=os.getenv('OPENAI_KEY'), max_retries=0, timeout=self.request_timeout
+        )
+        limiter = AdaptiveLimiter(self.concurrency)
+        loop = asyncio.get_running_loop()
+
+        def on_loop(gate):
+            return lambda batch: asyncio.run_coroutine_threadsafe(gate(client, limiter, batch), loop).result()
+
+        screening = Screening(scripts)
+        try:
+            kept = await asyncio.to_thread(self._filter, screening, range(len(scripts)),
+                                           on_loop(self.amoderate_batch), on_loop(self.ascore_batch))
+        finally:
+            await client.close()
+        return [scripts[i] for i in kept]
+
+    @metrics.staged("compliance")
+    def _run_gates(self, scripts: List[Dict]) -> List[Dict]:
+        screening = Screening(scripts)
+        kept = self._filter(screening, range(len(scripts)))
+        return [scripts[i] for i in kept]
+
+    # ── gates ─────────────────────────────────────────────────────────
+    def check_names(self) -> List[str]:
+        return [n for n in CHECK_NAMES if n != 'history' or self.history is not None]
+
+    def _filter(self, screening: 'Screening', idxs, moderate=None, score=None) -> List[int]:
+        """Run the planned checks over screening.scripts[idxs]; return survivors.
+
+        Each check sees only the scripts that passed every earlier one.
+        The remote checks call *moderate* (scripts → verdicts) and *score*
+        (scripts → quality scores), by default on the synchronous client.
+        """
+        moderate = moderate or self.moderate_batch
+        score = score or self.score_batch
+        alive = list(idxs)
+        for name in self.planner.order(self.check_names()):
+            if not alive:
+                break
+            started = time.perf_counter()
+            verdicts = self._evaluate(name, screening, alive, moderate, score)
+            rejected = [i for i, ok in zip(alive, verdicts) if not ok]
+            self.planner.record(name, len(alive), len(rejected), time.perf_counter() - started)
+            for i in rejected:
+                self._explain(name, screening.scripts[i])
+            alive = [i for i, ok in zip(alive, verdicts) if ok]
+        return alive
+
+    def _evaluate(self, name: str, screening: 'Screening', idxs: List[int],
+                  moderate, score) -> List[bool]:
+        known = screening.verdicts.setdefault(name, {})
+        missing = [i for i in idxs if i not in known]
+        if missing:
+            scripts = [screening.scripts[i] for i in missing]
+            if name == 'length':
+                fresh = [MIN_WORDS <= len(s['story'].split()) <= MAX_WORDS for s in scripts]
+            elif name == 'readability':
+                fresh = [reading_ease(s['story']) >= MIN_READING_EASE for s in scripts]
+            elif name == 'history':
+                fresh = [s in self.check_history([s]) for s in scripts]
+            elif name == 'originality':
+                fresh = self._originality(screening, missing, moderate, score)
+            elif name == 'moderation':
+                fresh = moderate(scripts)
+            else:
+                fresh = self._quality(scripts, score)
+            known.update(zip(missing, fresh))
+        return [known[i] for i in idxs]
+
+    def _quality(self, scripts: List[Dict], score) -> List[bool]:
+        scores = score(scripts)
+        for script, value in zip(scripts, scores):
+            script['quality_score'] = value
+        return [value >= QUALITY_THRESHOLD for value in scores]
+
+    def _originality(self, screening: 'Screening', idxs: List[int],
+                     moderate, score) -> List[bool]:
+        """Keep-first near-duplicate rule, independent of where it is planned.
+
+        A script is rejected when it is a near-copy of an earlier script that
+        passed moderation and was not itself a near-copy. When originality
+        runs before moderation, only those earlier scripts that some
+        candidate resembles are moderated (in one batch) to settle this.
+        """
+        stories = [s['story'] for s in screening.scripts]
+        needed, wave = set(idxs), [i for i in idxs if i not in screening.earlier]
+        while wave:
+            if max(wave) == 0:
+                screening.earlier[0] = []
+                break
+            similar = process.cdist(
+                [stories[i] for i in wave],
+                stories[:max(wave)],
+                scorer=fuzz.ratio,
+                score_cutoff=ORIGINALITY_CUTOFF,
+                dtype=np.float32,
+                workers=-1,
+            ) > ORIGINALITY_CUTOFF
+            for row, i in enumerate(wave):
+                screening.earlier[i] = np.flatnonzero(similar[row, :i]).tolist()
+            found = {j for i in wave for j in screening.earlier[i]} - needed
+            needed |= found
+            wave = [j for j in found if j not in screening.earlier]
+        anchors = sorted({j for i in needed for j in screening.earlier[i]})
+        if anchors:
+            self._evaluate('moderation', screening, anchors, moderate, score)
+        moderation = screening.verdicts.get('moderation', {})
+        for j in anchors:
+            if j not in screening.anchor:
+                screening.anchor[j] = moderation[j] and not any(
+                    screening.anchor[k] for k in screening.earlier[j]
+                )
+        return [not any(screening.anchor[j] for j in screening.earlier[i]) for i in idxs]
+
+    def _explain(self, name: str, script: Dict):
+        title = script['title'][:50]
+        if name == 'length':
+            print(f"Script filtered out due to length ({len(script['story'].split())} words): {title}...")
+        elif name == 'readability':
+            print(f"Script filtered out due to readability (Flesch {reading_ease(script['story']):.0f}): {title}...")
+        elif name == 'moderation':
+            reasons = ', '.join(self.rejections.get(script.get('id'), [])) or 'flagged'
+            print(f"Script filtered out due to moderation ({reasons}): {title}...")
+        elif name == 'originality':
+            print(f"Script filtered out due to low originality: {title}...")
+        elif name == 'quality':
+            print(f"Script filtered out due to low quality ({script.get('quality_score')}): {title}...")
+        # history prints its own message with the matching story id
+
+    def report_checks(self):
+        """Print per-check pass rates and time, and persist them for planning."""
+        if self.planner.run:
+            print(self.planner.report())
+        self.planner.save()
+
+    def published(self, post_id: str) -> bool:
+        """True once a post was narrated on an earlier run, i.e. already made into a video."""
+        return self.state is not None and self.state.status(post_id, NARRATION) == DONE
+
+    def rejected(self, post_id: str) -> bool:
+        """True if the post's stored story was rejected on an earlier run."""
+        record = self.state.get(post_id) if self.state is not None else None
+        return bool(record and 'story' in record) and self.verdict(record) == REJECTED
+
+    def verdict(self, script: Dict) -> Optional[str]:
+        """Compliance status recorded for this exact story, if any."""
+        if self.state is None:
+            return None
+        return self.state.status(script['id'], COMPLIANCE, script['story'])
+
+    def screen(self, script: Dict, screening: 'Screening') -> bool:
+        """Run the planned checks on one script as it arrives (streaming mode)."""
+        return self.screen_batch([script], screening)[0]
+
+    @metrics.staged("compliance")
+    def screen_batch(self, scripts: List[Dict], screening: 'Screening') -> List[bool]:
+        """Screen scripts that arrived together, in order; one verdict each.
+
+        *screening* collects every script of this run, so the keep-first
+        originality rule can look back at them. The scripts share one pass
+        of every check, so a group costs one moderation request instead of
+        one per script. A verdict already recorded in the state store for
+        the same story text is replayed without any API call, unless the
+        post has been published since: then it is skipped.
+        """
+        verdicts: List[bool] = []
+        fresh: Dict[int, int] = {}  # screening index → position in *scripts*
+        for k, script in enumerate(scripts):
+            verdict = self.verdict(script)
+            if self.published(script['id']):
+                print(f"Skipping already published post: {script['title'][:50]}...")
+                verdicts.append(False)
+            elif verdict == DONE:
+                script['quality_score'] = self.state.get(script['id']).get('quality_score')
+                screening.add_accepted(script)
+                verdicts.append(True)
+            elif verdict == REJECTED:
+                verdicts.append(False)
+            else:
+                fresh[screening.add(script)] = k
+                verdicts.append(False)
+        if fresh:
+            self.judged.update(scripts[k]['id'] for k in fresh.values())
+            for i in self._filter(screening, list(fresh)):
+                verdicts[fresh[i]] = True
+            self.record_verdicts([scripts[k] for k in fresh.values()],
+                                 [scripts[k] for k in fresh.values() if verdicts[k]])
+        return verdicts
+
+    def split_judged(self, scripts: List[Dict]):
+        """(scripts still to screen, ids accepted on an earlier run but not yet narrated).
+
+        Scripts rejected on an earlier run, and posts already published,
+        are dropped from both. A story rewritten since its verdict is
+        screened again.
+        """
+        if self.state is None:
+            return scripts, {}
+        todo, accepted = [], {}
+        for script in scripts:
+            verdict = self.verdict(script)
+            if self.published(script['id']):
+                print(f"Skipping already published post: {script['title'][:50]}...")
+            elif verdict == DONE:
+                accepted[script['id']] = self.state.get(script['id']).get('quality_score')
+            elif verdict is None:
+                todo.append(script)
+        return todo, accepted
+
+    def record_verdicts(self, screened: List[Dict], passed: List[Dict]):
+        """Commit the compliance verdict of every screened script.
+
+        The posts are then used: an incremental scout won't offer them again.
+        """
+        if self.state is None:
+            return
+        self.seen.mark_used(script['id'] for script in screened)
+        passed_ids = {script['id'] for script in passed}
+        for script in screened:
+            if script['id'] in passed_ids:
+                self.state.complete(script['id'], COMPLIANCE,
+                                    {'quality_score': script.get('quality_score')},
+                                    text=script['story'])
+            else:
+                fields = {'rejected_for': self.rejections[script['id']]} if script['id'] in self.rejections else {}
+                self.state.complete(script['id'], COMPLIANCE, fields, status=REJECTED,
+                                    text=script['story'])
+
+    def record_published(self, scripts: List[Dict]):
+        """Add accepted scripts to the historical originality index."""
+        if self.history is None:
+            return
+        for script in scripts:
+            self.history.add(script['id'], script['story'])
+        print(f"Originality index now holds {len(self.history)} published stories")
+
     def save_clean_scripts(self, scripts: List[Dict]):
         """Save clean scripts to JSON file."""
         with open('clean.json', 'w', encoding='utf-8') as jsonfile:
@@ -105,39 +715,43 @@ class ComplianceEditor:
             print("No scripts found. Exiting.")
             return
         
-        print(f"Processing {len(scripts)} scripts...")
+        todo, accepted = self.split_judged(scripts)
+        print(f"Processing {len(todo)} scripts ({len(accepted)} already accepted on an earlier run)...")
         
         print("Running moderation checks...")
-        moderated_scripts = []
+        if not todo:
+            passed = []
+        elif self.concurrency > 1:
+            passed = asyncio.run(self._run_gates_async(todo))
+        else:
+            passed = self._run_gates(todo)
+        self.record_verdicts(todo, passed)
         for script in scripts:
-            if self.moderate_content(script):
-                moderated_scripts.append(script)
-            else:
-                print(f"Script filtered out due to moderation: {script['title'][:50]}...")
-        
-        print(f"{len(moderated_scripts)} scripts passed moderation")
-        
-        print("Checking originality...")
-        original_scripts = self.check_originality(moderated_scripts)
-        print(f"{len(original_scripts)} scripts passed originality check")
-        
-        print("Evaluating quality...")
-        quality_scripts = []
-        for script in original_scripts:
-            quality_score = self.check_quality(script)
-            script['quality_score'] = quality_score
-            
-            if quality_score >= 70:
-                quality_scripts.append(script)
-            else:
-                print(f"Script filtered out due to low quality ({quality_score}): {script['title'][:50]}...")
-        
-        print(f"{len(quality_scripts)} scripts passed quality check")
+            if script['id'] in accepted:
+                script['quality_score'] = accepted[script['id']]
+        passed_ids = set(accepted) | {script['id'] for script in passed}
+        quality_scripts = [script for script in scripts if script['id'] in passed_ids]
         
         print("Saving clean scripts...")
         self.save_clean_scripts(quality_scripts)
+        self.record_published(quality_scripts)
+        self.report_checks()
+        if self.llm_cache is not None:
+            print(f"LLM cache: {self.llm_cache.stats()}")
         print(f"Compliance editing complete! {len(quality_scripts)} clean scripts saved.")
 
 if __name__ == "__main__":
-    editor = ComplianceEditor()
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--concurrency", type=int, default=8,
+                    help="max OpenAI requests in flight (1 = serial)")
+    ap.add_argument("--timeout", type=float, default=30.0,
+                    help="per-request timeout in seconds")
+    ap.add_argument("--fresh", action="store_true",
+                    help="re-score quality instead of replaying cached LLM responses")
+    ap.add_argument("--no-state", action="store_true",
+                    help="re-screen scripts that already have a verdict in the state store")
+    args = ap.parse_args()
+
+    editor = ComplianceEditor(concurrency=args.concurrency, request_timeout=args.timeout,
+                              use_cache=not args.fresh, use_state=not args.no_state)
     editor.run()
@@ -0,0 +1,142 @@
+"""
+Embedding cache
+---------------
+Content-addressed, on-disk cache for embedding vectors.
+
+Layout (one pair of files per model under EMBED_CACHE_DIR):
+
+    <model>.f32        float32 matrix, one row per slot, memory-mapped
+    <model>.idx.json   {"dim", "capacity", "clock", "entries": {key: [slot, last_used]}}
+
+Keys are sha256(model + text). The vector file is sized once from the
+configured cap (EMBED_CACHE_MB, default 64) and rows are recycled with LRU
+eviction when it is full. All access happens under an flock on
+<model>.lock, so concurrent agent processes can share one cache.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from agents import metrics
+    from agents.fileio import atomic_write_json, file_lock, read_json
+except ImportError:  # run as a script from agents/
+    import metrics
+    from fileio import atomic_write_json, file_lock, read_json
+
+DEFAULT_CACHE_DIR = ".cache/embeddings"
+DEFAULT_CACHE_MB = 64
+
+
+class EmbeddingCache:
+    def __init__(self, model: str, cache_dir: str = None, max_mb: float = None):
+        self.model = model
+        self.cache_dir = cache_dir or os.getenv("EMBED_CACHE_DIR", DEFAULT_CACHE_DIR)
+        self.max_bytes = int(
+            float(max_mb or os.getenv("EMBED_CACHE_MB", DEFAULT_CACHE_MB)) * 2**20
+        )
+        safe = model.replace("/", "_")
+        self.vec_path = os.path.join(self.cache_dir, f"{safe}.f32")
+        self.idx_path = os.path.join(self.cache_dir, f"{safe}.idx.json")
+        self.lock_path = os.path.join(self.cache_dir, f"{safe}.lock")
+        self.hits = 0
+        self.misses = 0
+
+    # ──────────────────────────────────────────────────────────────────
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{text}".encode("utf-8")).hexdigest()
+
+    def _load_index(self) -> Dict:
+        return read_json(self.idx_path) or {"dim": 0, "capacity": 0, "clock": 0, "entries": {}}
+
+    def _vectors(self, index: Dict, mode: str) -> np.memmap:
+        return np.memmap(
+            self.vec_path, dtype=np.float32, mode=mode,
+            shape=(index["capacity"], index["dim"]),
+        )
+
+    # ──────────────────────────────────────────────────────────────────
+    def get_many(self, texts: Sequence[str]) -> Tuple[Dict[int, np.ndarray], List[int]]:
+        """Return ({position: vector} for hits, [positions] of misses)."""
+        found: Dict[int, np.ndarray] = {}
+        missing: List[int] = []
+        with file_lock(self.lock_path):
+            index = self._load_index()
+            entries = index["entries"]
+            if not entries or not os.path.exists(self.vec_path):
+                missing = list(range(len(texts)))
+            else:
+                vectors = self._vectors(index, "r")
+                for i, text in enumerate(texts):
+                    entry = entries.get(self.key(text))
+                    if entry is None:
+                        missing.append(i)
+                        continue
+                    found[i] = np.array(vectors[entry[0]])
+                    index["clock"] += 1
+                    entry[1] = index["clock"]
+                del vectors
+                if found:
+                    atomic_write_json(self.idx_path, index)
+        self.hits += len(found)
+        self.misses += len(missing)
+        metrics.cache("embedding", len(found), len(missing))
+        return found, missing
+
+    def put_many(self, texts: Sequence[str], vectors: np.ndarray) -> None:
+        if not len(texts):
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with file_lock(self.lock_path):
+            index = self._load_index()
+            if not index["dim"] or not os.path.exists(self.vec_path):
+                index = {"dim": 0, "capacity": 0, "clock": 0, "entries": {}}
+            entries = index["entries"]
+            if not index["dim"]:
+                index["dim"] = int(vectors.shape[1])
+                index["capacity"] = max(1, self.max_bytes // (index["dim"] * 4))
+                with open(self.vec_path, "wb") as f:
+                    f.truncate(index["capacity"] * index["dim"] * 4)
+            if vectors.shape[1] != index["dim"]:
+                raise ValueError(
+                    f"embedding dim {vectors.shape[1]} does not match cache dim {index['dim']}"
+                )
+
+            new = {}
+            for text, vec in zip(texts, vectors):
+                key = self.key(text)
+                if key not in entries:
+                    new[key] = vec
+            new_items = list(new.items())[: index["capacity"]]
+            if not new_items:
+                return
+
+            # LRU: recycle the least recently used slots once the file is full.
+            # Evicted keys are dropped from the index before their rows are
+            # overwritten, so a crash can never map a key to the wrong vector.
+            used = {entry[0] for entry in entries.values()}
+            free = [s for s in range(index["capacity"]) if s not in used][: len(new_items)]
+            short = len(new_items) - len(free)
+            if short > 0:
+                victims = sorted(entries, key=lambda k: entries[k][1])[:short]
+                for k in victims:
+                    free.append(entries.pop(k)[0])
+                atomic_write_json(self.idx_path, index)
+
+            mm = self._vectors(index, "r+")
+            for (key, vec), slot in zip(new_items, free):
+                mm[slot] = vec
+                index["clock"] += 1
+                entries[key] = [slot, index["clock"]]
+            mm.flush()
+            del mm
+            atomic_write_json(self.idx_path, index)
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        rate = 100.0 * self.hits / total if total else 0.0
+        return f"{self.hits} hits / {self.misses} misses ({rate:.0f}% hit rate)"
@@ -0,0 +1,62 @@
+"""
+File I/O helpers
+----------------
+Advisory file locks and atomic writes shared by the on-disk caches, so
+several agent processes (e.g. parallel `make short` runs) can read and
+write the same files without corrupting them.
+
+Locks use fcntl.flock where available and degrade to no-ops elsewhere.
+"""
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows – single-process use only
+    fcntl = None  # type: ignore[assignment]
+
+
+@contextmanager
+def file_lock(path: str, shared: bool = False) -> Iterator[None]:
+    """Hold an advisory lock on *path* (created if missing) for the block."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a+") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def atomic_write_bytes(path: str, data: bytes) -> None:
+    """Write *data* to a temp file next to *path*, then rename it into place."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def atomic_write_json(path: str, obj: Any, **dump_kwargs: Any) -> None:
+    atomic_write_bytes(path, json.dumps(obj, **dump_kwargs).encode("utf-8"))
+
+
+def read_json(path: str, default: Any = None) -> Any:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
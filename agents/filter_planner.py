@@ -0,0 +1,113 @@
+"""
+Filter planner
+--------------
+Orders ComplianceEditor's checks so that each script meets the cheapest,
+most selective check first and stops at the first one it fails.
+
+Checks run in ascending order of expected cost per rejection:
+
+    (seconds per script + paid requests per script) / rejection rate
+
+Both figures start from per-check priors and are updated with what earlier
+runs observed, using PRIOR_WEIGHT pseudo-observations so a handful of
+scripts can't swing the plan. Paid requests carry a fixed cost of one
+second each, so a free endpoint (moderation) is preferred over a paid
+one (quality scoring) even when the two take about the same time.
+
+Observations are kept in FILTER_STATS (default .cache/filter_stats.json)
+and merged under an flock, so parallel editors can share them.
+"""
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Sequence
+
+try:
+    from agents.fileio import atomic_write_json, file_lock, read_json
+except ImportError:  # run as a script from agents/
+    from fileio import atomic_write_json, file_lock, read_json
+
+DEFAULT_STATS_PATH = ".cache/filter_stats.json"
+PRIOR_WEIGHT = 20
+MIN_REJECT_RATE = 1e-3
+
+
+@dataclass(frozen=True)
+class Check:
+    name: str
+    seconds: float  # prior time per script
+    reject_rate: float  # prior share of scripts it rejects
+    paid: float = 0.0  # paid API requests per script
+
+
+class FilterPlanner:
+    def __init__(self, checks: Sequence[Check], stats_path: str = None):
+        self.checks = {check.name: check for check in checks}
+        self.stats_path = stats_path or os.getenv("FILTER_STATS", DEFAULT_STATS_PATH)
+        self.lock_path = self.stats_path + ".lock"
+        self.history: Dict[str, Dict[str, float]] = read_json(self.stats_path, {})
+        self.run: Dict[str, Dict[str, float]] = {}
+
+    # ──────────────────────────────────────────────────────────────────
+    def _observed(self, name: str) -> Dict[str, float]:
+        total = {"seen": 0, "rejected": 0, "seconds": 0.0}
+        for source in (self.history, self.run):
+            for field, value in source.get(name, {}).items():
+                total[field] = total.get(field, 0) + value
+        return total
+
+    def reject_rate(self, name: str) -> float:
+        """Share of the scripts reaching *name* that it rejects (prior + observed)."""
+        check, seen = self.checks[name], self._observed(name)
+        return (check.reject_rate * PRIOR_WEIGHT + seen["rejected"]) / (PRIOR_WEIGHT + seen["seen"])
+
+    def pass_rate(self, names: Sequence[str] = None) -> float:
+        """Chance a script survives every check in *names*.
+
+        Each check only sees survivors of the earlier ones, so the observed
+        rates are conditional and their product is the end-to-end yield.
+        """
+        rate = 1.0
+        for name in names or self.checks:
+            rate *= 1.0 - self.reject_rate(name)
+        return rate
+
+    def expected_cost(self, name: str) -> float:
+        check, seen = self.checks[name], self._observed(name)
+        weight = PRIOR_WEIGHT + seen["seen"]
+        seconds = (check.seconds * PRIOR_WEIGHT + seen["seconds"]) / weight
+        return (seconds + check.paid) / max(self.reject_rate(name), MIN_REJECT_RATE)
+
+    def order(self, names: Sequence[str] = None) -> List[str]:
+        names = list(names or self.checks)
+        return sorted(names, key=lambda n: (self.expected_cost(n), names.index(n)))
+
+    def record(self, name: str, seen: int, rejected: int, seconds: float) -> None:
+        stats = self.run.setdefault(name, {"seen": 0, "rejected": 0, "seconds": 0.0})
+        stats["seen"] += seen
+        stats["rejected"] += rejected
+        stats["seconds"] += seconds
+
+    def save(self) -> None:
+        """Fold this run's observations into the shared stats file."""
+        if not self.run:
+            return
+        with file_lock(self.lock_path):
+            merged = read_json(self.stats_path, {})
+            for name, stats in self.run.items():
+                total = merged.setdefault(name, {"seen": 0, "rejected": 0, "seconds": 0.0})
+                for field, value in stats.items():
+                    total[field] = total.get(field, 0) + value
+            atomic_write_json(self.stats_path, merged, indent=1)
+        self.history, self.run = merged, {}
+
+    def report(self) -> str:
+        lines = [f"{'check':<12}{'seen':>6}{'passed':>8}{'pass %':>8}{'seconds':>10}"]
+        for name, stats in self.run.items():
+            passed = stats["seen"] - stats["rejected"]
+            rate = 100.0 * passed / stats["seen"] if stats["seen"] else 100.0
+            lines.append(
+                f"{name:<12}{stats['seen']:>6}{passed:>8}{rate:>7.1f}%{stats['seconds']:>10.3f}"
+            )
+        return "\n".join(lines)
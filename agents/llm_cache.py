@@ -0,0 +1,134 @@
+"""
+LLM cache
+---------
+SQLite-backed cache of chat completion responses, so rerunning a failed
+batch replays finished LLM work from disk instead of the network.
+ComplianceEditor uses it by default for its deterministic quality scores;
+StoryWriter only with --cache, since its sampled stories should differ
+from run to run.
+
+Responses are keyed on sha256 of (model, messages, temperature,
+max_tokens, any extra request fields). Entries older than LLM_CACHE_TTL
+seconds (default 7 days) are ignored and purged; once the stored text
+exceeds LLM_CACHE_MB (default 64) the least recently used rows are
+evicted. Stored at LLM_CACHE_PATH (default .cache/llm.sqlite3).
+
+Callers opt out per call with use_cache=False when they need a fresh
+sample.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+try:
+    from agents import metrics
+except ImportError:  # run as a script from agents/
+    import metrics
+
+DEFAULT_PATH = ".cache/llm.sqlite3"
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_CACHE_MB = 64
+
+
+class LLMCache:
+    def __init__(self, path: str = None, ttl: float = None, max_mb: float = None):
+        self.path = path or os.getenv("LLM_CACHE_PATH", DEFAULT_PATH)
+        self.ttl = float(ttl or os.getenv("LLM_CACHE_TTL", DEFAULT_TTL))
+        self.max_bytes = int(float(max_mb or os.getenv("LLM_CACHE_MB", DEFAULT_CACHE_MB)) * 2**20)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key        TEXT PRIMARY KEY,
+                model      TEXT NOT NULL,
+                response   TEXT NOT NULL,
+                bytes      INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used  REAL NOT NULL
+            )
+            """
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_used)")
+
+    # ──────────────────────────────────────────────────────────────────
+    @staticmethod
+    def key(model: str, messages: Any, temperature: float = None,
+            max_tokens: int = None, **extra: Any) -> str:
+        blob = json.dumps(
+            {"model": model, "messages": messages, "temperature": temperature,
+             "max_tokens": max_tokens, **extra},
+            sort_keys=True, ensure_ascii=False, default=str,
+        )
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock, self.db:
+            row = self.db.execute(
+                "SELECT response FROM responses WHERE key = ? AND created_at >= ?",
+                (key, now - self.ttl),
+            ).fetchone()
+            if row is not None:
+                self.db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+        if row is None:
+            self.misses += 1
+            metrics.cache("llm", 0, 1)
+            return None
+        self.hits += 1
+        metrics.cache("llm", 1)
+        return row[0]
+
+    def put(self, key: str, model: str, response: str) -> None:
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, size, now, now),
+            )
+            self.db.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+            # Keep the most recently used rows that fit in the size cap.
+            self.db.execute(
+                """
+                DELETE FROM responses WHERE key IN (
+                    SELECT key FROM (
+                        SELECT key, SUM(bytes) OVER (ORDER BY last_used DESC, rowid DESC) AS running
+                        FROM responses
+                    ) WHERE running > ?
+                )
+                """,
+                (self.max_bytes,),
+            )
+
+    def stats(self) -> str:
+        return f"{self.hits} hits / {self.misses} misses"
+
+    def close(self) -> None:
+        self.db.close()
+
+
+def cached_chat(client, cache: Optional[LLMCache], use_cache: bool = True, **request: Any) -> str:
+    """chat.completions.create(**request) → message text, via *cache* if given."""
+    key = LLMCache.key(**request) if cache is not None and use_cache else None
+    if key:
+        hit = cache.get(key)
+        if hit is not None:
+            return hit
+    with metrics.call("openai", "chat"):
+        rsp = client.chat.completions.create(**request)
+    metrics.usage("openai", "chat", rsp)
+    text = rsp.choices[0].message.content
+    if key:
+        cache.put(key, request["model"], text)
+    return text
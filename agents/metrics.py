@@ -0,0 +1,257 @@
+"""
+Metrics
+-------
+Run instrumentation for the agents: tracing spans per stage and per
+external call, latency histograms, and counters for retries, 429s, tokens,
+characters and cache lookups.
+
+Off unless METRICS_DIR is set. When off, span() hands back one shared
+no-op context and count()/observe() return on their first line, so the
+instrumented hot paths pay a global lookup and a call.
+
+When on, each process writes two files to METRICS_DIR at exit, named
+after the entry script (pipeline, render, …):
+
+    <run>.report.json   spans (start offset, duration, parent, labels),
+                        counters and histogram summaries
+    <run>.prom          the same counters and histograms in Prometheus
+                        text format, for the node-exporter textfile
+                        collector; every series carries run="<run>"
+
+Spans nest through a ContextVar, so calls made from asyncio tasks are
+parented to the stage that started them. Pool threads start without a
+parent; their spans are roots, still labelled with provider and op.
+
+    with metrics.span("compliance"):
+        with metrics.call("openai", "moderation"):
+            ...
+    metrics.count("retries", provider="elevenlabs")
+"""
+from __future__ import annotations
+
+import atexit, contextvars, functools, itertools, os, re, sys, threading, time
+from contextlib import nullcontext
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from agents.fileio import atomic_write_json
+except ImportError:  # run as a script from agents/
+    from fileio import atomic_write_json
+
+PREFIX = "factory"
+# Seconds; fine at the cache end, coarse at the render end.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+MAX_SPANS = 10_000
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_NULL = nullcontext()
+_lock = threading.Lock()
+_ids = itertools.count(1)
+_parent: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("span_parent", default=None)
+
+_dir: Optional[str] = None
+_run = ""
+_started = 0.0
+_spans: List[Dict] = []
+_dropped = 0
+_counters: Dict[Tuple[str, Labels], float] = {}
+_histograms: Dict[Tuple[str, Labels], List[float]] = {}  # bucket counts…, sum, count
+
+
+def _labels(labels: Dict) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+# ─────────────────────────────── recording ────────────────────────────
+def enabled() -> bool:
+    return _dir is not None
+
+
+def count(name: str, value: float = 1, **labels) -> None:
+    if _dir is None:
+        return
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name: str, seconds: float, **labels) -> None:
+    if _dir is None:
+        return
+    key = (name, _labels(labels))
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [0.0] * (len(BUCKETS) + 2)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                hist[i] += 1
+        hist[-2] += seconds
+        hist[-1] += 1
+
+
+class _Span:
+    __slots__ = ("name", "labels", "id", "start", "token")
+
+    def __init__(self, name: str, labels: Dict):
+        self.name, self.labels = name, labels
+
+    def __enter__(self):
+        self.id = next(_ids)
+        self.token = _parent.set(self.id)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        _parent.reset(self.token)
+        parent = _parent.get()
+        status = "ok" if exc_type is None else "error"
+        observe(f"{self.name}_seconds", seconds, status=status, **self.labels)
+        global _dropped
+        with _lock:
+            if len(_spans) < MAX_SPANS:
+                _spans.append({
+                    "id": self.id, "parent": parent, "name": self.name,
+                    "start": round(self.start - _started, 6), "seconds": round(seconds, 6),
+                    "status": status, **self.labels,
+                })
+            else:
+                _dropped += 1
+        return False
+
+
+def span(name: str, **labels):
+    """Time a block as a span; histogrammed as <name>_seconds."""
+    if _dir is None:
+        return _NULL
+    return _Span(name, labels)
+
+
+def stage(name: str):
+    """Span for one pipeline stage (scout, story, compliance, …)."""
+    if _dir is None:
+        return _NULL
+    return _Span("stage", {"stage": name})
+
+
+def staged(name: str):
+    """Decorator: run every call of the function inside stage(name)."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if _dir is None:
+                return fn(*args, **kwargs)
+            with _Span("stage", {"stage": name}):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def call(provider: str, op: str):
+    """Span for one outbound request, counted per provider and operation."""
+    if _dir is None:
+        return _NULL
+    count("requests", provider=provider, op=op)
+    return _Span("call", {"provider": provider, "op": op})
+
+
+def cache(name: str, hits: int, misses: int = 0) -> None:
+    if _dir is None:
+        return
+    if hits:
+        count("cache_lookups", hits, cache=name, result="hit")
+    if misses:
+        count("cache_lookups", misses, cache=name, result="miss")
+
+
+def usage(provider: str, op: str, response) -> None:
+    """Token counts from an OpenAI response's usage block, if it has one."""
+    if _dir is None:
+        return
+    used = getattr(response, "usage", None)
+    for field in ("prompt_tokens", "completion_tokens"):
+        value = getattr(used, field, None)
+        if isinstance(value, int):
+            count("tokens", value, provider=provider, op=op, kind=field.split("_")[0])
+
+
+# ─────────────────────────────── export ───────────────────────────────
+def _metric(name: str) -> str:
+    return f"{PREFIX}_" + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def _series(labels: Labels, extra: Labels = ()) -> str:
+    pairs = (("run", _run),) + labels + extra
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def prometheus() -> str:
+    with _lock:
+        counters, histograms = dict(_counters), {k: list(v) for k, v in _histograms.items()}
+    lines: List[str] = []
+    for name in sorted({n for n, _ in counters}):
+        metric = _metric(name) + "_total"
+        lines.append(f"# TYPE {metric} counter")
+        for (n, labels), value in sorted(counters.items()):
+            if n == name:
+                lines.append(f"{metric}{_series(labels)} {value:g}")
+    for name in sorted({n for n, _ in histograms}):
+        metric = _metric(name)
+        lines.append(f"# TYPE {metric} histogram")
+        for (n, labels), hist in sorted(histograms.items()):
+            if n != name:
+                continue
+            for bound, n_le in zip(BUCKETS, hist):
+                lines.append(f"{metric}_bucket{_series(labels, (('le', f'{bound:g}'),))} {n_le:g}")
+            lines.append(f"{metric}_bucket{_series(labels, (('le', '+Inf'),))} {hist[-1]:g}")
+            lines.append(f"{metric}_sum{_series(labels)} {hist[-2]:.6f}")
+            lines.append(f"{metric}_count{_series(labels)} {hist[-1]:g}")
+    return "\n".join(lines) + "\n"
+
+
+def report() -> Dict:
+    with _lock:
+        return {
+            "run": _run,
+            "seconds": round(time.perf_counter() - _started, 3),
+            "counters": [dict(labels, name=name, value=value)
+                         for (name, labels), value in sorted(_counters.items())],
+            "histograms": [dict(labels, name=name, count=hist[-1], sum=round(hist[-2], 6),
+                                mean=round(hist[-2] / hist[-1], 6) if hist[-1] else 0.0)
+                           for (name, labels), hist in sorted(_histograms.items())],
+            "spans": list(_spans),
+            "spans_dropped": _dropped,
+        }
+
+
+def export() -> Optional[str]:
+    """Write <run>.report.json and <run>.prom; return the report's path."""
+    if _dir is None:
+        return None
+    os.makedirs(_dir, exist_ok=True)
+    path = os.path.join(_dir, f"{_run}.report.json")
+    atomic_write_json(path, report(), indent=1)
+    prom = os.path.join(_dir, f"{_run}.prom")
+    with open(prom + ".tmp", "w", encoding="utf-8") as f:
+        f.write(prometheus())
+    os.replace(prom + ".tmp", prom)
+    return path
+
+
+def configure(directory: Optional[str] = None, run: Optional[str] = None) -> None:
+    """(Re)start recording into *directory*; None turns metrics off."""
+    global _dir, _run, _started, _dropped
+    with _lock:
+        _dir = directory or None
+        _run = run or os.path.splitext(os.path.basename(sys.argv[0] or "agents"))[0] or "agents"
+        _started = time.perf_counter()
+        _spans.clear()
+        _counters.clear()
+        _histograms.clear()
+        _dropped = 0
+
+
+configure(os.getenv("METRICS_DIR"))
+atexit.register(export)
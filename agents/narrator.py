@@ -1,19 +1,146 @@
 import os
 import json
 import time
+import wave
+import base64
+import argparse
+import tempfile
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
-from typing import List, Dict
+from typing import List, Dict, Optional
+
+try:
+    from agents import metrics
+    from agents.audio_cache import AudioCache, place_file
+    from agents.fileio import atomic_write_json
+    from agents.quota import CircuitOpen, QuotaGovernor, governor
+    from agents.state_store import FAILED, NARRATION, StateStore
+except ImportError:  # run as `python agents/narrator.py`
+    import metrics
+    from audio_cache import AudioCache, place_file
+    from fileio import atomic_write_json
+    from quota import CircuitOpen, QuotaGovernor, governor
+    from state_store import FAILED, NARRATION, StateStore
 
 load_dotenv()
 
+# Concurrent requests allowed by the ElevenLabs plan (Free 2, Starter 3,
+# Creator 5, Pro 10); override with E11_CONCURRENCY.
+DEFAULT_CONCURRENCY = 2
+# Raw 16-bit mono PCM, wrapped in a WAV header as it streams in, so the
+# render gets a real .wav with no decode/transcode step. pcm_24000 is
+# available on every plan; override with E11_OUTPUT_FORMAT (e.g. mp3_44100_128).
+DEFAULT_OUTPUT_FORMAT = 'pcm_24000'
+# Seconds to connect, and to wait for each chunk of the streamed response
+# (a hung connection otherwise blocks a worker forever); E11_TIMEOUT
+# overrides the read timeout.
+CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 60
+# The endpoint answers with JSON lines, whatever its Content-Type says.
+TTS_PATH = "/text-to-speech/{voice_id}/stream/with-timestamps"
+# Fields a finished narration leaves on its script (and in the state store).
+AUDIO_FIELDS = ('audio_file', 'audio_duration', 'timings_file', 'audio_cache')
+# Captions fall back to this pace only when no timing source is available.
+WORDS_PER_SECOND = 2.5
+
+
+def audio_duration(path: str, output_format: str = '') -> Optional[float]:
+    """Exact length in seconds of a narration file.
+
+    WAV length comes from the header (frames / sample rate). For MP3 the
+    length is derived from the file size and the constant bitrate named in
+    the requested output format, e.g. mp3_44100_128.
+    """
+    try:
+        if path.endswith('.wav'):
+            with wave.open(path, 'rb') as wav:
+                return round(wav.getnframes() / float(wav.getframerate()), 3)
+        parts = output_format.split('_')
+        if parts[0] == 'mp3' and len(parts) == 3:
+            return round(os.path.getsize(path) * 8 / (int(parts[2]) * 1000), 3)
+    except (OSError, EOFError, wave.Error, ValueError):
+        pass
+    return None
+
+
+def timings_path(audio_path: str) -> str:
+    """Word-timing sidecar for a clip: audio/x.wav -> audio/x.timings.json."""
+    return os.path.splitext(audio_path)[0] + '.timings.json'
+
+
+def word_timings(alignment: Dict) -> Dict:
+    """Collapse ElevenLabs character alignment into per-word start/end seconds.
+
+    Returns {"words": [...], "start": [...], "end": [...]}, three parallel
+    arrays sorted by start time, which the visualizer binary-searches.
+    """
+    words, starts, ends = [], [], []
+    current = ''
+    for char, start, end in zip(alignment['characters'],
+                                alignment['character_start_times_seconds'],
+                                alignment['character_end_times_seconds']):
+        if char.isspace():
+            current = ''
+            continue
+        if not current:
+            words.append('')
+            starts.append(round(start, 3))
+            ends.append(round(end, 3))
+        current += char
+        words[-1] = current
+        ends[-1] = round(end, 3)
+    return {'words': words, 'start': starts, 'end': ends}
+
+
+def estimate_timings(text: str, duration: Optional[float]) -> Dict:
+    """Spread words over the clip in proportion to their length.
+
+    Used when the TTS response carried no alignment (cache entries from
+    before timings existed, the silent fallback, raw-audio responses).
+    """
+    words = text.split()
+    if not duration:
+        duration = len(words) / WORDS_PER_SECOND
+    weights = [len(w) + 1 for w in words]
+    per_unit = duration / max(1, sum(weights))
+    starts, ends, t = [], [], 0.0
+    for weight in weights:
+        starts.append(round(t, 3))
+        t += weight * per_unit
+        ends.append(round(t, 3))
+    return {'words': words, 'start': starts, 'end': ends}
+
+
 class Narrator:
-    def __init__(self):
+    def __init__(self, concurrency: Optional[int] = None, limit: Optional[int] = None,
+                 allow_fallback: bool = False, use_cache: bool = True,
+                 use_state: bool = True):
         self.api_key = os.getenv('E11_KEY')
         self.voice_id = os.getenv('E11_VOICE', 'EXAVITQu4vr4xnSDxMaL')
         if not self.voice_id:
             raise ValueError("E11_VOICE is not set")
-        self.base_url = "https://api.elevenlabs.io/v1"
+        self.base_url = os.getenv('E11_BASE_URL', "https://api.elevenlabs.io/v1")
+        self.concurrency = max(1, concurrency or int(os.getenv('E11_CONCURRENCY', DEFAULT_CONCURRENCY)))
+        self.limit = limit
+        self.allow_fallback = allow_fallback
+        self.output_format = os.getenv('E11_OUTPUT_FORMAT', DEFAULT_OUTPUT_FORMAT)
+        self.timeout = (CONNECT_TIMEOUT, float(os.getenv('E11_TIMEOUT', DEFAULT_READ_TIMEOUT)))
+        self.cache = AudioCache() if use_cache else None
+        self.state = StateStore() if use_state else None
+        self.quota = governor()
+
+        # One pooled session for all workers: connections to api.elevenlabs.io
+        # are kept alive instead of paying a TCP+TLS handshake per request.
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            "Accept": "audio/*, application/json",
+            "Content-Type": "application/json",
+            "xi-api-key": self.api_key or "",
+        })
         
     def read_clean_scripts(self) -> List[Dict]:
         """Read clean scripts from JSON file."""
@@ -24,17 +151,63 @@ class Narrator:
             print("clean.json not found. Run compliance_editor.py first.")
             return []
     
-    def generate_audio(self, text: str, filename: str, max_retries: int = 3) -> bool:
-        """Generate audio using ElevenLabs TTS with retry logic."""
-        url = f"{self.base_url}/text-to-speech/{self.voice_id}"
-        
-        headers = {
-            "Accept": "audio/mpeg",
-            "Content-Type": "application/json",
-            "xi-api-key": self.api_key
-        }
-        
-        data = {
+    def _stream_to_file(self, response: requests.Response, stem: str):
+        """Write the streamed body to audio/<stem>.<ext>.
+
+        Returns (file name, character alignment or None). The parser follows
+        the endpoint, not the Content-Type header: the timestamps endpoint
+        answers with JSON lines, each carrying a base64 audio chunk (in the
+        requested output format) and the alignment of the characters it
+        covers.
+
+        Chunks go to a hidden temp file that is renamed into place only once
+        the download completes, so `ls audio/*.wav` never sees a partial file.
+        """
+        alignment = {'characters': [], 'character_start_times_seconds': [],
+                     'character_end_times_seconds': []}
+        chunks = self._json_audio_chunks(response, alignment)
+        is_pcm = self.output_format.startswith('pcm_')
+        filename = stem + ('.wav' if is_pcm else '.mp3')
+
+        fd, tmp_path = tempfile.mkstemp(dir='audio', prefix='.', suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if is_pcm:
+                    with wave.open(f, 'wb') as wav:
+                        wav.setnchannels(1)
+                        wav.setsampwidth(2)
+                        wav.setframerate(int(self.output_format.split('_')[1]))
+                        carry = b''
+                        for chunk in chunks:
+                            chunk = carry + chunk
+                            even = len(chunk) - len(chunk) % 2  # whole 16-bit samples only
+                            wav.writeframesraw(chunk[:even])
+                            carry = chunk[even:]
+                else:
+                    for chunk in chunks:
+                        f.write(chunk)
+            os.replace(tmp_path, os.path.join('audio', filename))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return filename, alignment if alignment['characters'] else None
+
+    @staticmethod
+    def _json_audio_chunks(response: requests.Response, alignment: Dict):
+        """Yield decoded audio from a JSON-lines body, collecting alignment."""
+        for line in response.iter_lines():
+            if not line:
+                continue
+            message = json.loads(line)
+            if message.get('audio_base64'):
+                yield base64.b64decode(message['audio_base64'])
+            for field, values in (message.get('alignment') or {}).items():
+                if field in alignment:
+                    alignment[field].extend(values)
+
+    def tts_request(self, text: str) -> Dict:
+        return {
             "text": text,
             "model_id": "eleven_monolingual_v1",
             "voice_settings": {
@@ -42,37 +215,164 @@ class Narrator:
                 "similarity_boost": 0.5
             }
         }
+
+    def cache_key(self, text: str) -> str:
+        return AudioCache.key({
+            **self.tts_request(text),
+            "voice_id": self.voice_id,
+            "output_format": self.output_format,
+        })
+
+    def generate_audio(self, text: str, filename: str, max_retries: int = 3) -> Optional[str]:
+        """Generate audio using ElevenLabs TTS with retry logic.
+
+        Returns the name of the file written under audio/ – its extension
+        follows the format actually returned – or None on failure. Word
+        timings from the response's character alignment are written next
+        to the clip (see timings_path).
+        """
+        url = self.base_url + TTS_PATH.format(voice_id=self.voice_id)
+        stem = os.path.splitext(filename)[0]
+        data = self.tts_request(text)
         
         for attempt in range(max_retries):
+            if attempt:
+                metrics.count("retries", provider="elevenlabs", op="tts")
             try:
-                response = requests.post(url, json=data, headers=headers)
+                # Characters per minute are metered, so the text is the cost.
+                self.quota.acquire("elevenlabs", len(text))
+                with metrics.call("elevenlabs", "tts"):
+                    response = self.session.post(
+                        url, json=data, params={"output_format": self.output_format},
+                        stream=True, timeout=self.timeout,
+                    )
+                    if response.status_code == 200:
+                        with response:
+                            saved, alignment = self._stream_to_file(response, stem)
+                self.quota.observe("elevenlabs", response.status_code, response.headers)
                 
                 if response.status_code == 200:
-                    audio_path = os.path.join('audio', filename)
-                    with open(audio_path, 'wb') as f:
-                        f.write(response.content)
-                    print(f"Audio saved: {audio_path}")
-                    return True
+                    metrics.count("characters", len(text), provider="elevenlabs", op="tts")
+                    if alignment:
+                        self.write_timings(saved, word_timings(alignment))
+                    print(f"Audio saved: {os.path.join('audio', saved)}")
+                    return saved
                     
                 elif response.status_code == 429:
-                    wait_time = 2 ** attempt  # Exponential backoff
-                    print(f"Rate limit hit. Waiting {wait_time} seconds before retry {attempt + 1}/{max_retries}")
+                    metrics.count("rate_limited", provider="elevenlabs", op="tts")
+                    wait_time = QuotaGovernor.retry_delay(response.headers, attempt)
+                    response.close()
+                    print(f"Rate limit hit. Waiting {wait_time:.1f} seconds before retry {attempt + 1}/{max_retries}")
                     time.sleep(wait_time)
                     continue
                     
                 else:
                     print(f"Error generating audio: {response.status_code} - {response.text}")
-                    return False
+                    return None
                     
+            except CircuitOpen as e:
+                print(f"Skipping audio generation: {e}")
+                return None
             except Exception as e:
+                self.quota.failed("elevenlabs")
                 print(f"Exception during audio generation (attempt {attempt + 1}): {e}")
                 if attempt < max_retries - 1:
-                    time.sleep(1)
+                    time.sleep(QuotaGovernor.backoff(attempt))
                     continue
-                return False
+                return None
         
         print(f"Failed to generate audio after {max_retries} attempts")
-        return False
+        return None
+    
+    def write_timings(self, filename: str, timings: Dict) -> str:
+        """Store *timings* beside audio/<filename>; return the sidecar's name."""
+        path = timings_path(os.path.join('audio', filename))
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(timings, f, ensure_ascii=False, separators=(',', ':'))
+        return os.path.basename(path)
+
+    def write_silence(self, text: str, filename: str) -> None:
+        """Fallback narration: a silent WAV roughly as long as the text."""
+        seconds = max(1.0, len(text.split()) / 2.5)
+        rate = 16000
+        # A new file renamed into place: audio/<id>.wav may be a hard link
+        # into the TTS cache, and writing through it would wipe the clip there.
+        fd, tmp_path = tempfile.mkstemp(dir='audio', prefix='.', suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f, wave.open(f, 'wb') as wav:
+                wav.setnchannels(1)
+                wav.setsampwidth(2)
+                wav.setframerate(rate)
+                wav.writeframes(b'\0\0' * int(seconds * rate))
+            os.replace(tmp_path, os.path.join('audio', filename))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        print(f"⚠️  Using silent fallback narration: audio/{filename}")
+
+    @metrics.staged("narration")
+    def narrate(self, script: Dict) -> bool:
+        """Synthesize one script; sets script['audio_file'] on success.
+
+        Cached clips are linked into audio/ without touching the network;
+        script['audio_cache'] points at the clip inside the cache.
+        script['timings_file'] names the word-timing sidecar used for captions.
+        Scripts narrated on an earlier run whose clip is still in audio/ are
+        restored from the state store, as long as the text is unchanged;
+        every outcome is committed there.
+        """
+        text = f"{script['title']}. {script['story']}"
+        done = self.state.finished(script['id'], NARRATION, text) if self.state is not None else None
+        if done and os.path.exists(os.path.join('audio', done.get('audio_file', ''))):
+            script.update({k: done[k] for k in AUDIO_FIELDS if k in done})
+            print(f"Already narrated: audio/{script['audio_file']}")
+            return True
+
+        filename = f"{script['id']}.wav"
+        # A sidecar left by an earlier clip (other text, or before a silent
+        # fallback) would drift from the clip made now.
+        stale = timings_path(os.path.join('audio', filename))
+        if os.path.exists(stale):
+            os.remove(stale)
+
+        key = self.cache_key(text) if self.cache is not None else None
+        cached = self.cache.lookup(key) if key else None
+        synthesized = False
+        if cached:
+            saved = script['id'] + os.path.splitext(cached)[1]
+            place_file(cached, os.path.join('audio', saved))
+            if os.path.exists(timings_path(cached)):
+                place_file(timings_path(cached), timings_path(os.path.join('audio', saved)))
+            print(f"Audio cache hit: audio/{saved}")
+            script['audio_cache'] = cached
+        else:
+            saved = self.generate_audio(text, filename)
+            synthesized = bool(saved)
+            if not saved and self.allow_fallback:
+                self.write_silence(text, filename)
+                saved = filename
+        if not saved:
+            print(f"Failed to generate audio for script: {script['title'][:50]}...")
+            if self.state is not None:
+                self.state.complete(script['id'], NARRATION, status=FAILED)
+            return False
+
+        audio_path = os.path.join('audio', saved)
+        script['audio_file'] = saved
+        duration = audio_duration(audio_path, self.output_format)
+        if duration is not None:
+            script['audio_duration'] = duration
+        if not os.path.exists(timings_path(audio_path)):
+            self.write_timings(saved, estimate_timings(text, duration))
+        script['timings_file'] = os.path.basename(timings_path(audio_path))
+        if key and synthesized:
+            script['audio_cache'] = self.cache.store(key, audio_path, extras=[timings_path(audio_path)])
+        # The silent fallback is a placeholder; leave it to be retried.
+        if self.state is not None and (synthesized or cached):
+            self.state.complete(script['id'], NARRATION, {k: script[k] for k in AUDIO_FIELDS if k in script},
+                                text=text)
+        return True
     
     def run(self):
         """Main execution method."""
@@ -85,27 +385,35 @@ class Narrator:
         
         os.makedirs('audio', exist_ok=True)
         
-        print(f"Generating audio for {len(scripts)} scripts...")
-        successful_count = 0
-        
-        for i, script in enumerate(scripts):
-            print(f"Generating audio {i+1}/{len(scripts)} for: {script['title'][:50]}...")
-            
-            filename = f"{script['id']}.wav"
-            
-            text = f"{script['title']}. {script['story']}"
-            if self.generate_audio(text, filename):
-                successful_count += 1
-                script['audio_file'] = filename
-            else:
-                print(f"Failed to generate audio for script: {script['title'][:50]}...")
+        todo = scripts[:self.limit] if self.limit else scripts
+        print(f"Generating audio for {len(todo)} scripts ({self.concurrency} in parallel)...")
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            results = list(pool.map(self.narrate, todo))
+        successful_count = sum(results)
         
         if successful_count > 0:
-            with open('clean.json', 'w', encoding='utf-8') as jsonfile:
-                json.dump(scripts, jsonfile, indent=2, ensure_ascii=False)
+            # Replace, never truncate: a crash mid-write must not lose clean.json.
+            atomic_write_json('clean.json', scripts, indent=2, ensure_ascii=False)
         
-        print(f"Narration complete! Generated {successful_count}/{len(scripts)} audio files.")
+        if self.cache is not None:
+            print(f"TTS cache: {self.cache.stats()}")
+        print(f"Narration complete! Generated {successful_count}/{len(todo)} audio files.")
 
 if __name__ == "__main__":
-    narrator = Narrator()
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--limit", type=int, default=None, help="narrate at most N scripts")
+    ap.add_argument("--concurrency", type=int, default=None,
+                    help=f"parallel TTS requests (default E11_CONCURRENCY or {DEFAULT_CONCURRENCY})")
+    ap.add_argument(
+        "--fallback",
+        action="store_true",
+        help="write silent audio if ElevenLabs is unreachable",
+    )
+    ap.add_argument("--no-cache", action="store_true", help="always call ElevenLabs (skip .cache/tts)")
+    ap.add_argument("--no-state", action="store_true", help="re-narrate scripts recorded in the state store")
+    args = ap.parse_args()
+
+    narrator = Narrator(concurrency=args.concurrency, limit=args.limit,
+                        allow_fallback=args.fallback, use_cache=not args.no_cache,
+                        use_state=not args.no_state)
     narrator.run()
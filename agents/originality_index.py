@@ -0,0 +1,167 @@
+"""
+Originality index
+-----------------
+Persistent record of every published story, used to reject near-copies of
+anything we have put out before – not just duplicates inside one batch.
+
+Each story is reduced to a MinHash signature over character 5-gram
+shingles and bucketed with LSH (42 bands x 3 rows) in SQLite. A lookup
+only touches the stories that share a bucket with the new one, so it stays
+fast as the archive grows; those few candidates are then confirmed with the
+same fuzz.ratio > 65 rule the in-batch check uses.
+
+Rows are keyed by a hash of the story text, not by post id: a post picked
+again on a later day gets a new story, and that story is checked against
+the one already published for the same post instead of replacing it. The
+only story ever skipped is an identical text added by this same index
+instance, i.e. a story re-screened within the run that published it.
+
+Stored at ORIGINALITY_DB (default .cache/originality.sqlite3).
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import List, Optional
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+DEFAULT_DB = ".cache/originality.sqlite3"
+SHINGLE = 5
+BANDS = 42
+ROWS = 3
+NUM_PERM = BANDS * ROWS
+_PRIME = (1 << 31) - 1
+
+
+def _coefficients(tag: str) -> np.ndarray:
+    # Derived from a hash rather than an RNG so signatures stay comparable
+    # across numpy versions and machines.
+    return np.array(
+        [
+            int.from_bytes(hashlib.blake2b(f"{tag}{i}".encode(), digest_size=4).digest(), "big")
+            % (_PRIME - 1) + 1
+            for i in range(NUM_PERM)
+        ],
+        dtype=np.uint64,
+    )
+
+
+_A = _coefficients("a")
+_B = _coefficients("b")
+
+
+def story_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def shingles(text: str) -> set:
+    norm = " ".join(text.lower().split())
+    if len(norm) <= SHINGLE:
+        return {norm}
+    return {norm[i : i + SHINGLE] for i in range(len(norm) - SHINGLE + 1)}
+
+
+def signature(text: str) -> np.ndarray:
+    hashes = np.fromiter(
+        (zlib.crc32(s.encode("utf-8")) % _PRIME for s in shingles(text)),
+        dtype=np.uint64,
+    )
+    return ((_A[:, None] * hashes[None, :] + _B[:, None]) % _PRIME).min(axis=1)
+
+
+def band_keys(sig: np.ndarray) -> List[int]:
+    return [
+        int.from_bytes(
+            hashlib.blake2b(
+                bytes([b]) + sig[b * ROWS : (b + 1) * ROWS].tobytes(), digest_size=8
+            ).digest(),
+            "big",
+            signed=True,
+        )
+        for b in range(BANDS)
+    ]
+
+
+class OriginalityIndex:
+    def __init__(self, path: str = None, cutoff: float = 65):
+        self.path = path or os.getenv("ORIGINALITY_DB", DEFAULT_DB)
+        self.cutoff = cutoff
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS published (
+                hash     TEXT PRIMARY KEY,
+                post_id  TEXT NOT NULL,
+                story    TEXT NOT NULL,
+                added_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS published_lsh (
+                key  INTEGER NOT NULL,
+                hash TEXT NOT NULL,
+                PRIMARY KEY (key, hash)
+            ) WITHOUT ROWID;
+            """
+        )
+        self.session: set = set()  # hashes added through this instance
+
+    # ──────────────────────────────────────────────────────────────────
+    def __len__(self) -> int:
+        with self._lock:
+            return self.db.execute("SELECT COUNT(*) FROM published").fetchone()[0]
+
+    def find_duplicate(self, text: str) -> Optional[str]:
+        """Return the post id of a published story too similar to *text*, if any."""
+        keys = band_keys(signature(text))
+        with self._lock:
+            rows = self.db.execute(
+                f"""
+                SELECT p.hash, p.post_id, p.story FROM published p
+                WHERE p.hash IN (
+                    SELECT DISTINCT hash FROM published_lsh
+                    WHERE key IN ({",".join("?" * len(keys))})
+                )
+                """,
+                keys,
+            ).fetchall()
+        own = story_hash(text)
+        own = own if own in self.session else None
+        candidates = [(post_id, story) for h, post_id, story in rows if h != own]
+        if not candidates:
+            return None
+        match = process.extractOne(
+            text,
+            [story for _, story in candidates],
+            scorer=fuzz.ratio,
+            score_cutoff=self.cutoff,
+        )
+        if match is None or match[1] <= self.cutoff:
+            return None
+        return candidates[match[2]][0]
+
+    def _insert(self, post_id: str, text: str, added_at: float) -> str:
+        h = story_hash(text)
+        with self._lock, self.db:
+            self.db.execute(
+                "INSERT OR IGNORE INTO published (hash, post_id, story, added_at) VALUES (?, ?, ?, ?)",
+                (h, str(post_id), text, added_at),
+            )
+            self.db.executemany(
+                "INSERT OR IGNORE INTO published_lsh (key, hash) VALUES (?, ?)",
+                [(k, h) for k in band_keys(signature(text))],
+            )
+        return h
+
+    def add(self, post_id: str, text: str) -> None:
+        self.session.add(self._insert(post_id, text, time.time()))
+
+    def close(self) -> None:
+        self.db.close()
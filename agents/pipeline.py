@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Pipeline
+--------
+Run Trend-Scout → Story-Writer → Compliance-Editor → Narrator in one
+process as a streaming pipeline.
+
+Reddit is fetched and ranked once per batch. Stories are written on a
+thread pool and handed to compliance in hook order while later stories are
+still being generated; each story that passes goes straight to the
+narration pool. Stories that finished while the one ahead of them was
+still being written are screened together, so they share one moderation
+request; compliance never waits for a story to fill a batch. The run stops
+as soon as --videos stories are accepted, and any stories still being
+written are cancelled.
+
+How many stories are written at once is decided by the yield scheduler
+(agents/yield_scheduler.py): from past pass rates per gate and per
+subreddit it keeps just enough candidates in flight to reach the target
+with --confidence, topping up after rejections and cancelling queued
+candidates an acceptance made unnecessary. Up to --workers stories are
+written at once and as many again wait in the pool's queue, so there is
+something left to cancel.
+
+hooks.csv, scripts.json and clean.json are still written, so the render
+step and the workflow artifacts are unchanged. Progress is also committed
+per post to the state store (agents/state_store.py): a rerun reuses stories
+and verdicts already recorded, and first narrates any accepted story whose
+narration never finished. Posts narrated on an earlier run, or whose
+story was rejected, are skipped; verdicts replayed from the store don't
+feed the yield scheduler again.
+
+CLI flags
+---------
+--videos N     Clean, narrated stories to produce (default 10)
+--limit N      Posts per subreddit for the scout (default 50)
+--workers N    At most N stories generated concurrently, N more queued (default 4)
+--confidence P Chance the in-flight stories reach the target (default 0.9)
+--fallback     Use mock hook / story / silent audio when a provider fails
+--incremental  Only rank Reddit posts not used on an earlier run
+
+With METRICS_DIR set, spans, latencies, retries, 429s, token/character
+usage and cache hit rates are written there at exit as pipeline.report.json
+and pipeline.prom (see agents/metrics.py).
+
+Example
+-------
+python agents/pipeline.py --videos 10
+"""
+from __future__ import annotations
+
+import argparse, os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import chain
+from typing import Deque, Dict, Iterable, Iterator, List, Tuple
+
+try:
+    from agents import metrics
+    from agents.compliance_editor import ComplianceEditor, Screening
+    from agents.narrator import Narrator
+    from agents.state_store import COMPLIANCE, DONE, NARRATION
+    from agents.story_writer import StoryWriter
+    from agents.trend_scout import TrendScout
+    from agents.yield_scheduler import DEFAULT_CONFIDENCE, YieldScheduler
+except ImportError:  # run as `python agents/pipeline.py`
+    import metrics
+    from compliance_editor import ComplianceEditor, Screening
+    from narrator import Narrator
+    from state_store import COMPLIANCE, DONE, NARRATION
+    from story_writer import StoryWriter
+    from trend_scout import TrendScout
+    from yield_scheduler import DEFAULT_CONFIDENCE, YieldScheduler
+
+
+# ─────────────────────────────── main class ───────────────────────────
+class Pipeline:
+    def __init__(
+        self,
+        videos: int = 10,
+        posts_per_sub: int = 50,
+        workers: int = 4,
+        allow_fallback: bool = False,
+        incremental: bool = False,
+        confidence: float = DEFAULT_CONFIDENCE,
+    ):
+        self.videos = videos
+        self.workers = max(1, workers)
+        self.scout = TrendScout(posts_per_sub=posts_per_sub, allow_fallback=allow_fallback,
+                                incremental=incremental)
+        self.writer = StoryWriter(allow_fallback=allow_fallback, workers=self.workers)
+        self.editor = ComplianceEditor()
+        self.narrator = Narrator(allow_fallback=allow_fallback)
+        self.scheduler = YieldScheduler(self.editor.planner, self.editor.check_names(),
+                                        confidence=confidence, max_in_flight=2 * self.workers)
+        self.scripts: List[Dict] = []
+        self.accepted: List[Dict] = []
+
+    # ------------------------------------------------------------------
+    def hooks(self) -> List[Dict]:
+        print("Fetching Reddit posts…")
+        raw = self.scout.fetch_posts()
+        top = self.scout.rank(raw)[:50]
+        self.scout.save_csv(top)
+        if self.scout.state is not None:
+            self.scout.state.upsert(top)
+        print(f"Ranked {len(raw)} posts, kept top {len(top)}")
+        return top
+
+    def stories(self, hooks: Iterable[Dict]) -> Iterator[List[Dict]]:
+        """Yield scripts in hook order, with as many in flight as the scheduler asks for.
+
+        Each yield is the next script plus any that directly follow it and
+        are already written. Between yields the consumer screens them, so
+        self.accepted is current whenever the plan is redone.
+        """
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+        in_flight: Deque[Tuple[Future, Dict, float]] = deque()
+        pending: Deque[Dict] = deque(hooks)
+
+        def replan() -> None:
+            needed = self.videos - len(self.accepted)
+            odds = [p for _, _, p in in_flight]
+            for _ in range(self.scheduler.surplus(needed, odds)):
+                future, hook, _ = in_flight[-1]
+                if not future.cancel():
+                    break  # already being written; its story is kept in the state store
+                in_flight.pop()
+                pending.appendleft(hook)
+                self.scheduler.cancelled += 1
+            upcoming = [pending[i] for i in range(min(len(pending), self.scheduler.max_in_flight))]
+            start = self.scheduler.to_start(
+                needed, [p for _, _, p in in_flight],
+                [self.scheduler.probability(hook) for hook in upcoming],
+            )
+            for hook in upcoming[:start]:
+                pending.popleft()
+                in_flight.append((pool.submit(self.writer.build_script, hook), hook,
+                                  self.scheduler.probability(hook)))
+
+        try:
+            replan()
+            while in_flight:
+                batch = [in_flight.popleft()[0].result()]
+                while in_flight and in_flight[0][0].done():
+                    batch.append(in_flight.popleft()[0].result())
+                self.scripts.extend(batch)
+                yield batch
+                replan()
+        finally:
+            # Reached when the consumer has enough stories: drop the rest.
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def screened(self, batches: Iterable[List[Dict]]) -> Iterator[Dict]:
+        screening = Screening()
+        for batch in batches:
+            for script, passed in zip(batch, self.editor.screen_batch(batch, screening)):
+                # A replayed verdict was counted on the run that reached it.
+                if script["id"] in self.editor.judged:
+                    self.scheduler.record(script.get("subreddit", ""), passed)
+                if passed:
+                    yield script
+
+    def unfinished(self) -> List[Dict]:
+        """Stories accepted on an earlier run whose narration never finished.
+
+        Only stories whose stored text is the one compliance accepted.
+        """
+        if self.narrator.state is None:
+            return []
+        resumed = [
+            record for record in self.narrator.state.pending(NARRATION, after=COMPLIANCE)
+            if "story" in record and self.editor.verdict(record) == DONE
+        ]
+        if resumed:
+            print(f"Resuming narration for {len(resumed)} story(ies) from an earlier run")
+        return resumed
+
+    # ------------------------------------------------------------------
+    @metrics.staged("pipeline")
+    def run(self) -> List[Dict]:
+        os.makedirs("audio", exist_ok=True)
+        accepted = self.accepted
+        with ThreadPoolExecutor(max_workers=self.narrator.concurrency) as tts:
+            narrations: List[Future] = []
+            resumed = self.unfinished()[:self.videos]
+            resumed_ids = {script["id"] for script in resumed}
+            hooks = [] if len(resumed) >= self.videos else [
+                hook for hook in self.hooks()
+                if hook["id"] not in resumed_ids and not self.editor.published(hook["id"])
+                and not self.editor.rejected(hook["id"])
+            ]
+            stream = self.screened(self.stories(hooks))
+            for script in chain(resumed, stream):
+                print(f"  ✓ accepted {len(accepted) + 1}/{self.videos}: {script['title'][:50]}")
+                accepted.append(script)
+                narrations.append(tts.submit(self.narrator.narrate, script))
+                if len(accepted) >= self.videos:
+                    break
+            stream.close()
+            done = [f.result() for f in narrations]
+
+        clean = [s for s, ok in zip(accepted, done) if ok]
+        self.writer.save_scripts(self.scripts)
+        self.editor.save_clean_scripts(clean)
+        self.editor.record_published(clean)
+        self.editor.report_checks()
+        print(self.scheduler.report())
+        self.scheduler.save()
+        print(
+            f"✅ pipeline wrote {len(self.scripts)} script(s), "
+            f"{len(clean)}/{self.videos} narrated into clean.json"
+        )
+        return clean
+
+
+# ──────────────────────────── CLI entry ───────────────────────────────
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--videos", type=int, default=10, help="clean stories to produce")
+    ap.add_argument("--limit", type=int, default=50, help="posts per subreddit")
+    ap.add_argument("--workers", type=int, default=4, help="max stories generated concurrently; as many more are queued")
+    ap.add_argument("--confidence", type=float, default=DEFAULT_CONFIDENCE,
+                    help="chance the stories in flight reach the target")
+    ap.add_argument(
+        "--fallback",
+        action="store_true",
+        help="use mock data when Reddit, OpenAI or ElevenLabs fail",
+    )
+    ap.add_argument("--incremental", action="store_true",
+                    help="skip Reddit posts used on an earlier run")
+    args = ap.parse_args()
+
+    Pipeline(
+        videos=args.videos,
+        posts_per_sub=args.limit,
+        workers=args.workers,
+        allow_fallback=args.fallback,
+        incremental=args.incremental,
+        confidence=args.confidence,
+    ).run()
@@ -0,0 +1,371 @@
+"""
+Quota governor
+--------------
+One rate limiter for every outbound provider call, shared by all agent
+processes on the machine, so parallel workers together stay under the
+account's limits instead of each discovering them through 429s.
+
+Each provider has token buckets for requests per minute and, where the
+provider meters them, tokens (OpenAI) or characters (ElevenLabs) per
+minute. Buckets live in SQLite (QUOTA_DB, default .cache/quota.sqlite3)
+and are refilled and debited inside one write transaction, so any number
+of processes draw from the same budget. A bucket holds at most
+BURST_SECONDS of its rate, which keeps the start of a run from bursting a
+whole minute's quota at once.
+
+The governor adapts:
+
+- x-ratelimit-* response headers (OpenAI) replace the configured limit
+  with the account's real one for LEARNED_SECONDS and cap the bucket at
+  what the server says is left; after that the configured limit applies
+  again, so a changed OPENAI_RPM takes effect even with a cached store;
+- a 429 pauses the provider for every process until its Retry-After and
+  cuts the rate by BACKOFF_FACTOR; each success wins back RECOVERY_STEP
+  of it;
+- CIRCUIT_FAILURES 5xx replies in a row open the circuit: calls fail fast
+  with CircuitOpen for CIRCUIT_SECONDS, then one probe is let through.
+
+OpenAI limits are per model, so every model gets its own buckets and
+pause/circuit state under "openai:<model>"; each draws on the configured
+OpenAI limits. Limits come from the environment (0 = unmetered):
+
+    OPENAI_RPM (500)   OPENAI_TPM (200000)
+    E11_RPM (120)      E11_CPM (0)
+    REDDIT_RPM (100)
+
+OpenAI clients built with openai_client() run every request – including
+the SDK's own retries – through the governor via httpx event hooks, which
+also count every retried and every rate-limited OpenAI request in the
+metrics (agents/metrics.py). Other callers use acquire()/observe() around
+their requests and backoff() for jittered retry delays.
+"""
+from __future__ import annotations
+
+import asyncio, json, os, random, re, sqlite3, threading, time
+from typing import Dict, Mapping, Optional, Tuple
+
+try:
+    from agents import metrics
+except ImportError:  # run as a script from agents/
+    import metrics
+
+DEFAULT_DB = ".cache/quota.sqlite3"
+BURST_SECONDS = 10.0
+BACKOFF_FACTOR = 0.7
+RECOVERY_STEP = 0.02
+MIN_SCALE = 0.1
+CIRCUIT_FAILURES = 5
+CIRCUIT_SECONDS = 30.0
+MAX_BACKOFF = 60.0
+LEARNED_SECONDS = 600.0
+
+# provider → {kind: (env var, default per minute)}
+LIMITS: Dict[str, Dict[str, Tuple[str, float]]] = {
+    "openai": {"requests": ("OPENAI_RPM", 500), "units": ("OPENAI_TPM", 200_000)},
+    "elevenlabs": {"requests": ("E11_RPM", 120), "units": ("E11_CPM", 0)},
+    "reddit": {"requests": ("REDDIT_RPM", 100)},
+}
+# OpenAI header suffix → bucket kind
+HEADER_KINDS = {"requests": "requests", "tokens": "units"}
+
+
+class CircuitOpen(RuntimeError):
+    """The provider failed repeatedly; calls are refused until it cools down."""
+
+
+# ─────────────────────────────── utils ────────────────────────────────
+def parse_reset(value: str) -> Optional[float]:
+    """OpenAI reset durations: '1s', '6m0s', '20ms', '1h2m3.5s' → seconds."""
+    if not value:
+        return None
+    total, matched = 0.0, False
+    for amount, unit in re.findall(r"([\d.]+)(ms|h|m|s)", value):
+        total += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+        matched = True
+    return total if matched else None
+
+
+def retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    value = next((v for k, v in (headers or {}).items() if k.lower() == "retry-after"), None)
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def openai_body(request) -> Dict:
+    """JSON body of an outgoing OpenAI request; {} when streamed or not JSON."""
+    try:
+        body = json.loads(request.content or b"{}")
+    except Exception:
+        return {}
+    return body if isinstance(body, dict) else {}
+
+
+def openai_bucket(body: Dict) -> str:
+    """Provider key of a request: OpenAI meters each model separately."""
+    return f"openai:{body['model']}" if body.get("model") else "openai"
+
+
+def openai_op(request) -> str:
+    """Metrics op of an OpenAI request: chat, embeddings or moderation."""
+    endpoint = request.url.path.rstrip("/").rsplit("/", 1)[-1]
+    return {"completions": "chat", "moderations": "moderation"}.get(endpoint, endpoint)
+
+
+def count_openai(request, status: int = None) -> None:
+    """Count SDK retries on the way out and 429s on the way back."""
+    op = openai_op(request)
+    if status is None:
+        if request.headers.get("x-stainless-retry-count", "0") not in ("", "0"):
+            metrics.count("retries", provider="openai", op=op)
+    elif status == 429:
+        metrics.count("rate_limited", provider="openai", op=op)
+
+
+def estimate_openai_units(request: Dict) -> int:
+    """Tokens a request body counts against TPM: ~4 chars per prompt token plus max_tokens."""
+    text = request.get("input") or ""
+    if request.get("messages"):
+        text = " ".join(str(m.get("content", "")) for m in request["messages"])
+    elif isinstance(text, list):
+        text = " ".join(map(str, text))
+    return len(str(text)) // 4 + 1 + int(request.get("max_tokens") or 0)
+
+
+# ─────────────────────────────── governor ─────────────────────────────
+class QuotaGovernor:
+    def __init__(self, path: str = None, limits: Dict[str, Dict[str, float]] = None):
+        self.path = path or os.getenv("QUOTA_DB", DEFAULT_DB)
+        self.limits = limits or {
+            provider: {kind: float(os.getenv(env, default)) for kind, (env, default) in kinds.items()}
+            for provider, kinds in LIMITS.items()
+        }
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=30, check_same_thread=False,
+                                  isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS buckets (
+                provider   TEXT NOT NULL,
+                kind       TEXT NOT NULL,
+                per_min    REAL NOT NULL,
+                level      REAL NOT NULL,
+                updated    REAL NOT NULL,
+                learned_at REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (provider, kind)
+            );
+            CREATE TABLE IF NOT EXISTS providers (
+                provider   TEXT PRIMARY KEY,
+                scale      REAL NOT NULL DEFAULT 1.0,
+                paused_to  REAL NOT NULL DEFAULT 0,
+                failures   INTEGER NOT NULL DEFAULT 0,
+                open_until REAL NOT NULL DEFAULT 0
+            );
+            """
+        )
+
+    def _transaction(self, fn):
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(time.time())
+                self.db.execute("COMMIT")
+                return result
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+
+    def _limits(self, provider: str) -> Dict[str, float]:
+        """Configured limits; "openai:<model>" uses those of "openai"."""
+        return self.limits.get(provider, self.limits.get(provider.split(":")[0], {}))
+
+    def _provider(self, provider: str) -> Tuple[float, float, int, float]:
+        self.db.execute("INSERT OR IGNORE INTO providers (provider) VALUES (?)", (provider,))
+        return self.db.execute(
+            "SELECT scale, paused_to, failures, open_until FROM providers WHERE provider = ?",
+            (provider,),
+        ).fetchone()
+
+    # ──────────────────────────────────────────────────────────────────
+    def reserve(self, provider: str, units: float = 0) -> float:
+        """Debit one request (and *units*) if the budget allows.
+
+        Returns 0 when granted, else the seconds to wait before asking
+        again. Raises CircuitOpen while the provider's circuit is open.
+        """
+        kinds = {kind: per_min for kind, per_min in self._limits(provider).items() if per_min}
+
+        def attempt(now: float) -> float:
+            scale, paused_to, failures, open_until = self._provider(provider)
+            if open_until > now:
+                raise CircuitOpen(f"{provider} circuit open for {open_until - now:.0f}s")
+            if paused_to > now:
+                return paused_to - now
+            levels = {}
+            wait = 0.0
+            for kind, configured in kinds.items():
+                cost = 1.0 if kind == "requests" else float(units)
+                row = self.db.execute(
+                    "SELECT per_min, level, updated, learned_at FROM buckets"
+                    " WHERE provider = ? AND kind = ?",
+                    (provider, kind),
+                ).fetchone()
+                learned, level, updated, learned_at = row if row else (None, None, now, 0.0)
+                # A limit learned from headers holds for a while; then the config applies again.
+                per_min = learned if now - learned_at < LEARNED_SECONDS else configured
+                rate = per_min * scale / 60.0
+                capacity = max(1.0, rate * BURST_SECONDS)
+                level = capacity if level is None else min(capacity, level + (now - updated) * rate)
+                levels[kind] = level
+                # A request larger than the bucket waits for a full bucket and runs into debt.
+                need = min(cost, capacity)
+                if level < need:
+                    wait = max(wait, (need - level) / rate)
+            if wait > 0:
+                return wait
+            for kind, level in levels.items():
+                cost = 1.0 if kind == "requests" else float(units)
+                self.db.execute(
+                    """
+                    INSERT INTO buckets (provider, kind, per_min, level, updated) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (provider, kind) DO UPDATE
+                    SET level = excluded.level, updated = excluded.updated
+                    """,
+                    (provider, kind, kinds[kind], level - cost, now),
+                )
+            if failures >= CIRCUIT_FAILURES:
+                # Half-open: this caller is the probe; the rest wait for its outcome.
+                self.db.execute("UPDATE providers SET open_until = ? WHERE provider = ?",
+                                (now + CIRCUIT_SECONDS, provider))
+            return 0.0
+
+        return self._transaction(attempt)
+
+    def acquire(self, provider: str, units: float = 0) -> None:
+        while True:
+            wait = self.reserve(provider, units)
+            if wait <= 0:
+                return
+            time.sleep(wait * (1 + 0.1 * random.random()))
+
+    async def aacquire(self, provider: str, units: float = 0) -> None:
+        while True:
+            wait = await asyncio.to_thread(self.reserve, provider, units)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait * (1 + 0.1 * random.random()))
+
+    # ──────────────────────────────────────────────────────────────────
+    def observe(self, provider: str, status: int, headers: Mapping[str, str] = None) -> None:
+        """Adapt to a response: learned limits, 429 pauses, circuit state."""
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+
+        def update(now: float):
+            scale, paused_to, failures, open_until = self._provider(provider)
+            if status == 429:
+                pause = retry_after(headers)
+                if pause is None:
+                    pause = parse_reset(headers.get("x-ratelimit-reset-requests", "")) or 1.0
+                self.db.execute(
+                    "UPDATE providers SET scale = ?, paused_to = MAX(paused_to, ?) WHERE provider = ?",
+                    (max(MIN_SCALE, scale * BACKOFF_FACTOR), now + pause, provider),
+                )
+            elif status >= 500:
+                failures += 1
+                self.db.execute(
+                    "UPDATE providers SET failures = ?, open_until = ? WHERE provider = ?",
+                    (failures, now + CIRCUIT_SECONDS if failures >= CIRCUIT_FAILURES else 0, provider),
+                )
+            else:
+                self.db.execute(
+                    "UPDATE providers SET scale = ?, failures = 0, open_until = 0 WHERE provider = ?",
+                    (min(1.0, scale + RECOVERY_STEP), provider),
+                )
+            for suffix, kind in HEADER_KINDS.items():
+                limit = headers.get(f"x-ratelimit-limit-{suffix}")
+                remaining = headers.get(f"x-ratelimit-remaining-{suffix}")
+                if limit is None or kind not in self._limits(provider):
+                    continue
+                try:
+                    limit, remaining = float(limit), float(remaining)
+                except (TypeError, ValueError):
+                    continue
+                row = self.db.execute(
+                    "SELECT level FROM buckets WHERE provider = ? AND kind = ?", (provider, kind)
+                ).fetchone()
+                capacity = max(1.0, limit * scale / 60.0 * BURST_SECONDS)
+                level = min(row[0] if row else capacity, capacity, remaining)
+                self.db.execute("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?, ?, ?)",
+                                (provider, kind, limit, level, now, now))
+
+        self._transaction(update)
+
+    def failed(self, provider: str) -> None:
+        """A request that got no response at all counts toward the circuit."""
+        self.observe(provider, 599)
+
+    @staticmethod
+    def backoff(attempt: int) -> float:
+        """Full-jitter exponential backoff, for retries without a Retry-After."""
+        return random.uniform(0, min(MAX_BACKOFF, 2 ** attempt))
+
+    @staticmethod
+    def retry_delay(headers: Mapping[str, str], attempt: int) -> float:
+        """Seconds before retrying a 429: the server's Retry-After, else backoff."""
+        wait = retry_after(headers)
+        return QuotaGovernor.backoff(attempt) if wait is None else wait
+
+    def close(self) -> None:
+        self.db.close()
+
+    # ── OpenAI clients ────────────────────────────────────────────────
+    # openai is imported here so the narrator doesn't pay for it.
+    def openai_client(self, **kwargs) -> "openai.OpenAI":
+        import openai
+
+        def before(request):
+            count_openai(request)
+            body = openai_body(request)
+            request.extensions["quota_provider"] = openai_bucket(body)
+            self.acquire(request.extensions["quota_provider"], estimate_openai_units(body))
+
+        def after(response):
+            count_openai(response.request, response.status_code)
+            provider = response.request.extensions.get("quota_provider", "openai")
+            self.observe(provider, response.status_code, response.headers)
+
+        hooks = {"request": [before], "response": [after]}
+        return openai.OpenAI(http_client=openai.DefaultHttpxClient(event_hooks=hooks), **kwargs)
+
+    def async_openai_client(self, **kwargs) -> "openai.AsyncOpenAI":
+        import openai
+
+        async def before(request):
+            count_openai(request)
+            body = openai_body(request)
+            request.extensions["quota_provider"] = openai_bucket(body)
+            await self.aacquire(request.extensions["quota_provider"], estimate_openai_units(body))
+
+        async def after(response):
+            count_openai(response.request, response.status_code)
+            provider = response.request.extensions.get("quota_provider", "openai")
+            await asyncio.to_thread(self.observe, provider, response.status_code, response.headers)
+
+        hooks = {"request": [before], "response": [after]}
+        return openai.AsyncOpenAI(http_client=openai.DefaultAsyncHttpxClient(event_hooks=hooks), **kwargs)
+
+
+_shared: Optional[QuotaGovernor] = None
+_shared_lock = threading.Lock()
+
+
+def governor() -> QuotaGovernor:
+    """The process-wide governor (one SQLite connection per process)."""
+    global _shared
+    with _shared_lock:
+        if _shared is None or _shared.path != os.getenv("QUOTA_DB", DEFAULT_DB):
+            _shared = QuotaGovernor()
+        return _shared
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Render
+------
+Render every story in clean.json with its own narration.
+
+The visualizer is bundled once (`remotion bundle`) and every render points
+at that bundle, instead of `npx remotion render visualizer/src/index.ts`
+re-bundling the project per video. Renders run as parallel `remotion
+render` processes; the pool is sized from CPU count and memory, and each
+render gets --threads-per-render frames in flight (overriding the
+Config.setConcurrency(1) default in remotion.config.ts).
+
+Outputs go to out/<id>.mp4 and a summary to out/manifest.json.
+
+CLI flags
+---------
+--workers N              Parallel renders (default: sized from cores/RAM)
+--threads-per-render N   Remotion --concurrency for each render (default 2)
+--clean FILE             Input scripts (default clean.json)
+
+Example
+-------
+python agents/render.py
+"""
+from __future__ import annotations
+
+import argparse, json, os, shutil, subprocess, sys, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+try:
+    from agents import metrics
+except ImportError:  # run as `python agents/render.py`
+    import metrics
+
+ENTRY = "visualizer/src/index.ts"
+COMPOSITION = "StoryVideo"
+BUNDLE_DIR = "build/bundle"
+PROPS_DIR = "build/props"
+PUBLIC_AUDIO = "public/audio"
+AUDIO_DIR = "audio"
+OUT_DIR = "out"
+# Rough peak RSS of one headless-Chrome render at 1080x1920.
+MEM_PER_RENDER_GB = 1.5
+
+
+# ─────────────────────────────── utils ────────────────────────────────
+def total_memory_gb() -> Optional[float]:
+    try:
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") / 2**30
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def default_workers(threads_per_render: int) -> int:
+    cores = os.cpu_count() or 1
+    by_cpu = cores // max(1, threads_per_render)
+    mem = total_memory_gb()
+    by_mem = int(mem // MEM_PER_RENDER_GB) if mem else by_cpu
+    return max(1, min(by_cpu, by_mem))
+
+
+# ─────────────────────────────── main class ───────────────────────────
+class RenderDriver:
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        threads_per_render: int = 2,
+        clean_file: str = "clean.json",
+    ):
+        self.threads_per_render = max(1, threads_per_render)
+        self.workers = workers or default_workers(self.threads_per_render)
+        self.clean_file = clean_file
+
+    # ------------------------------------------------------------------
+    def read_scripts(self) -> List[Dict]:
+        try:
+            with open(self.clean_file, "r", encoding="utf-8") as f:
+                return [s for s in json.load(f) if s.get("audio_file")]
+        except FileNotFoundError:
+            print(f"{self.clean_file} not found. Run the pipeline first.")
+            return []
+
+    def stage_audio(self, scripts: List[Dict]) -> None:
+        """Copy narration into public/ – the bundle snapshots it at build time."""
+        os.makedirs(PUBLIC_AUDIO, exist_ok=True)
+        for script in scripts:
+            shutil.copyfile(
+                os.path.join(AUDIO_DIR, script["audio_file"]),
+                os.path.join(PUBLIC_AUDIO, script["audio_file"]),
+            )
+
+    @metrics.staged("bundle")
+    def bundle(self) -> None:
+        print("Bundling visualizer…")
+        subprocess.run(
+            ["npx", "remotion", "bundle", ENTRY, "--out-dir", BUNDLE_DIR],
+            check=True,
+        )
+
+    def prepare(self) -> None:
+        """Bundle once up front for a worker that renders as narrations arrive."""
+        os.makedirs(OUT_DIR, exist_ok=True)
+        os.makedirs(PROPS_DIR, exist_ok=True)
+        os.makedirs(PUBLIC_AUDIO, exist_ok=True)
+        self.bundle()
+
+    def render_queued(self, script: Dict) -> Dict:
+        """Render a script narrated after the bundle was built.
+
+        Its audio is copied into the bundle's own public/ snapshot as well.
+        """
+        for folder in (PUBLIC_AUDIO, os.path.join(BUNDLE_DIR, PUBLIC_AUDIO)):
+            os.makedirs(folder, exist_ok=True)
+            shutil.copyfile(
+                os.path.join(AUDIO_DIR, script["audio_file"]),
+                os.path.join(folder, script["audio_file"]),
+            )
+        return self.render_one(script)
+
+    @staticmethod
+    def captions(script: Dict) -> Optional[Dict]:
+        """Word timings written by the narrator, or None (fixed-pace captions)."""
+        if not script.get("timings_file"):
+            return None
+        try:
+            with open(os.path.join(AUDIO_DIR, script["timings_file"]), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    @classmethod
+    def props(cls, script: Dict) -> Dict:
+        return {
+            "storyText": f"{script['title']}: {script['story']}",
+            "audioFile": f"audio/{script['audio_file']}",
+            "audioDuration": script.get("audio_duration", 0),
+            "captions": cls.captions(script),
+        }
+
+    @metrics.staged("render")
+    def render_one(self, script: Dict) -> Dict:
+        output = os.path.join(OUT_DIR, f"{script['id']}.mp4")
+        props_path = os.path.join(PROPS_DIR, f"{script['id']}.json")
+        with open(props_path, "w", encoding="utf-8") as f:
+            json.dump(self.props(script), f, ensure_ascii=False)
+
+        started = time.monotonic()
+        proc = subprocess.run(
+            [
+                "npx", "remotion", "render", BUNDLE_DIR, COMPOSITION, output,
+                "--codec=h264",
+                f"--props={props_path}",
+                f"--concurrency={self.threads_per_render}",
+            ],
+            capture_output=True,
+            text=True,
+        )
+        entry = {
+            "id": script["id"],
+            "title": script["title"],
+            "audio_file": script["audio_file"],
+            "output": output,
+            "ok": proc.returncode == 0,
+            "seconds": round(time.monotonic() - started, 2),
+        }
+        if proc.returncode == 0:
+            print(f"  ✓ {output} ({entry['seconds']}s)")
+        else:
+            entry["error"] = (proc.stderr or proc.stdout)[-2000:]
+            print(f"  ✗ {script['id']} failed:\n{entry['error']}", file=sys.stderr)
+        return entry
+
+    # ------------------------------------------------------------------
+    def run(self) -> List[Dict]:
+        scripts = self.read_scripts()
+        if not scripts:
+            print("No narrated scripts to render. Exiting.")
+            return []
+
+        os.makedirs(OUT_DIR, exist_ok=True)
+        os.makedirs(PROPS_DIR, exist_ok=True)
+        self.stage_audio(scripts)
+        self.bundle()
+
+        print(
+            f"Rendering {len(scripts)} video(s): {self.workers} at a time, "
+            f"{self.threads_per_render} thread(s) each…"
+        )
+        # Each worker only waits on its own `remotion render` process.
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            manifest = list(pool.map(self.render_one, scripts))
+
+        with open(os.path.join(OUT_DIR, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        ok = sum(e["ok"] for e in manifest)
+        print(f"✅ render wrote {ok}/{len(manifest)} video(s) and out/manifest.json")
+        return manifest
+
+
+# ──────────────────────────── CLI entry ───────────────────────────────
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=None, help="parallel renders")
+    ap.add_argument("--threads-per-render", type=int, default=2,
+                    help="remotion --concurrency per render")
+    ap.add_argument("--clean", default="clean.json", help="input scripts")
+    args = ap.parse_args()
+
+    manifest = RenderDriver(
+        workers=args.workers,
+        threads_per_render=args.threads_per_render,
+        clean_file=args.clean,
+    ).run()
+    sys.exit(0 if any(e["ok"] for e in manifest) else 1)
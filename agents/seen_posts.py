@@ -0,0 +1,97 @@
+"""
+Seen posts
+----------
+Persistent index of the Reddit posts Trend-Scout has already seen, so an
+incremental run only embeds and ranks posts that are new since last time.
+
+One row per post id: subreddit, first-seen and last-seen time, the score
+at the last sighting, and when it was used. A post counts as done once it
+is used – its story got a compliance verdict – not when it is ranked: a
+post ranked but never written (cut by the local scorer, below the top 50,
+or lost to a crash) stays eligible, and its embedding comes back from the
+embedding cache. Rows not sighted for SEEN_MAX_DAYS (default 14) are aged
+out, so a post that falls off the hot listing is eventually forgotten.
+
+Stored at SEEN_DB (default .cache/seen.sqlite3).
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List
+
+DEFAULT_DB = ".cache/seen.sqlite3"
+DEFAULT_MAX_DAYS = 14
+
+
+class SeenPosts:
+    def __init__(self, path: str = None, max_days: float = None):
+        self.path = path or os.getenv("SEEN_DB", DEFAULT_DB)
+        self.max_age = float(max_days or os.getenv("SEEN_MAX_DAYS", DEFAULT_MAX_DAYS)) * 86400
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS posts (
+                id         TEXT PRIMARY KEY,
+                subreddit  TEXT NOT NULL,
+                first_seen REAL NOT NULL,
+                last_seen  REAL NOT NULL,
+                last_score INTEGER NOT NULL,
+                used_at    REAL
+            );
+            CREATE INDEX IF NOT EXISTS posts_last_seen ON posts (last_seen);
+            """
+        )
+
+    # ──────────────────────────────────────────────────────────────────
+    def __len__(self) -> int:
+        with self._lock:
+            return self.db.execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+
+    def observe(self, posts: List[Dict]) -> List[Dict]:
+        """Record a sighting of every post; return those not used before.
+
+        Also ages out rows not sighted within the retention window.
+        """
+        now = time.time()
+        ids = [str(p["id"]) for p in posts]
+        with self._lock, self.db:
+            used = set()
+            # Stay under SQLite's bound-parameter limit on big listings.
+            for i in range(0, len(ids), 500):
+                chunk = ids[i : i + 500]
+                used.update(
+                    pid for (pid,) in self.db.execute(
+                        f"SELECT id FROM posts WHERE used_at IS NOT NULL "
+                        f"AND id IN ({','.join('?' * len(chunk))})",
+                        chunk,
+                    )
+                )
+            self.db.executemany(
+                """
+                INSERT INTO posts (id, subreddit, first_seen, last_seen, last_score)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE
+                SET last_seen = excluded.last_seen, last_score = excluded.last_score
+                """,
+                [(str(p["id"]), p["subreddit"], now, now, int(p.get("score") or 0)) for p in posts],
+            )
+            self.db.execute("DELETE FROM posts WHERE last_seen < ?", (now - self.max_age,))
+        return [p for p in posts if str(p["id"]) not in used]
+
+    def mark_used(self, ids: Iterable[str]) -> None:
+        """Called once a post's story has a compliance verdict."""
+        now = time.time()
+        with self._lock, self.db:
+            self.db.executemany(
+                "UPDATE posts SET used_at = ? WHERE id = ?",
+                [(now, str(pid)) for pid in ids],
+            )
+
+    def close(self) -> None:
+        self.db.close()
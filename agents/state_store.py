@@ -0,0 +1,163 @@
+"""
+State store
+-----------
+Durable per-post pipeline state, so a crashed or repeated run resumes
+where it stopped instead of paying for finished API calls again.
+
+Every record is keyed on its Reddit post id. `records` holds the merged
+fields written by each stage (hook, story, quality score, audio file …);
+`stages` holds one status row per (post, stage):
+
+    done       the stage finished; its fields are in the record
+    rejected   the stage ran and dropped the post (compliance only)
+    failed     the stage errored; the next run retries it
+
+A stage that judges the story text (compliance, narration) also stores
+`<stage>_hash`, the SHA-256 of the text it saw; passing that text to
+status()/finished() replays the stage only for the same text, so a story
+rewritten since (a fallback, or a --no-state writer run) is judged again.
+
+A stage result and its status are committed in one transaction. The
+handoff files (hooks.csv, scripts.json, clean.json) are still written for
+the render step and the workflow artifacts, but agents consult this store
+before doing any work.
+
+Stored at PIPELINE_DB (default .cache/pipeline.sqlite3), SQLite in WAL mode
+so parallel agent processes can share it.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+DEFAULT_PATH = ".cache/pipeline.sqlite3"
+
+SCOUT = "scout"
+STORY = "story"
+COMPLIANCE = "compliance"
+NARRATION = "narration"
+
+DONE = "done"
+REJECTED = "rejected"
+FAILED = "failed"
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class StateStore:
+    def __init__(self, path: str = None):
+        self.path = path or os.getenv("PIPELINE_DB", DEFAULT_PATH)
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS records (
+                id         TEXT PRIMARY KEY,
+                data       TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS stages (
+                id         TEXT NOT NULL,
+                stage      TEXT NOT NULL,
+                status     TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (id, stage)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS stages_by_status ON stages (stage, status);
+            """
+        )
+
+    # ──────────────────────────────────────────────────────────────────
+    def _merge(self, record_id: str, fields: Dict, now: float) -> None:
+        self.db.execute(
+            """
+            INSERT INTO records (id, data, created_at, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE
+            SET data = json_patch(records.data, excluded.data), updated_at = excluded.updated_at
+            """,
+            (record_id, json.dumps(fields, ensure_ascii=False), now, now),
+        )
+
+    def _mark(self, record_id: str, stage: str, status: str, now: float) -> None:
+        self.db.execute(
+            "INSERT OR REPLACE INTO stages (id, stage, status, updated_at) VALUES (?, ?, ?, ?)",
+            (record_id, stage, status, now),
+        )
+
+    def upsert(self, records: Iterable[Dict], stage: str = SCOUT) -> None:
+        """Merge *records* (each with an "id") and mark them done for *stage*."""
+        now = time.time()
+        with self._lock, self.db:
+            for record in records:
+                self._merge(str(record["id"]), record, now)
+                self._mark(str(record["id"]), stage, DONE, now)
+
+    def complete(self, record_id: str, stage: str, fields: Dict = None,
+                 status: str = DONE, text: str = None) -> None:
+        """Atomically merge *fields* into the record and set its *stage* status.
+
+        With *text*, the status holds only for that text (see status()).
+        """
+        now = time.time()
+        if text is not None:
+            fields = dict(fields or {}, **{f"{stage}_hash": content_hash(text)})
+        with self._lock, self.db:
+            self._merge(str(record_id), fields or {}, now)
+            self._mark(str(record_id), stage, status, now)
+
+    # ──────────────────────────────────────────────────────────────────
+    def get(self, record_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self.db.execute(
+                "SELECT data FROM records WHERE id = ?", (str(record_id),)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def status(self, record_id: str, stage: str, text: str = None) -> Optional[str]:
+        """The *stage* status, or None if it was recorded for other than *text*."""
+        with self._lock:
+            row = self.db.execute(
+                """
+                SELECT s.status, json_extract(r.data, ?) FROM stages s
+                LEFT JOIN records r ON r.id = s.id
+                WHERE s.id = ? AND s.stage = ?
+                """,
+                (f"$.{stage}_hash", str(record_id), stage),
+            ).fetchone()
+        if row is None or (text is not None and row[1] != content_hash(text)):
+            return None
+        return row[0]
+
+    def finished(self, record_id: str, stage: str, text: str = None) -> Optional[Dict]:
+        """The record if *stage* is done for it (for *text*, if given), else None."""
+        if self.status(record_id, stage, text) != DONE:
+            return None
+        return self.get(record_id)
+
+    def pending(self, stage: str, after: str) -> List[Dict]:
+        """Records done for *after* but not yet done or rejected for *stage*."""
+        with self._lock:
+            rows = self.db.execute(
+                """
+                SELECT r.data FROM records r
+                JOIN stages prev ON prev.id = r.id AND prev.stage = ? AND prev.status = ?
+                LEFT JOIN stages cur ON cur.id = r.id AND cur.stage = ?
+                WHERE cur.status IS NULL OR cur.status = ?
+                ORDER BY prev.updated_at, r.id
+                """,
+                (after, DONE, stage, FAILED),
+            ).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def close(self) -> None:
+        self.db.close()
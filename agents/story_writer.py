@@ -9,6 +9,17 @@ CLI flags
 --limit N      Generate at most N stories (default 10)
 --fallback     If OpenAI call fails, write a single hard-coded story so the
                pipeline can continue.
+--workers N    Stories generated concurrently (default 4); output order
+               always follows hooks.csv.
+--cache        Replay stories from the LLM response cache. Off by default:
+               stories are sampled at temperature 0.8, and a cached one
+               would hand the same hook the same story on a later day.
+--no-state     Regenerate stories already recorded in the state store.
+
+Stories already written for a post on an earlier run are reused from the
+pipeline state store (agents/state_store.py); each new story is committed
+there as soon as it is generated, so a crash loses at most the stories in
+flight.
 
 Example
 -------
@@ -16,19 +27,44 @@ python agents/story_writer.py --limit 1 --fallback
 """
 from __future__ import annotations
 
-import argparse, csv, json, os, sys
-from typing import List, Dict
+import argparse, csv, json, os, sys, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional
 
 import openai
 from dotenv import load_dotenv
 
+try:
+    from agents import metrics
+    from agents.llm_cache import LLMCache, cached_chat
+    from agents.quota import governor
+    from agents.state_store import STORY, StateStore
+except ImportError:  # run as `python agents/story_writer.py`
+    import metrics
+    from llm_cache import LLMCache, cached_chat
+    from quota import governor
+    from state_store import STORY, StateStore
+
 load_dotenv()
 
+FALLBACK_STORY = (
+    "I shouldn’t have opened my mouth at Thanksgiving. "
+    "The room went silent when I blurted the secret. "
+    "Little did I know Grandma already knew—and planned the twist."
+)
+
 
 # ─────────────────────────────── utils ────────────────────────────────
-def call_openai(prompt: str) -> str:
-    client = openai.OpenAI(api_key=os.getenv("OPENAI_KEY"))
-    rsp = client.chat.completions.create(
+def call_openai(
+    prompt: str,
+    client: Optional[openai.OpenAI] = None,
+    cache: Optional[LLMCache] = None,
+) -> str:
+    if client is None:
+        client = governor().openai_client(api_key=os.getenv("OPENAI_KEY"))
+    text = cached_chat(
+        client,
+        cache,
         model="gpt-4o-mini",
         messages=[
             {"role": "system", "content": "You are a master storyteller who creates viral short-form content."},
@@ -37,14 +73,34 @@ def call_openai(prompt: str) -> str:
         max_tokens=200,
         temperature=0.8,
     )
-    return rsp.choices[0].message.content.strip()
+    return text.strip()
 
 
 # ─────────────────────────────── main class ───────────────────────────
 class StoryWriter:
-    def __init__(self, limit: int = 10, allow_fallback: bool = True):
+    def __init__(
+        self,
+        limit: int = 10,
+        allow_fallback: bool = True,
+        workers: int = 4,
+        use_cache: bool = False,
+        use_state: bool = True,
+    ):
         self.limit = limit
         self.allow_fallback = allow_fallback
+        self.workers = max(1, workers)
+        self.llm_cache = LLMCache() if use_cache else None
+        self.state = StateStore() if use_state else None
+        self._client: Optional[openai.OpenAI] = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self) -> openai.OpenAI:
+        """One long-lived client (and connection pool) shared by all workers."""
+        with self._client_lock:
+            if self._client is None:
+                self._client = governor().openai_client(api_key=os.getenv("OPENAI_KEY"))
+            return self._client
 
     # ------------------------------------------------------------------
     @staticmethod
@@ -75,17 +131,31 @@ Write a compelling 160-word first-person story that:
 Story (first person):
 """
         try:
-            return call_openai(prompt)
+            return call_openai(prompt, self.client, self.llm_cache)
         except Exception as e:
             if self.allow_fallback:
                 print(f"⚠️  OpenAI failed ({e!s}); using fallback story.")
-                return (
-                    "I shouldn’t have opened my mouth at Thanksgiving. "
-                    "The room went silent when I blurted the secret. "
-                    "Little did I know Grandma already knew—and planned the twist."
-                )
+                return FALLBACK_STORY
             raise
 
+    # ------------------------------------------------------------------
+    @metrics.staged("story")
+    def build_script(self, hook: Dict) -> Dict:
+        done = self.state.finished(hook["id"], STORY) if self.state is not None else None
+        story = done["story"] if done else self.generate_story(hook)
+        script = {
+            "id": hook["id"],
+            "title": hook["title"],
+            "subreddit": hook["subreddit"],
+            "story": story,
+            "word_count": len(story.split()),
+            "engagement_score": float(hook.get("engagement_score") or 0.0),
+        }
+        # The canned fallback is not a result worth resuming from.
+        if self.state is not None and not done and story != FALLBACK_STORY:
+            self.state.complete(hook["id"], STORY, script)
+        return script
+
     # ------------------------------------------------------------------
     def save_scripts(self, scripts: List[Dict], fname: str = "scripts.json") -> None:
         with open(fname, "w", encoding="utf-8") as f:
@@ -98,23 +168,18 @@ Story (first person):
             print("No hooks found. Exiting.")
             return
 
+        workers = min(self.workers, len(hooks))
+        print(f"Generating stories for {len(hooks)} hooks ({workers} in parallel)…")
         scripts: List[Dict] = []
-        print(f"Generating stories for {len(hooks)} hooks…")
-        for idx, hook in enumerate(hooks, 1):
-            print(f"  • story {idx}/{len(hooks)}")
-            story = self.generate_story(hook)
-            scripts.append(
-                {
-                    "id": hook["id"],
-                    "title": hook["title"],
-                    "subreddit": hook["subreddit"],
-                    "story": story,
-                    "word_count": len(story.split()),
-                    "engagement_score": float(hook["engagement_score"]),
-                }
-            )
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # map() yields in submission order, so scripts.json follows hooks.csv
+            for idx, script in enumerate(pool.map(self.build_script, hooks), 1):
+                print(f"  • story {idx}/{len(hooks)}")
+                scripts.append(script)
 
         self.save_scripts(scripts)
+        if self.llm_cache is not None:
+            print(f"LLM cache: {self.llm_cache.stats()}")
         print(f"✅ story_writer wrote scripts.json with {len(scripts)} script(s)")
 
 
@@ -127,6 +192,15 @@ if __name__ == "__main__":
         action="store_true",
         help="write a dummy story if OpenAI is unreachable",
     )
+    ap.add_argument("--workers", type=int, default=4, help="stories generated concurrently")
+    ap.add_argument("--cache", action="store_true", help="replay stories from the LLM response cache")
+    ap.add_argument("--no-state", action="store_true", help="regenerate stories recorded in the state store")
     args = ap.parse_args()
 
-    StoryWriter(limit=args.limit, allow_fallback=args.fallback).run()
+    StoryWriter(
+        limit=args.limit,
+        allow_fallback=args.fallback,
+        workers=args.workers,
+        use_cache=args.cache,
+        use_state=not args.no_state,
+    ).run()
@@ -0,0 +1,59 @@
+"""
+Tokens
+------
+Token counting shared by the agents that have to pack text into a request
+budget (embedding batches, multi-story prompts).
+
+Uses tiktoken when its encoding can be loaded; otherwise falls back to the
+usual ~4 characters per token estimate so the pipeline never stalls on a
+missing BPE download.
+"""
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Iterator, List, Optional, Sequence
+
+import tiktoken
+
+DEFAULT_ENCODING = "cl100k_base"
+
+
+@lru_cache(maxsize=None)
+def _encoding(name: str) -> Optional["tiktoken.Encoding"]:
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception:
+        return None
+
+
+def count_tokens(text: str, encoding: str = DEFAULT_ENCODING) -> int:
+    enc = _encoding(encoding)
+    if enc is None:
+        return len(text) // 4 + 1
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def pack_by_tokens(
+    texts: Sequence[str],
+    max_tokens: int,
+    max_items: int,
+    encoding: str = DEFAULT_ENCODING,
+    overhead: int = 0,
+) -> Iterator[List[int]]:
+    """Yield lists of indices into *texts*, each fitting the token budget.
+
+    A single text larger than *max_tokens* still gets a batch of its own –
+    the caller decides whether that is an error.
+    """
+    batch: List[int] = []
+    used = 0
+    for i, text in enumerate(texts):
+        n = count_tokens(text, encoding) + overhead
+        if batch and (used + n > max_tokens or len(batch) >= max_items):
+            yield batch
+            batch, used = [], 0
+        batch.append(i)
+        used += n
+    if batch:
+        yield batch
+
@@ -9,6 +9,17 @@ CLI flags
 --limit    N   Number of posts per subreddit (default 50)
 --fallback     If Reddit auth fails, write one mock hook so the
                rest of the pipeline can run.
+--no-cache     Skip the on-disk embedding cache (.cache/embeddings).
+--no-state     Don't register hooks in the pipeline state store.
+--incremental  Only embed and rank posts not used on an earlier run, i.e.
+               whose story never got a compliance verdict (index of seen
+               posts in .cache/seen.sqlite3).
+--top-k    N   Embed only the N titles the local scorer ranks highest
+               (default 20; 0 embeds every title).
+--eval-cascade Embed every title and report how well the local scorer's
+               top-K agrees with the full embedding ranking.
+
+Subreddits are fetched concurrently.
 
 Examples
 --------
@@ -18,8 +29,9 @@ python agents/trend_scout.py
 # quick test (1 post total) – never crashes, even with bad creds
 python agents/trend_scout.py --limit 1 --fallback
 """
-import argparse, csv, os, sys
-from typing import List, Dict
+import argparse, csv, math, os, sys, zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Sequence
 
 import numpy as np
 import praw
@@ -27,27 +39,175 @@ import prawcore
 import openai
 from dotenv import load_dotenv
 
+try:
+    from agents import metrics
+    from agents.embedding_cache import EmbeddingCache
+    from agents.quota import governor
+    from agents.seen_posts import SeenPosts
+    from agents.state_store import StateStore
+    from agents.tokens import pack_by_tokens
+except ImportError:  # run as `python agents/trend_scout.py`
+    import metrics
+    from embedding_cache import EmbeddingCache
+    from quota import governor
+    from seen_posts import SeenPosts
+    from state_store import StateStore
+    from tokens import pack_by_tokens
+
 load_dotenv()
 
+EMBED_MODEL = "text-embedding-3-small"
+# The endpoint takes up to 2048 inputs and 300k tokens per request; stay
+# well under the token cap so one oversized title can't fail a whole batch.
+EMBED_BATCH_ITEMS = 2048
+EMBED_BATCH_TOKENS = 100_000
+SEED_PHRASE = (
+    "shocking twist unexpected ending dramatic reveal "
+    "personal story emotional journey life changing moment"
+)
+# Local pre-ranker: hashed character n-grams vs the seed phrase, Reddit
+# score and title length. Only its top-K titles are embedded.
+DEFAULT_TOP_K = 20
+NGRAM_SIZES = (3, 4)
+NGRAM_DIM = 1 << 12
+CHEAP_WEIGHTS = {"similarity": 0.6, "popularity": 0.3, "length": 0.1}
+IDEAL_TITLE_CHARS = 80
+
 # ─────────────────────────────── utils ────────────────────────────────
-def cosine_similarity(a: List[float], b: List[float]) -> float:
-    a_np = np.array(a)
-    b_np = np.array(b)
-    return float(np.dot(a_np, b_np) / (np.linalg.norm(a_np) * np.linalg.norm(b_np)))
+def get_embedding(
+    client: openai.OpenAI, text: str, cache: Optional[EmbeddingCache] = None
+) -> List[float]:
+    if cache is not None:
+        return get_embeddings(client, [text], cache)[0].tolist()
+    with metrics.call("openai", "embeddings"):
+        rsp = client.embeddings.create(model=EMBED_MODEL, input=text)
+    metrics.usage("openai", "embeddings", rsp)
+    return rsp.data[0].embedding
 
 
-def get_embedding(client: openai.OpenAI, text: str) -> List[float]:
-    rsp = client.embeddings.create(model="text-embedding-3-small", input=text)
-    return rsp.data[0].embedding
+def get_embeddings(
+    client: openai.OpenAI,
+    texts: Sequence[str],
+    cache: Optional[EmbeddingCache] = None,
+) -> np.ndarray:
+    """Embed *texts* in as few requests as the token budget allows.
+
+    With a cache, only misses go to the network. Returns a float32 matrix
+    with one row per input, in input order.
+    """
+    rows: List[Optional[np.ndarray]] = [None] * len(texts)
+    todo = list(range(len(texts)))
+    if cache is not None:
+        found, todo = cache.get_many(texts)
+        for i, vec in found.items():
+            rows[i] = vec
+
+    pending = [texts[i] for i in todo]
+    for batch in pack_by_tokens(pending, EMBED_BATCH_TOKENS, EMBED_BATCH_ITEMS):
+        with metrics.call("openai", "embeddings"):
+            rsp = client.embeddings.create(
+                model=EMBED_MODEL, input=[pending[i] for i in batch]
+            )
+        metrics.usage("openai", "embeddings", rsp)
+        if len(rsp.data) != len(batch):
+            raise RuntimeError(
+                f"embeddings returned {len(rsp.data)} vectors for {len(batch)} inputs"
+            )
+        fresh = np.asarray([item.embedding for item in rsp.data], dtype=np.float32)
+        for i, vec in zip(batch, fresh):
+            rows[todo[i]] = vec
+        if cache is not None:
+            cache.put_many([pending[i] for i in batch], fresh)
+    return np.asarray(rows, dtype=np.float32)
+
+
+def score_against(matrix: np.ndarray, seed: np.ndarray) -> np.ndarray:
+    """Cosine similarity of every row of *matrix* with *seed*, in one pass."""
+    norms = np.linalg.norm(matrix, axis=1)
+    norms[norms == 0] = 1.0
+    seed_norm = float(np.linalg.norm(seed)) or 1.0
+    return (matrix @ seed) / (norms * seed_norm)
+
+
+def ngram_vectors(texts: Sequence[str]) -> np.ndarray:
+    """L2-normalised hashed character n-gram counts, one row per text."""
+    matrix = np.zeros((len(texts), NGRAM_DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        norm = f" {' '.join(text.lower().split())} "
+        buckets = [
+            zlib.crc32(norm[i : i + n].encode("utf-8")) % NGRAM_DIM
+            for n in NGRAM_SIZES
+            for i in range(len(norm) - n + 1)
+        ]
+        np.add.at(matrix[row], buckets, 1.0)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def cheap_scores(posts: Sequence[Dict], seed: str = SEED_PHRASE) -> np.ndarray:
+    """Score posts with no network call; higher means a more promising hook."""
+    vectors = ngram_vectors([seed] + [post["title"] for post in posts])
+    similarity = vectors[1:] @ vectors[0]
+    popularity = np.log1p(np.maximum([float(post.get("score") or 0) for post in posts], 0))
+    lengths = np.array([len(post["title"]) for post in posts], dtype=np.float32)
+    length = np.exp(-(((lengths - IDEAL_TITLE_CHARS) / IDEAL_TITLE_CHARS) ** 2))
+
+    def unit(x: np.ndarray) -> np.ndarray:
+        span = float(x.max() - x.min())
+        return (x - x.min()) / span if span else np.zeros_like(x, dtype=np.float32)
+
+    return (
+        CHEAP_WEIGHTS["similarity"] * unit(similarity)
+        + CHEAP_WEIGHTS["popularity"] * unit(popularity)
+        + CHEAP_WEIGHTS["length"] * length
+    )
+
+
+def ranks(scores: np.ndarray) -> np.ndarray:
+    """Rank of each score, 0 for the highest."""
+    out = np.empty(len(scores), dtype=np.int64)
+    out[np.argsort(-scores, kind="stable")] = np.arange(len(scores))
+    return out
+
+
+def cascade_report(cheap: np.ndarray, full: np.ndarray, k: int) -> Dict[str, float]:
+    """How well the cheap ranking stands in for the full one.
+
+    recall_at_k: share of the full top-K that the cheap top-K also picks.
+    spearman:    rank correlation of the two orderings over all posts.
+    """
+    k = max(1, min(k, len(full)))
+    cheap_top = set(np.argsort(-cheap, kind="stable")[:k].tolist())
+    full_top = set(np.argsort(-full, kind="stable")[:k].tolist())
+    rc, rf = ranks(cheap).astype(np.float64), ranks(full).astype(np.float64)
+    spearman = float(np.corrcoef(rc, rf)[0, 1]) if len(full) > 1 else 1.0
+    return {
+        "posts": len(full),
+        "k": k,
+        "recall_at_k": round(len(cheap_top & full_top) / k, 3),
+        "spearman": round(spearman, 3),
+    }
 
 
 # ─────────────────────────────── main class ───────────────────────────
 class TrendScout:
     SUBREDDITS = ["tifu", "confession", "aita"]
 
-    def __init__(self, posts_per_sub: int = 50, allow_fallback: bool = False):
+    def __init__(
+        self,
+        posts_per_sub: int = 50,
+        allow_fallback: bool = False,
+        use_cache: bool = True,
+        use_state: bool = True,
+        incremental: bool = False,
+        top_k: int = DEFAULT_TOP_K,
+    ):
         self.posts_per_sub = posts_per_sub
+        self.top_k = top_k
         self.allow_fallback = allow_fallback
+        self.embed_cache = EmbeddingCache(EMBED_MODEL) if use_cache else None
+        self.state = StateStore() if use_state else None
+        self.seen = SeenPosts() if incremental else None
 
         missing = [
             k
@@ -78,33 +238,61 @@ class TrendScout:
         openai_key = os.getenv("OPENAI_KEY")
         if openai_key:
             try:
-                self.openai_client = openai.OpenAI(api_key=openai_key)
+                self.openai_client = governor().openai_client(api_key=openai_key)
             except Exception:
                 self.openai_client = None
         else:
             self.openai_client = None
 
     # ──────────────────────────────────────────────────────────────────
+    def fetch_subreddit(self, sub: str) -> List[Dict]:
+        # One listing request per 100 posts; praw itself only honours the
+        # per-process rate-limit headers, the governor spans processes.
+        quota = governor()
+        for _ in range(max(1, math.ceil(self.posts_per_sub / 100))):
+            quota.acquire("reddit")
+        # The listing is paged lazily, so the whole comprehension is the call.
+        try:
+            with metrics.call("reddit", "hot"):
+                posts = [
+                    {
+                        "title": p.title,
+                        "subreddit": sub,
+                        "score": p.score,
+                        "url": p.url,
+                        "id": p.id,
+                    }
+                    for p in self.reddit.subreddit(sub).hot(limit=self.posts_per_sub)
+                    if not p.stickied and len(p.title) > 10
+                ]
+        except prawcore.exceptions.ResponseException as e:
+            quota.observe("reddit", e.response.status_code, e.response.headers)
+            raise
+        except prawcore.exceptions.RequestException:
+            quota.failed("reddit")
+            raise
+        quota.observe("reddit", 200)
+        return posts
+
+    @metrics.staged("fetch")
     def fetch_posts(self) -> List[Dict]:
+        """Hot posts from every subreddit, fetched concurrently.
+
+        In incremental mode posts used on an earlier run are dropped here,
+        before they cost an embedding.
+        """
         posts: List[Dict] = []
         try:
             if self.reddit is None:
                 raise prawcore.exceptions.Forbidden()
-            for sub in self.SUBREDDITS:
-                for p in (
-                    self.reddit.subreddit(sub)
-                    .hot(limit=self.posts_per_sub)
-                ):
-                    if not p.stickied and len(p.title) > 10:
-                        posts.append(
-                            {
-                                "title": p.title,
-                                "subreddit": sub,
-                                "score": p.score,
-                                "url": p.url,
-                                "id": p.id,
-                            }
-                        )
+            # Listings are independent, read-only GETs; map() keeps subreddit order.
+            with ThreadPoolExecutor(max_workers=len(self.SUBREDDITS)) as pool:
+                for batch in pool.map(self.fetch_subreddit, self.SUBREDDITS):
+                    posts.extend(batch)
+            if self.seen is not None:
+                fetched = len(posts)
+                posts = self.seen.observe(posts)
+                print(f"{len(posts)} of {fetched} posts are new since the last run")
         except Exception:
             if self.allow_fallback:
                 print(
@@ -128,20 +316,57 @@ class TrendScout:
         return posts
 
     # ──────────────────────────────────────────────────────────────────
-    def rank(self, raw: List[Dict]) -> List[Dict]:
-        seed = (
-            "shocking twist unexpected ending dramatic reveal "
-            "personal story emotional journey life changing moment"
+    def embedding_scores(self, posts: Sequence[Dict]) -> np.ndarray:
+        vectors = get_embeddings(
+            self.openai_client,
+            [SEED_PHRASE] + [post["title"] for post in posts],
+            self.embed_cache,
         )
-        if self.openai_client is None:
+        return score_against(vectors[1:], vectors[0])
+
+    @metrics.staged("rank")
+    def rank(self, raw: List[Dict]) -> List[Dict]:
+        """Order posts by engagement score, best first.
+
+        With more than top_k posts, a local scorer picks the top_k and only
+        those are embedded; the rest follow in local-score order. Their
+        engagement_score is the local score (0-1) shifted to end at the
+        lowest embedding score, so the column still sorts in rank order.
+        """
+        if self.openai_client is None or not raw:
             return raw
-        seed_vec = get_embedding(self.openai_client, seed)
+        rest: List[Dict] = []
+        candidates = raw
+        if self.top_k and len(raw) > self.top_k:
+            cheap = cheap_scores(raw)
+            order = np.argsort(-cheap, kind="stable")
+            candidates = [raw[i] for i in order[: self.top_k]]
+            rest = [raw[i] for i in order[self.top_k :]]
+            rest_cheap = cheap[order[self.top_k :]].tolist()
+            print(f"Local scorer kept {len(candidates)} of {len(raw)} titles for embedding")
+        scores = self.embedding_scores(candidates)
+
+        for post, score in zip(candidates, scores.tolist()):
+            post["engagement_score"] = score
+        if rest:
+            floor = float(scores.min()) - 1.0
+            for post, score in zip(rest, rest_cheap):
+                post["engagement_score"] = floor + score
 
-        for post in raw:
-            v = get_embedding(self.openai_client, post["title"])
-            post["engagement_score"] = cosine_similarity(v, seed_vec)
+        return sorted(candidates, key=lambda x: x["engagement_score"], reverse=True) + rest
 
-        return sorted(raw, key=lambda x: x["engagement_score"], reverse=True)
+    def evaluate_cascade(self, raw: List[Dict]) -> Dict[str, float]:
+        """Embed every post and compare the local ranking against it."""
+        if self.openai_client is None or not raw:
+            raise RuntimeError("Cascade evaluation needs OPENAI_KEY and at least one post.")
+        report = cascade_report(cheap_scores(raw), self.embedding_scores(raw),
+                                self.top_k or len(raw))
+        print(
+            f"Cascade on {report['posts']} posts: cheap top-{report['k']} recovers "
+            f"{report['recall_at_k']:.0%} of the embedding top-{report['k']}, "
+            f"Spearman {report['spearman']:+.3f}"
+        )
+        return report
 
     # ──────────────────────────────────────────────────────────────────
     @staticmethod
@@ -172,6 +397,10 @@ class TrendScout:
         print(f"Top {len(top)} selected")
 
         self.save_csv(top)
+        if self.state is not None:
+            self.state.upsert(top)
+        if self.embed_cache is not None:
+            print(f"Embedding cache: {self.embed_cache.stats()}")
         print("✅ trend_scout wrote hooks.csv")
 
 
@@ -184,6 +413,29 @@ if __name__ == "__main__":
         action="store_true",
         help="use mock hook if Reddit auth fails",
     )
+    ap.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="always call the embeddings API (skip the on-disk cache)",
+    )
+    ap.add_argument("--no-state", action="store_true", help="don't record hooks in the state store")
+    ap.add_argument("--incremental", action="store_true",
+                    help="skip posts used on an earlier run")
+    ap.add_argument("--top-k", type=int, default=DEFAULT_TOP_K,
+                    help="titles the local scorer passes on to embeddings (0 = all)")
+    ap.add_argument("--eval-cascade", action="store_true",
+                    help="report local-vs-embedding ranking agreement and exit")
     args = ap.parse_args()
 
-    TrendScout(posts_per_sub=args.limit, allow_fallback=args.fallback).run()
+    scout = TrendScout(
+        posts_per_sub=args.limit,
+        allow_fallback=args.fallback,
+        use_cache=not args.no_cache,
+        use_state=not args.no_state,
+        incremental=args.incremental and not args.eval_cascade,
+        top_k=args.top_k,
+    )
+    if args.eval_cascade:
+        scout.evaluate_cascade(scout.fetch_posts())
+    else:
+        scout.run()
@@ -0,0 +1,592 @@
+#!/usr/bin/env python3
+"""
+Work queue
+----------
+Leased job queue so the daily batch can fan out over many worker
+processes – threads in one process, processes on one machine, or machines
+sharing a volume – and over a workflow matrix of runners.
+
+A job is one post id at one stage: write → comply → narrate → render.
+Finishing a stage enqueues the next one with the result as its payload;
+a story rejected by compliance stops there. Workers lease one job at a
+time; a lease expires after --lease seconds unless its worker heartbeats,
+and an expired job goes back to the queue until it has been tried
+QUEUE_MAX_ATTEMPTS (default 3) times. Later stages are leased first, so
+started stories finish before new ones begin.
+
+Sharding is deterministic: a post belongs to shard crc32(id) % shards, so
+every runner of a matrix agrees on the split without coordination. Each
+shard keeps its results in its own queue database and `merge` combines
+them into clean.json and out/manifest.json.
+
+Runners that each restored the same .cache also each extend the stores
+later runs depend on (originality index, seen posts, state store, filter
+and yield stats). `merge-state` folds every shard's copy back into one
+.cache (see STATE_TABLES), so the next run sees all shards' stories.
+
+Jobs belong to a batch – by default the UTC date, or QUEUE_BATCH / --batch.
+`seed` writes it; `work`, `status` and `merge` act on the newest batch in
+the database unless given one, so yesterday's stories neither count
+toward today's --videos nor end up in today's clean.json. Seeding the same
+batch again resumes it.
+
+Stored at QUEUE_DB (default .cache/queue.sqlite3), SQLite in WAL mode.
+
+Commands
+--------
+seed   --hooks hooks.csv [--shard I --shards N]   enqueue write jobs
+work   [--shard I --shards N] [--workers K] [--videos V] [--stages ...]
+merge  DB [DB ...]                                collect shard results
+status                                            job counts per stage
+merge-state DIR [DIR ...] [--into .cache]         fold shard state into one
+
+Every command but merge-state takes --batch ID.
+
+Example
+-------
+python agents/trend_scout.py
+python agents/work_queue.py seed --hooks hooks.csv --shard 0 --shards 3
+python agents/work_queue.py work --shard 0 --shards 3 --workers 2 --videos 4
+python agents/work_queue.py merge shard-*/queue.sqlite3
+"""
+from __future__ import annotations
+
+import argparse, csv, importlib, json, os, socket, sqlite3, sys, threading, time, zlib
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+try:
+    from agents.fileio import atomic_write_json, read_json
+except ImportError:  # run as `python agents/work_queue.py`
+    from fileio import atomic_write_json, read_json
+
+DEFAULT_PATH = ".cache/queue.sqlite3"
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 3
+POLL_SECONDS = 2.0
+
+STAGES = ("write", "comply", "narrate", "render")
+NEXT_STAGE = {"write": "comply", "comply": "narrate", "narrate": "render"}
+
+# Cross-run stores under .cache: file → {table: column whose larger value
+# wins a conflict, or None for rows that never change once written}.
+STATE_TABLES: Dict[str, Dict[str, Optional[str]]] = {
+    "originality.sqlite3": {"published": None, "published_lsh": None},
+    "seen.sqlite3": {"posts": "used_at"},
+    "pipeline.sqlite3": {"records": "updated_at", "stages": "updated_at"},
+}
+# JSON counters (filter planner, yield scheduler): totals add up.
+STATE_COUNTERS = ("filter_stats.json", "yield_stats.json")
+
+
+# ─────────────────────────────── utils ────────────────────────────────
+def bucket(post_id: str) -> int:
+    return zlib.crc32(str(post_id).encode("utf-8"))
+
+
+def shard_of(post_id: str, shards: int) -> int:
+    return bucket(post_id) % max(1, shards)
+
+
+def new_batch() -> str:
+    return os.getenv("QUEUE_BATCH") or time.strftime("%Y-%m-%d", time.gmtime())
+
+
+class Heartbeat:
+    """Extend a job's lease in the background while the block runs."""
+
+    def __init__(self, queue: "WorkQueue", job: Dict, interval: float):
+        self.queue, self.job, self.interval = queue, job, interval
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._beat, daemon=True)
+
+    def _beat(self):
+        while not self.stop.wait(self.interval):
+            if not self.queue.heartbeat(self.job):
+                return  # lease lost; the result will be discarded
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        self.thread.join()
+
+
+# ─────────────────────────────── queue ────────────────────────────────
+class WorkQueue:
+    def __init__(self, path: str = None, lease_seconds: float = None, max_attempts: int = None,
+                 batch: str = None):
+        self.path = path or os.getenv("QUEUE_DB", DEFAULT_PATH)
+        self.lease_seconds = float(lease_seconds or os.getenv("QUEUE_LEASE_SECONDS", DEFAULT_LEASE_SECONDS))
+        self.max_attempts = int(max_attempts or os.getenv("QUEUE_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS))
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Autocommit; lease() takes the write lock explicitly.
+        self.db = sqlite3.connect(self.path, timeout=30, check_same_thread=False,
+                                  isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                batch         TEXT NOT NULL,
+                post_id       TEXT NOT NULL,
+                stage         TEXT NOT NULL,
+                stage_rank    INTEGER NOT NULL,
+                bucket        INTEGER NOT NULL,
+                priority      INTEGER NOT NULL,
+                status        TEXT NOT NULL DEFAULT 'pending',
+                attempts      INTEGER NOT NULL DEFAULT 0,
+                owner         TEXT,
+                lease_expires REAL,
+                payload       TEXT NOT NULL,
+                result        TEXT,
+                error         TEXT,
+                updated_at    REAL NOT NULL,
+                PRIMARY KEY (batch, post_id, stage)
+            );
+            CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (batch, status, stage_rank, priority);
+            """
+        )
+        self.batch = batch or self.latest_batch() or new_batch()
+
+    def latest_batch(self) -> Optional[str]:
+        """The most recently seeded batch, if any."""
+        with self._lock:
+            row = self.db.execute("SELECT batch FROM jobs ORDER BY rowid DESC LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    # ──────────────────────────────────────────────────────────────────
+    def _insert(self, post_id: str, stage: str, payload: Dict, priority: int) -> bool:
+        cur = self.db.execute(
+            """
+            INSERT OR IGNORE INTO jobs (batch, post_id, stage, stage_rank, bucket, priority, payload, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (self.batch, str(post_id), stage, STAGES.index(stage), bucket(post_id), priority,
+             json.dumps(payload, ensure_ascii=False), time.time()),
+        )
+        return cur.rowcount == 1
+
+    def enqueue(self, post_id: str, stage: str, payload: Dict, priority: int = 0) -> bool:
+        """Add a job; a (post, stage) pair already queued is left as is."""
+        with self._lock:
+            return self._insert(post_id, stage, payload, priority)
+
+    def seed(self, hooks: Sequence[Dict], shard: int = 0, shards: int = 1,
+             batch: str = None) -> int:
+        """Enqueue a write job for every hook in *shard*, keeping rank order.
+
+        The jobs go into *batch* (default new_batch()), which becomes this
+        queue's batch from then on.
+        """
+        self.batch = batch or new_batch()
+        added = 0
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                for rank, hook in enumerate(hooks):
+                    if shard_of(hook["id"], shards) == shard:
+                        added += self._insert(hook["id"], "write", hook, rank)
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        return added
+
+    def lease(self, owner: str, stages: Iterable[str] = STAGES,
+              shard: int = 0, shards: int = 1) -> Optional[Dict]:
+        """Claim the next ready job in *shard*: pending, or leased but expired."""
+        stages = list(stages)
+        if not stages:
+            return None
+        now = time.time()
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                # Jobs whose worker died once too often are given up on.
+                self.db.execute(
+                    "UPDATE jobs SET status = 'failed', owner = NULL, updated_at = ?, "
+                    "error = COALESCE(error, 'lease expired') "
+                    "WHERE batch = ? AND status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                    (now, self.batch, now, self.max_attempts),
+                )
+                row = self.db.execute(
+                    f"""
+                    SELECT post_id, stage, payload, attempts FROM jobs
+                    WHERE batch = ? AND stage IN ({",".join("?" * len(stages))})
+                      AND bucket % ? = ?
+                      AND (status = 'pending' OR (status = 'leased' AND lease_expires < ?))
+                    ORDER BY stage_rank DESC, priority, post_id
+                    LIMIT 1
+                    """,
+                    (self.batch, *stages, max(1, shards), shard, now),
+                ).fetchone()
+                if row is not None:
+                    self.db.execute(
+                        "UPDATE jobs SET status = 'leased', owner = ?, lease_expires = ?, "
+                        "attempts = attempts + 1, updated_at = ? "
+                        "WHERE batch = ? AND post_id = ? AND stage = ?",
+                        (owner, now + self.lease_seconds, now, self.batch, row[0], row[1]),
+                    )
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return {"batch": self.batch, "post_id": row[0], "stage": row[1],
+                "payload": json.loads(row[2]), "attempts": row[3] + 1, "owner": owner}
+
+    def heartbeat(self, job: Dict) -> bool:
+        """Extend the lease; False when it was lost to another worker."""
+        with self._lock:
+            cur = self.db.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? "
+                "WHERE batch = ? AND post_id = ? AND stage = ? AND owner = ? AND status = 'leased'",
+                (time.time() + self.lease_seconds, time.time(),
+                 job["batch"], job["post_id"], job["stage"], job["owner"]),
+            )
+        return cur.rowcount == 1
+
+    def complete(self, job: Dict, result: Dict, next_payload: Optional[Dict] = None) -> bool:
+        """Store the result and enqueue the next stage in one transaction."""
+        now = time.time()
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                cur = self.db.execute(
+                    "UPDATE jobs SET status = 'done', result = ?, owner = NULL, updated_at = ? "
+                    "WHERE batch = ? AND post_id = ? AND stage = ? AND owner = ? AND status = 'leased'",
+                    (json.dumps(result, ensure_ascii=False), now,
+                     job["batch"], job["post_id"], job["stage"], job["owner"]),
+                )
+                owned = cur.rowcount == 1
+                nxt = NEXT_STAGE.get(job["stage"])
+                if owned and nxt and next_payload is not None:
+                    priority = self.db.execute(
+                        "SELECT priority FROM jobs WHERE batch = ? AND post_id = ? AND stage = ?",
+                        (job["batch"], job["post_id"], job["stage"]),
+                    ).fetchone()[0]
+                    self._insert(job["post_id"], nxt, next_payload, priority)
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        return owned
+
+    def fail(self, job: Dict, error: str) -> None:
+        """Release the job for a retry, or give up after max_attempts."""
+        with self._lock:
+            self.db.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "owner = NULL, error = ?, updated_at = ? "
+                "WHERE batch = ? AND post_id = ? AND stage = ? AND owner = ? AND status = 'leased'",
+                (self.max_attempts, error[-2000:], time.time(),
+                 job["batch"], job["post_id"], job["stage"], job["owner"]),
+            )
+
+    # ──────────────────────────────────────────────────────────────────
+    def counts(self, shard: int = 0, shards: int = 1) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT stage, status, COUNT(*) FROM jobs WHERE batch = ? AND bucket % ? = ? "
+                "GROUP BY stage, status",
+                (self.batch, max(1, shards), shard),
+            ).fetchall()
+        counts: Dict[str, Dict[str, int]] = {}
+        for stage, status, n in rows:
+            counts.setdefault(stage, {})[status] = n
+        return counts
+
+    def results(self, stage: str) -> List[Dict]:
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT result FROM jobs WHERE batch = ? AND stage = ? AND status = 'done' "
+                "ORDER BY priority, post_id",
+                (self.batch, stage),
+            ).fetchall()
+        return [json.loads(r) for (r,) in rows]
+
+    def close(self) -> None:
+        self.db.close()
+
+
+# ─────────────────────────────── worker ───────────────────────────────
+class QueueWorker:
+    """Lease jobs and run them through the matching agent until none are left."""
+
+    def __init__(
+        self,
+        queue: WorkQueue,
+        stages: Sequence[str] = STAGES,
+        shard: int = 0,
+        shards: int = 1,
+        videos: Optional[int] = None,
+        allow_fallback: bool = False,
+    ):
+        self.queue = queue
+        self.stages = [s for s in STAGES if s in stages]
+        self.shard, self.shards = shard, shards
+        self.videos = videos
+        self.allow_fallback = allow_fallback
+        self._agents: Dict[str, object] = {}
+        self._agents_lock = threading.Lock()
+        self._comply_lock = threading.Lock()
+        self.screening = None
+        self.handlers: Dict[str, Callable[[Dict], tuple]] = {
+            "write": self.write, "comply": self.comply,
+            "narrate": self.narrate, "render": self.render,
+        }
+
+    def agent(self, name: str):
+        """Agents are built on first use, so a render-only worker needs no API keys."""
+        with self._agents_lock:
+            if name not in self._agents:
+                if name == "writer":
+                    StoryWriter = _agent_class("story_writer", "StoryWriter")
+                    self._agents[name] = StoryWriter(allow_fallback=self.allow_fallback)
+                elif name == "editor":
+                    self._agents[name] = _agent_class("compliance_editor", "ComplianceEditor")()
+                    self.screening = _agent_class("compliance_editor", "Screening")()
+                elif name == "narrator":
+                    Narrator = _agent_class("narrator", "Narrator")
+                    self._agents[name] = Narrator(allow_fallback=self.allow_fallback)
+                else:
+                    self._agents[name] = _agent_class("render", "RenderDriver")(workers=1)
+            return self._agents[name]
+
+    # Each handler returns (result, payload for the next stage or None).
+    def write(self, hook: Dict) -> tuple:
+        script = self.agent("writer").build_script(hook)
+        return script, script
+
+    def comply(self, script: Dict) -> tuple:
+        editor = self.agent("editor")
+        # Screening holds this worker's run for the keep-first originality rule.
+        with self._comply_lock:
+            accepted = editor.screen(script, self.screening)
+        if accepted:
+            editor.record_published([script])
+            return dict(script, accepted=True), script
+        return {"id": script["id"], "accepted": False}, None
+
+    def narrate(self, script: Dict) -> tuple:
+        if not self.agent("narrator").narrate(script):
+            raise RuntimeError("narration failed")
+        return script, script
+
+    def render(self, script: Dict) -> tuple:
+        entry = self.agent("renderer").render_queued(script)
+        if not entry["ok"]:
+            raise RuntimeError(entry.get("error", "render failed"))
+        return entry, None
+
+    # ------------------------------------------------------------------
+    def leasable(self) -> List[str]:
+        """Stop starting new stories once enough have passed compliance."""
+        if self.videos is None or "write" not in self.stages:
+            return self.stages
+        counts = self.queue.counts(self.shard, self.shards)
+        accepted = sum(counts.get("narrate", {}).values())
+        in_flight = sum(n for stage in ("write", "comply")
+                        for status, n in counts.get(stage, {}).items() if status == "leased")
+        if accepted + in_flight >= self.videos:
+            return [s for s in self.stages if s != "write"]
+        return self.stages
+
+    def busy_elsewhere(self) -> bool:
+        counts = self.queue.counts(self.shard, self.shards)
+        return any(counts.get(stage, {}).get("leased") for stage in self.stages)
+
+    def run(self, owner: str) -> int:
+        """Work until no job is ready or leased; return the number of jobs done."""
+        done = 0
+        heartbeat_every = max(1.0, self.queue.lease_seconds / 3)
+        while True:
+            job = self.queue.lease(owner, self.leasable(), self.shard, self.shards)
+            if job is None:
+                # Another worker's job may still spawn follow-up work.
+                if self.busy_elsewhere():
+                    time.sleep(POLL_SECONDS)
+                    continue
+                return done
+            try:
+                with Heartbeat(self.queue, job, heartbeat_every):
+                    result, next_payload = self.handlers[job["stage"]](job["payload"])
+            except Exception as e:
+                print(f"  ✗ {job['stage']} {job['post_id']} (attempt {job['attempts']}): {e}",
+                      file=sys.stderr)
+                self.queue.fail(job, f"{type(e).__name__}: {e}")
+                continue
+            if self.queue.complete(job, result, next_payload):
+                done += 1
+                print(f"  ✓ {job['stage']} {job['post_id']}")
+
+    def run_pool(self, workers: int) -> int:
+        if "render" in self.stages:
+            self.agent("renderer").prepare()
+        owner = f"{socket.gethostname()}:{os.getpid()}"
+        totals = [0] * max(1, workers)
+
+        def loop(n: int):
+            totals[n] = self.run(f"{owner}:{n}")
+
+        threads = [threading.Thread(target=loop, args=(n,)) for n in range(len(totals))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return sum(totals)
+
+
+# ─────────────────────────────── merge ────────────────────────────────
+def merge(paths: Sequence[str], clean_file: str = "clean.json",
+          manifest_file: str = os.path.join("out", "manifest.json"),
+          batch: str = None) -> List[Dict]:
+    """Combine shard queues into one clean.json and render manifest.
+
+    Each queue contributes its *batch*, by default the newest one it holds.
+    """
+    scripts: List[Dict] = []
+    manifest: List[Dict] = []
+    for path in paths:
+        queue = WorkQueue(path, batch=batch)
+        scripts += queue.results("narrate")
+        manifest += queue.results("render")
+        queue.close()
+    scripts.sort(key=lambda s: float(s.get("engagement_score") or 0.0), reverse=True)
+    atomic_write_json(clean_file, scripts, indent=2, ensure_ascii=False)
+    atomic_write_json(manifest_file, manifest, indent=2, ensure_ascii=False)
+    print(f"✅ merged {len(paths)} shard(s): {len(scripts)} narrated, "
+          f"{sum(e.get('ok', False) for e in manifest)} rendered")
+    return scripts
+
+
+def _merge_table(db: sqlite3.Connection, table: str, newer: Optional[str]) -> None:
+    info = db.execute(f"PRAGMA main.table_info({table})").fetchall()
+    if not info:  # the target store was never created: copy the shard's schema
+        for (sql,) in db.execute(
+            "SELECT sql FROM shard.sqlite_master WHERE tbl_name = ? AND sql IS NOT NULL "
+            "ORDER BY type = 'index'", (table,),
+        ).fetchall():
+            db.execute(sql)
+        info = db.execute(f"PRAGMA main.table_info({table})").fetchall()
+    columns = [row[1] for row in info]
+    keys = [row[1] for row in sorted(info, key=lambda row: row[5]) if row[5]]
+    names = ", ".join(columns)
+    if newer is None or not keys:
+        db.execute(f"INSERT OR IGNORE INTO main.{table} ({names}) SELECT {names} FROM shard.{table}")
+        return
+    updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c not in keys)
+    db.execute(
+        f"INSERT INTO main.{table} ({names}) SELECT {names} FROM shard.{table} WHERE true "
+        f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {updates} "
+        f"WHERE COALESCE(excluded.{newer}, 0) > COALESCE({table}.{newer}, 0)"
+    )
+
+
+def _add_counts(total: Dict, shard: Dict, base: Dict) -> None:
+    """total += shard - base, for nested dicts of numbers."""
+    for key, value in shard.items():
+        before = base.get(key, {} if isinstance(value, dict) else 0)
+        if isinstance(value, dict):
+            _add_counts(total.setdefault(key, {}), value, before)
+        else:
+            total[key] = total.get(key, 0) + value - before
+
+
+def merge_state(dirs: Sequence[str], into: str = ".cache") -> None:
+    """Fold the cross-run stores of shard .cache copies *dirs* into *into*.
+
+    Every shard started from the same copy of *into*, so rows merge by
+    key (the newer row wins) and counters add only what each shard added.
+    """
+    os.makedirs(into, exist_ok=True)
+    for name, tables in STATE_TABLES.items():
+        db = sqlite3.connect(os.path.join(into, name), timeout=30, isolation_level=None)
+        for directory in dirs:
+            path = os.path.join(directory, name)
+            if not os.path.exists(path):
+                continue
+            db.execute("ATTACH DATABASE ? AS shard", (path,))
+            db.execute("BEGIN IMMEDIATE")
+            present = {t for (t,) in db.execute("SELECT name FROM shard.sqlite_master WHERE type = 'table'")}
+            for table, newer in tables.items():
+                if table in present:
+                    _merge_table(db, table, newer)
+            db.execute("COMMIT")
+            db.execute("DETACH DATABASE shard")
+        db.close()
+    for name in STATE_COUNTERS:
+        path = os.path.join(into, name)
+        base = read_json(path, {})
+        total = json.loads(json.dumps(base))
+        for directory in dirs:
+            _add_counts(total, read_json(os.path.join(directory, name), {}), base)
+        atomic_write_json(path, total, indent=1)
+    print(f"✅ merged state of {len(dirs)} shard(s) into {into}")
+
+
+def _agent_class(module: str, name: str):
+    try:
+        mod = importlib.import_module(f"agents.{module}")
+    except ImportError:  # run as `python agents/work_queue.py`
+        mod = importlib.import_module(module)
+    return getattr(mod, name)
+
+
+def read_hooks(fname: str) -> List[Dict]:
+    with open(fname, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+# ──────────────────────────── CLI entry ───────────────────────────────
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="command", required=True)
+    for name in ("seed", "work", "status", "merge"):
+        p = sub.add_parser(name)
+        p.add_argument("--batch", default=None,
+                       help="batch id (seed: QUEUE_BATCH or today's date; else the newest batch)")
+        if name != "merge":
+            p.add_argument("--shard", type=int, default=0, help="this runner's shard index")
+            p.add_argument("--shards", type=int, default=1, help="total number of shards")
+    sub.choices["seed"].add_argument("--hooks", default="hooks.csv", help="ranked hooks to enqueue")
+    work = sub.choices["work"]
+    work.add_argument("--workers", type=int, default=2, help="worker threads in this process")
+    work.add_argument("--videos", type=int, default=None,
+                      help="stop starting stories once this many passed compliance")
+    work.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES),
+                      help="stages this worker runs")
+    work.add_argument("--lease", type=float, default=None, help="lease length in seconds")
+    work.add_argument("--fallback", action="store_true", help="mock story / silent audio on failure")
+    sub.choices["merge"].add_argument("dbs", nargs="+", help="shard queue databases")
+    ms = sub.add_parser("merge-state")
+    ms.add_argument("dirs", nargs="+", help="shard .cache directories")
+    ms.add_argument("--into", default=".cache", help="state directory to merge into")
+    args = ap.parse_args()
+
+    if args.command == "merge-state":
+        merge_state(args.dirs, args.into)
+    elif args.command == "merge":
+        merge(args.dbs, batch=args.batch)
+    elif args.command == "seed":
+        queue = WorkQueue()
+        added = queue.seed(read_hooks(args.hooks), args.shard, args.shards, batch=args.batch)
+        print(f"Queued {added} write job(s) in batch {queue.batch} for shard {args.shard}/{args.shards}")
+    elif args.command == "status":
+        queue = WorkQueue(batch=args.batch)
+        print(f"Batch {queue.batch}")
+        print(json.dumps(queue.counts(args.shard, args.shards), indent=2))
+    else:
+        worker = QueueWorker(
+            WorkQueue(lease_seconds=args.lease, batch=args.batch),
+            stages=args.stages,
+            shard=args.shard,
+            shards=args.shards,
+            videos=args.videos,
+            allow_fallback=args.fallback,
+        )
+        done = worker.run_pool(args.workers)
+        print(f"✅ worker finished {done} job(s) in shard {args.shard}/{args.shards}")
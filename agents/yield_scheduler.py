@@ -0,0 +1,133 @@
+"""
+Yield scheduler
+---------------
+Decides how many story candidates to have in flight so a run reaches its
+target of clean stories with a chosen confidence, without paying for
+stories nobody needs.
+
+Each hook's chance of passing compliance starts from the end-to-end pass
+rate of the editor's gates (FilterPlanner.pass_rate) and is sharpened by
+what earlier runs saw for its subreddit, with PRIOR_WEIGHT pseudo-
+observations so a handful of stories can't swing it:
+
+    p(sub) = (accepted(sub) + PRIOR_WEIGHT * p(gates)) / (seen(sub) + PRIOR_WEIGHT)
+
+With r stories still needed, candidates are started in hook order until
+the chance that the in-flight ones yield at least r passes (a Poisson-
+binomial tail) reaches the confidence, up to max_in_flight. After every
+verdict the plan is redone: a rejection tops the pool up, an acceptance
+may leave queued candidates surplus, and those are cancelled before they
+start.
+
+Per-subreddit counts are kept in YIELD_STATS (default
+.cache/yield_stats.json) and merged under an flock, like the planner's.
+"""
+from __future__ import annotations
+
+import os
+from typing import Dict, Sequence
+
+try:
+    from agents.fileio import atomic_write_json, file_lock, read_json
+    from agents.filter_planner import FilterPlanner
+except ImportError:  # run as a script from agents/
+    from fileio import atomic_write_json, file_lock, read_json
+    from filter_planner import FilterPlanner
+
+DEFAULT_STATS_PATH = ".cache/yield_stats.json"
+DEFAULT_CONFIDENCE = 0.9
+PRIOR_WEIGHT = 10
+MIN_PROBABILITY = 0.02
+
+
+def at_least(probabilities: Sequence[float], needed: int) -> float:
+    """P(at least *needed* successes) for independent Bernoulli trials."""
+    if needed <= 0:
+        return 1.0
+    # dist[k] = P(exactly k successes so far); dist[needed] absorbs "k or more".
+    dist = [1.0] + [0.0] * needed
+    for p in probabilities:
+        dist[needed] += dist[needed - 1] * p
+        for k in range(needed - 1, 0, -1):
+            dist[k] = dist[k] * (1 - p) + dist[k - 1] * p
+        dist[0] *= 1 - p
+    return dist[needed]
+
+
+class YieldScheduler:
+    def __init__(
+        self,
+        planner: FilterPlanner,
+        checks: Sequence[str] = None,
+        confidence: float = DEFAULT_CONFIDENCE,
+        max_in_flight: int = 4,
+        stats_path: str = None,
+    ):
+        self.planner = planner
+        self.checks = list(checks) if checks else None
+        self.confidence = min(max(confidence, 0.0), 0.999)
+        self.max_in_flight = max(1, max_in_flight)
+        self.stats_path = stats_path or os.getenv("YIELD_STATS", DEFAULT_STATS_PATH)
+        self.lock_path = self.stats_path + ".lock"
+        self.history: Dict[str, Dict[str, int]] = read_json(self.stats_path, {})
+        self.run: Dict[str, Dict[str, int]] = {}
+        self.started = 0
+        self.cancelled = 0
+
+    # ──────────────────────────────────────────────────────────────────
+    def probability(self, hook: Dict) -> float:
+        prior = self.planner.pass_rate(self.checks)
+        seen, accepted = 0, 0
+        for source in (self.history, self.run):
+            stats = source.get(hook.get("subreddit", ""), {})
+            seen += stats.get("seen", 0)
+            accepted += stats.get("accepted", 0)
+        p = (accepted + PRIOR_WEIGHT * prior) / (seen + PRIOR_WEIGHT)
+        return min(max(p, MIN_PROBABILITY), 1.0)
+
+    def to_start(self, needed: int, in_flight: Sequence[float], upcoming: Sequence[float]) -> int:
+        """How many of *upcoming* (in order) to start now."""
+        probabilities = list(in_flight)
+        count = 0
+        while (
+            count < len(upcoming)
+            and len(probabilities) < self.max_in_flight
+            and at_least(probabilities, needed) < self.confidence
+        ):
+            probabilities.append(upcoming[count])
+            count += 1
+        self.started += count
+        return count
+
+    def surplus(self, needed: int, in_flight: Sequence[float]) -> int:
+        """How many of the newest in-flight candidates the target can do without."""
+        drop = 0
+        while drop < len(in_flight) and at_least(in_flight[: len(in_flight) - drop - 1], needed) >= self.confidence:
+            drop += 1
+        return drop
+
+    def record(self, subreddit: str, accepted: bool) -> None:
+        stats = self.run.setdefault(subreddit, {"seen": 0, "accepted": 0})
+        stats["seen"] += 1
+        stats["accepted"] += int(accepted)
+
+    def save(self) -> None:
+        """Fold this run's counts into the shared stats file."""
+        if not self.run:
+            return
+        with file_lock(self.lock_path):
+            merged = read_json(self.stats_path, {})
+            for subreddit, stats in self.run.items():
+                total = merged.setdefault(subreddit, {"seen": 0, "accepted": 0})
+                for field, value in stats.items():
+                    total[field] = total.get(field, 0) + value
+            atomic_write_json(self.stats_path, merged, indent=1)
+        self.history, self.run = merged, {}
+
+    def report(self) -> str:
+        seen = sum(s["seen"] for s in self.run.values())
+        accepted = sum(s["accepted"] for s in self.run.values())
+        return (
+            f"Scheduler: started {self.started} candidate(s), cancelled {self.cancelled}; "
+            f"{accepted}/{seen} screened passed (gate prior {self.planner.pass_rate(self.checks):.0%})"
+        )
@@ -0,0 +1 @@
+"""Offline benchmark for the agents against local provider stubs."""
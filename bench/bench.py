@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Benchmark
+---------
+Offline throughput benchmark for the agents and the streaming pipeline.
+
+Local stub servers (bench/stubs.py) stand in for Reddit, OpenAI and
+ElevenLabs, so the run needs no network and no keys. Each scenario runs at
+every size in its own child process with a fresh working directory and
+cold caches. Reported per run:
+
+    seconds     wall time of the agent call (input files are written first)
+    items       posts ranked / stories written, screened or narrated
+    requests    requests the stubs served, and how many got a 429
+    peak RSS    the child's resident-set high-water mark
+    items/s     throughput
+
+Scenarios: scout, writer, compliance, narrator, pipeline. The pipeline
+stops at the scout's top 50 hooks, so beyond N = 50 it reports 50 items.
+
+--check compares every run with the stored baseline and exits non-zero if
+requests or peak RSS grew by more than --tolerance. Those two are
+machine-independent enough to gate CI; wall time swings with runner load
+and the stub jitter, so it is reported next to the baseline but never fails
+the check.
+
+CLI flags
+---------
+--sizes N [N …]        Stories per run (default 10 100 1000)
+--scenarios S [S …]    Subset of scenarios (default all)
+--latency SEC          Stub latency per request (default 0.02)
+--jitter SEC           ± uniform jitter (default 0.01)
+--rate-429 P           Share of requests refused with 429 (default 0)
+--embedding-dim D      Stub embedding size (default 1536)
+--story-words W        Stub story length (default 160)
+--audio-seconds S      Stub narration length (default 2)
+--out FILE             Write results as JSON
+--baseline FILE        Baseline to compare with (default bench/baseline.json)
+--check                Fail on regressions against the baseline
+--tolerance F          Allowed growth before --check fails (default 0.3)
+--update-baseline      Store this run as the new baseline
+
+Example
+-------
+python -m bench.bench --sizes 10 100 --check
+"""
+from __future__ import annotations
+
+import argparse, csv, json, math, os, resource, shutil, subprocess, sys, tempfile, time
+from typing import Callable, Dict, List
+
+try:
+    from bench.stubs import StubConfig, start_all, story_text
+except ImportError:  # run as `python bench/bench.py`
+    from stubs import StubConfig, start_all, story_text
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(ROOT, "bench", "baseline.json")
+DEFAULT_SIZES = (10, 100, 1000)
+RESULT_MARKER = "BENCH_RESULT "
+# Provider settings a real shell or .env might carry into the child.
+SCRUBBED_ENV = (
+    "REDDIT_USERNAME", "REDDIT_PASSWORD", "EMBED_CACHE_DIR", "ORIGINALITY_DB",
+    "TTS_CACHE_DIR", "LLM_CACHE_PATH", "PIPELINE_DB", "SEEN_DB", "FILTER_STATS",
+    "QUEUE_DB", "QUOTA_DB", "METRICS_DIR", "E11_CONCURRENCY", "E11_OUTPUT_FORMAT", "E11_TIMEOUT",
+)
+# The stubs don't meter anything, so the quota governor's budgets are lifted;
+# its bookkeeping is still paid on every request.
+UNMETERED = {"OPENAI_RPM": "1e9", "OPENAI_TPM": "1e12", "E11_RPM": "1e9", "E11_CPM": "0",
+             "REDDIT_RPM": "1e9"}
+SUBREDDITS = 3  # TrendScout.SUBREDDITS
+# Fields --check gates on; wall time is only reported.
+GATED = ("requests", "peak_rss_mb")
+
+
+# ───────────────────────────── child side ─────────────────────────────
+def _hooks(n: int) -> List[Dict]:
+    return [
+        {"title": story_text(f"hook/{i}", 12).rstrip("."), "subreddit": "tifu",
+         "score": 100 + i, "url": f"https://reddit.test/{i}", "id": f"bench{i}",
+         "engagement_score": round(1.0 - i / (n + 1), 4)}
+        for i in range(n)
+    ]
+
+
+def _scripts(n: int) -> List[Dict]:
+    return [
+        {"id": h["id"], "title": h["title"], "subreddit": h["subreddit"],
+         "story": story_text(f"story/{i}", 160), "word_count": 160,
+         "engagement_score": h["engagement_score"]}
+        for i, h in enumerate(_hooks(n))
+    ]
+
+
+def _write_json(fname: str, rows: List[Dict]) -> None:
+    with open(fname, "w", encoding="utf-8") as f:
+        json.dump(rows, f)
+
+
+def _read_json(fname: str) -> List[Dict]:
+    with open(fname, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def scout(n: int) -> Callable[[], int]:
+    from agents.trend_scout import TrendScout
+
+    agent = TrendScout(posts_per_sub=math.ceil(n / SUBREDDITS))
+    return lambda: len(agent.rank(agent.fetch_posts()))
+
+
+def writer(n: int) -> Callable[[], int]:
+    from agents.story_writer import StoryWriter
+
+    with open("hooks.csv", "w", newline="", encoding="utf-8") as f:
+        rows = csv.DictWriter(f, fieldnames=list(_hooks(1)[0]))
+        rows.writeheader()
+        rows.writerows(_hooks(n))
+    agent = StoryWriter(limit=n, allow_fallback=False)
+    return lambda: (agent.run(), len(_read_json("scripts.json")))[1]
+
+
+def compliance(n: int) -> Callable[[], int]:
+    from agents.compliance_editor import ComplianceEditor
+
+    _write_json("scripts.json", _scripts(n))
+    agent = ComplianceEditor(concurrency=8)
+    return lambda: (agent.run(), n)[1]
+
+
+def narrator(n: int) -> Callable[[], int]:
+    from agents.narrator import Narrator
+
+    _write_json("clean.json", _scripts(n))
+    agent = Narrator()
+    return lambda: (agent.run(), sum(1 for s in _read_json("clean.json") if s.get("audio_file")))[1]
+
+
+def pipeline(n: int) -> Callable[[], int]:
+    from agents.pipeline import Pipeline
+
+    agent = Pipeline(videos=n, posts_per_sub=math.ceil(n / SUBREDDITS))
+    return lambda: len(agent.run())
+
+
+SCENARIOS: Dict[str, Callable[[int], Callable[[], int]]] = {
+    "scout": scout, "writer": writer, "compliance": compliance,
+    "narrator": narrator, "pipeline": pipeline,
+}
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10  # bytes vs KiB
+
+
+def run_child(scenario: str, n: int) -> None:
+    work = SCENARIOS[scenario](n)
+    started = time.perf_counter()
+    items = work()
+    seconds = time.perf_counter() - started
+    print(RESULT_MARKER + json.dumps({"seconds": round(seconds, 3), "items": items,
+                                      "peak_rss_mb": round(peak_rss_mb(), 1)}))
+
+
+# ──────────────────────────── parent side ─────────────────────────────
+def child_env(servers: Dict) -> Dict[str, str]:
+    env = {k: v for k, v in os.environ.items() if k not in SCRUBBED_ENV}
+    env.update({
+        "PYTHONPATH": ROOT + os.pathsep + env.get("PYTHONPATH", ""),
+        "OPENAI_KEY": "stub", "OPENAI_BASE_URL": servers["openai"].url + "/v1",
+        "E11_KEY": "stub", "E11_VOICE": "stub", "E11_BASE_URL": servers["elevenlabs"].url + "/v1",
+        "REDDIT_CLIENT_ID": "stub", "REDDIT_SECRET": "stub", "REDDIT_USER_AGENT": "factory-bench",
+        **UNMETERED,
+    })
+    return env
+
+
+def run_one(servers: Dict, scenario: str, n: int, timeout: float) -> Dict:
+    for server in servers.values():
+        server.reset()
+    workdir = tempfile.mkdtemp(prefix=f"bench-{scenario}-{n}-")
+    try:
+        # praw picks up a praw.ini in the working directory.
+        with open(os.path.join(workdir, "praw.ini"), "w", encoding="utf-8") as f:
+            f.write(f"[DEFAULT]\noauth_url={servers['reddit'].url}\nreddit_url={servers['reddit'].url}\n")
+        proc = subprocess.run(
+            [sys.executable, "-m", "bench.bench", "--child", scenario, "--sizes", str(n)],
+            cwd=workdir, env=child_env(servers), capture_output=True, text=True, timeout=timeout,
+        )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    lines = [l for l in proc.stdout.splitlines() if l.startswith(RESULT_MARKER)]
+    if proc.returncode != 0 or not lines:
+        raise RuntimeError(f"{scenario} N={n} failed:\n{(proc.stderr or proc.stdout)[-3000:]}")
+    result = json.loads(lines[-1][len(RESULT_MARKER):])
+    result.update({
+        "scenario": scenario, "n": n,
+        "requests": sum(sum(s.requests.values()) for s in servers.values()),
+        "rate_limited": sum(sum(s.limited.values()) for s in servers.values()),
+        "by_endpoint": {f"{name}.{ep}": count for name, s in servers.items()
+                        for ep, count in sorted(s.requests.items())},
+    })
+    result["items_per_s"] = round(result["items"] / result["seconds"], 2) if result["seconds"] else 0.0
+    return result
+
+
+def key(result: Dict) -> str:
+    return f"{result['scenario']}/{result['n']}"
+
+
+def regressions(results: List[Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    found = []
+    for result in results:
+        base = baseline.get(key(result))
+        if base is None:
+            continue
+        for field in GATED:
+            if result[field] > base[field] * (1 + tolerance):
+                found.append(f"{key(result)} {field}: {result[field]} vs baseline {base[field]}")
+    return found
+
+
+def slowdowns(results: List[Dict], baseline: Dict[str, Dict]) -> List[str]:
+    """Wall time against the baseline, for the log only."""
+    return [f"{key(r)} seconds: {r['seconds']} vs baseline {baseline[key(r)]['seconds']}"
+            for r in results if key(r) in baseline]
+
+
+def report(results: List[Dict]) -> str:
+    lines = [f"{'scenario':<12}{'N':>6}{'items':>7}{'seconds':>9}{'items/s':>9}"
+             f"{'requests':>10}{'429s':>6}{'RSS MB':>8}"]
+    for r in results:
+        lines.append(f"{r['scenario']:<12}{r['n']:>6}{r['items']:>7}{r['seconds']:>9.2f}"
+                     f"{r['items_per_s']:>9.1f}{r['requests']:>10}{r['rate_limited']:>6}"
+                     f"{r['peak_rss_mb']:>8.1f}")
+    return "\n".join(lines)
+
+
+# ──────────────────────────── CLI entry ───────────────────────────────
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    ap.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    ap.add_argument("--latency", type=float, default=StubConfig.latency)
+    ap.add_argument("--jitter", type=float, default=StubConfig.jitter)
+    ap.add_argument("--rate-429", type=float, default=StubConfig.rate_429)
+    ap.add_argument("--embedding-dim", type=int, default=StubConfig.embedding_dim)
+    ap.add_argument("--story-words", type=int, default=StubConfig.story_words)
+    ap.add_argument("--audio-seconds", type=float, default=StubConfig.audio_seconds)
+    ap.add_argument("--timeout", type=float, default=900, help="per-run limit in seconds")
+    ap.add_argument("--out", help="write results as JSON")
+    ap.add_argument("--baseline", default=DEFAULT_BASELINE)
+    ap.add_argument("--check", action="store_true", help="fail on regressions against the baseline")
+    ap.add_argument("--tolerance", type=float, default=0.3)
+    ap.add_argument("--update-baseline", action="store_true")
+    ap.add_argument("--child", choices=list(SCENARIOS), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        run_child(args.child, args.sizes[0])
+        sys.exit(0)
+
+    config = StubConfig(
+        latency=args.latency, jitter=args.jitter, rate_429=args.rate_429,
+        posts_per_sub=max(args.sizes), embedding_dim=args.embedding_dim,
+        story_words=args.story_words, audio_seconds=args.audio_seconds,
+    )
+    servers = start_all(config)
+    results: List[Dict] = []
+    try:
+        for n in args.sizes:
+            for scenario in args.scenarios:
+                print(f"▶ {scenario} N={n}", flush=True)
+                results.append(run_one(servers, scenario, n, args.timeout))
+    finally:
+        for server in servers.values():
+            server.stop()
+
+    print(report(results))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    try:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {}
+    if args.update_baseline:
+        baseline.update({key(r): {f: r[f] for f in ("seconds", "requests", "peak_rss_mb", "items")}
+                         for r in results})
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(dict(sorted(baseline.items())), f, indent=2)
+            f.write("\n")
+        print(f"Baseline updated: {args.baseline}")
+    if args.check:
+        for line in slowdowns(results, baseline):
+            print(f"ℹ {line}")
+        found = regressions(results, baseline, args.tolerance)
+        for line in found:
+            print(f"❌ regression: {line}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+        print(f"✅ no regressions beyond {args.tolerance:.0%} against {args.baseline}")
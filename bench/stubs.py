@@ -0,0 +1,270 @@
+"""
+Stub servers
+------------
+Local stand-ins for the three providers the agents call, so the benchmark
+runs with no network and no keys:
+
+    Reddit      POST /api/v1/access_token, GET /r/<sub>/hot (paged listing)
+    OpenAI      POST /v1/embeddings, /v1/chat/completions, /v1/moderations
+    ElevenLabs  POST /v1/text-to-speech/<voice>/stream/with-timestamps
+
+Every server takes the same StubConfig: a base latency with uniform
+jitter, the share of requests answered with 429 (Retry-After: 0), and the
+payload sizes (posts per subreddit, embedding dimensions, story length,
+seconds of audio). Responses are deterministic per request body, so two
+runs issue the same requests. Each server counts requests per endpoint.
+"""
+from __future__ import annotations
+
+import base64, hashlib, json, random, re, threading, time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+WORDS = (
+    "i my we you she he they it was were had have did said told found kept "
+    "left took made came went saw knew thought asked called wanted needed "
+    "mom dad sister brother friend boss neighbor wife husband roommate teacher "
+    "house car office party wedding kitchen phone letter secret money cake "
+    "dinner morning night week year door box note key dog cat garden street "
+    "and but so then when after before because until while if "
+    "never always suddenly finally again quietly almost really only just "
+    "red old new small big strange quiet loud late early wrong right same "
+    "open close hide share laugh cry wait run stop drive break fix forget"
+).split()
+SAMPLE_RATE = 24000
+
+
+@dataclass
+class StubConfig:
+    latency: float = 0.02  # seconds per request
+    jitter: float = 0.01  # ± uniform, seconds
+    rate_429: float = 0.0  # share of requests refused with 429
+    posts_per_sub: int = 1000
+    embedding_dim: int = 1536
+    story_words: int = 160
+    audio_seconds: float = 2.0
+
+
+def story_text(seed: str, words: int) -> str:
+    """Readable, distinct filler text; the same *seed* gives the same story."""
+    rng = random.Random(hashlib.sha256(seed.encode("utf-8")).digest())
+    out: List[str] = []
+    while len(out) < words:
+        sentence = [rng.choice(WORDS) for _ in range(rng.randint(6, 12))]
+        out.append(sentence[0].capitalize())
+        out.extend(sentence[1:])
+        out[-1] += "."
+    return " ".join(out[:words])
+
+
+# ─────────────────────────────── server ───────────────────────────────
+class _Handler(BaseHTTPRequestHandler):
+    server: "StubServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):  # keep benchmark output readable
+        pass
+
+    def _body(self) -> Dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if not raw:
+            return {}
+        if "json" in (self.headers.get("Content-Type") or ""):
+            return json.loads(raw)
+        return {k: v[0] for k, v in parse_qs(raw.decode("utf-8")).items()}
+
+    def _send(self, status: int, payload, content_type: str = "application/json",
+              headers: Optional[Dict[str, str]] = None):
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self, method: str):
+        url = urlparse(self.path)
+        body = self._body() if method == "POST" else {}
+        endpoint = self.server.endpoint(url.path)
+        cfg = self.server.config
+        time.sleep(max(0.0, cfg.latency + self.server.uniform(-cfg.jitter, cfg.jitter)))
+        if endpoint != "token" and self.server.refuse():
+            self.server.count(endpoint, limited=True)
+            self._send(429, {"error": {"message": "rate limited", "type": "rate_limit"}},
+                       headers={"Retry-After": "0"})
+            return
+        self.server.count(endpoint)
+        try:
+            self._send(*self.server.respond(endpoint, url, body))
+        except KeyError:
+            self._send(404, {"error": f"no stub for {method} {url.path}"})
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    routes: Dict[str, str] = {}  # path regex → endpoint name
+
+    def __init__(self, config: StubConfig = None, seed: int = 0):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.config = config or StubConfig()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests: Dict[str, int] = {}
+        self.limited: Dict[str, int] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def uniform(self, low: float, high: float) -> float:
+        with self._lock:
+            return self._rng.uniform(low, high)
+
+    def refuse(self) -> bool:
+        with self._lock:
+            return self._rng.random() < self.config.rate_429
+
+    def endpoint(self, path: str) -> str:
+        for pattern, name in self.routes.items():
+            if re.fullmatch(pattern, path):
+                return name
+        return "unknown"
+
+    def count(self, endpoint: str, limited: bool = False) -> None:
+        with self._lock:
+            counts = self.limited if limited else self.requests
+            counts[endpoint] = counts.get(endpoint, 0) + 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self.requests.clear()
+            self.limited.clear()
+
+    def respond(self, endpoint: str, url, body: Dict) -> tuple:
+        raise NotImplementedError
+
+    def start(self) -> "StubServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class RedditStub(StubServer):
+    routes = {r"/api/v1/access_token": "token", r"/r/([^/]+)/hot(\.json)?": "hot"}
+
+    def respond(self, endpoint, url, body):
+        if endpoint == "token":
+            return 200, {"access_token": "stub", "token_type": "bearer",
+                         "expires_in": 86400, "scope": "*"}
+        if endpoint != "hot":
+            raise KeyError(endpoint)
+        sub = url.path.split("/")[2]
+        query = parse_qs(url.query)
+        limit = min(100, int(query.get("limit", ["25"])[0]))
+        after = query.get("after", [""])[0]
+        start = int(after.rsplit("_", 1)[1]) + 1 if after else 0
+        stop = min(start + limit, self.config.posts_per_sub)
+        children = [
+            {"kind": "t3", "data": {
+                "id": f"{sub}_{i}", "name": f"t3_{sub}_{i}",
+                "title": story_text(f"{sub}/{i}/title", 12).rstrip("."),
+                "score": (i * 7919) % 5000, "url": f"https://reddit.test/r/{sub}/{i}",
+                "stickied": False, "subreddit": sub,
+            }}
+            for i in range(start, stop)
+        ]
+        more = stop < self.config.posts_per_sub
+        return 200, {"kind": "Listing", "data": {
+            "children": children, "after": children[-1]["data"]["name"] if more and children else None,
+            "before": None, "dist": len(children),
+        }}
+
+
+class OpenAIStub(StubServer):
+    routes = {r"/v1/embeddings": "embeddings", r"/v1/chat/completions": "chat",
+              r"/v1/moderations": "moderations"}
+
+    def respond(self, endpoint, url, body):
+        if endpoint == "embeddings":
+            inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            data = []
+            for i, text in enumerate(inputs):
+                rng = random.Random(hashlib.sha256(str(text).encode("utf-8")).digest())
+                vec = [rng.uniform(-1, 1) for _ in range(self.config.embedding_dim)]
+                data.append({"object": "embedding", "index": i, "embedding": vec})
+            tokens = sum(len(str(t).split()) for t in inputs)
+            return 200, {"object": "list", "data": data, "model": body.get("model", "stub"),
+                         "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+        if endpoint == "moderations":
+            inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            return 200, {"id": "modr-stub", "model": "stub", "results": [
+                {"flagged": False, "categories": {}, "category_scores": {}} for _ in inputs
+            ]}
+        if endpoint != "chat":
+            raise KeyError(endpoint)
+        prompt = body["messages"][-1]["content"]
+        if "<story id=" in prompt:
+            ids = re.findall(r'<story id="(\d+)">', prompt)
+            content = json.dumps({"scores": [{"id": int(n), "score": 80} for n in ids]})
+        elif "Rate this story" in prompt:
+            content = "80"
+        else:
+            content = story_text(prompt, self.config.story_words)
+        tokens = len(prompt.split())
+        return 200, {
+            "id": "chatcmpl-stub", "object": "chat.completion", "created": 0,
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": tokens, "completion_tokens": len(content.split()),
+                      "total_tokens": tokens + len(content.split())},
+        }
+
+
+class ElevenLabsStub(StubServer):
+    routes = {r"/v1/text-to-speech/[^/]+/stream/with-timestamps": "tts"}
+
+    def respond(self, endpoint, url, body):
+        if endpoint != "tts":
+            raise KeyError(endpoint)
+        text = body["text"]
+        seconds = self.config.audio_seconds
+        audio = bytes(int(seconds * SAMPLE_RATE) * 2)  # 16-bit PCM silence
+        step = seconds / max(1, len(text))
+        lines = []
+        chunk = 32 * 1024
+        for n, offset in enumerate(range(0, len(audio), chunk)):
+            message = {"audio_base64": base64.b64encode(audio[offset:offset + chunk]).decode("ascii")}
+            if n == 0:
+                message["alignment"] = {
+                    "characters": list(text),
+                    "character_start_times_seconds": [i * step for i in range(len(text))],
+                    "character_end_times_seconds": [(i + 1) * step for i in range(len(text))],
+                }
+            lines.append(json.dumps(message))
+        return 200, ("\n".join(lines) + "\n").encode("utf-8"), "application/x-ndjson"
+
+
+def start_all(config: StubConfig = None) -> Dict[str, StubServer]:
+    config = config or StubConfig()
+    return {
+        "reddit": RedditStub(config, seed=1).start(),
+        "openai": OpenAIStub(config, seed=2).start(),
+        "elevenlabs": ElevenLabsStub(config, seed=3).start(),
+    }
@@ -4,6 +4,21 @@ import csv
 import pytest
 from unittest.mock import patch, MagicMock, mock_open
 
+
+@pytest.fixture(autouse=True)
+def isolated_caches(tmp_path, monkeypatch):
+    """Keep on-disk caches out of the working tree and independent per test."""
+    monkeypatch.setenv('EMBED_CACHE_DIR', str(tmp_path / 'embeddings'))
+    monkeypatch.setenv('ORIGINALITY_DB', str(tmp_path / 'originality.sqlite3'))
+    monkeypatch.setenv('TTS_CACHE_DIR', str(tmp_path / 'tts'))
+    monkeypatch.setenv('LLM_CACHE_PATH', str(tmp_path / 'llm.sqlite3'))
+    monkeypatch.setenv('PIPELINE_DB', str(tmp_path / 'pipeline.sqlite3'))
+    monkeypatch.setenv('SEEN_DB', str(tmp_path / 'seen.sqlite3'))
+    monkeypatch.setenv('FILTER_STATS', str(tmp_path / 'filter_stats.json'))
+    monkeypatch.setenv('QUEUE_DB', str(tmp_path / 'queue.sqlite3'))
+    monkeypatch.setenv('QUOTA_DB', str(tmp_path / 'quota.sqlite3'))
+    monkeypatch.setenv('YIELD_STATS', str(tmp_path / 'yield_stats.json'))
+
 def test_hooks_csv_creation():
     """Test that hooks.csv is created and non-empty after trend_scout runs."""
     with patch('praw.Reddit') as mock_reddit, \
@@ -21,10 +36,12 @@ def test_hooks_csv_creation():
         mock_subreddit.hot.return_value = [mock_post] * 10
         mock_reddit.return_value.subreddit.return_value = mock_subreddit
         
-        mock_embedding_response = MagicMock()
-        mock_embedding_response.data = [MagicMock()]
-        mock_embedding_response.data[0].embedding = [0.1] * 1536
-        mock_openai.return_value.embeddings.create.return_value = mock_embedding_response
+        def fake_embeddings(model, input):
+            texts = input if isinstance(input, list) else [input]
+            rsp = MagicMock()
+            rsp.data = [MagicMock(embedding=[0.1] * 1536) for _ in texts]
+            return rsp
+        mock_openai.return_value.embeddings.create.side_effect = fake_embeddings
         
         from agents.trend_scout import TrendScout
         scout = TrendScout()
@@ -161,6 +178,917 @@ def test_story_writer_limit():
         assert len(hooks) == 1
         assert hooks[0]['id'] == '1'
 
+def test_rank_batches_embeddings():
+    """Test that rank embeds all titles in one request and orders by score."""
+    with patch('praw.Reddit'), patch('openai.OpenAI') as mock_openai:
+        vectors = {'close match': [0.9, 0.1], 'far match': [0.1, 0.9]}
+
+        def fake_embeddings(model, input):
+            rsp = MagicMock()
+            rsp.data = [MagicMock(embedding=vectors.get(t, [1.0, 0.0])) for t in input]
+            return rsp
+        mock_openai.return_value.embeddings.create.side_effect = fake_embeddings
+
+        with patch.dict(os.environ, {'OPENAI_KEY': 'test'}):
+            from agents.trend_scout import TrendScout
+            scout = TrendScout()
+        ranked = scout.rank([{'title': 'far match'}, {'title': 'close match'}])
+
+        assert mock_openai.return_value.embeddings.create.call_count == 1
+        assert [p['title'] for p in ranked] == ['close match', 'far match']
+        assert ranked[0]['engagement_score'] > ranked[1]['engagement_score']
+
+def test_embedding_cache_skips_network_on_hit(tmp_path):
+    """Test that cached embeddings are served without calling the API."""
+    from agents.embedding_cache import EmbeddingCache
+    from agents.trend_scout import get_embeddings
+
+    client = MagicMock()
+    client.embeddings.create.side_effect = lambda model, input: MagicMock(
+        data=[MagicMock(embedding=[float(len(t)), 1.0]) for t in input]
+    )
+    cache = EmbeddingCache('test-model', cache_dir=str(tmp_path))
+
+    first = get_embeddings(client, ['a', 'bb'], cache)
+    second = get_embeddings(client, ['bb', 'a'], EmbeddingCache('test-model', cache_dir=str(tmp_path)))
+
+    assert client.embeddings.create.call_count == 1
+    assert second.tolist() == [first[1].tolist(), first[0].tolist()]
+
+
+def test_embedding_cache_evicts_least_recently_used(tmp_path):
+    """Test that a full cache recycles the least recently used slot."""
+    import numpy as np
+    from agents.embedding_cache import EmbeddingCache
+
+    cache = EmbeddingCache('test-model', cache_dir=str(tmp_path), max_mb=8 / 2**20)  # two 1-dim slots
+    cache.put_many(['a', 'b'], np.array([[1.0], [2.0]]))
+    cache.get_many(['a'])
+    cache.put_many(['c'], np.array([[3.0]]))
+
+    found, missing = cache.get_many(['a', 'b', 'c'])
+    assert missing == [1]
+    assert found[0].tolist() == [1.0] and found[2].tolist() == [3.0]
+
+def test_originality_keeps_first_of_near_duplicates():
+    """Test that only later near-copies are dropped by the originality gate."""
+    with patch('openai.OpenAI'):
+        from agents.compliance_editor import ComplianceEditor, Screening
+        editor = ComplianceEditor(use_history=False)
+
+    story = 'I found a wallet on the train and returned it to a stranger.'
+    scripts = [
+        {'title': 'first', 'story': story},
+        {'title': 'copy', 'story': story + ' The end.'},
+        {'title': 'other', 'story': 'My cat learned to open the fridge while we slept.'},
+    ]
+    kept = editor._filter(Screening(scripts), range(len(scripts)),
+                          moderate=lambda batch: [True] * len(batch),
+                          score=lambda batch: [90] * len(batch))
+    assert [scripts[i]['title'] for i in kept] == ['first', 'other']
+
+def test_originality_index_rejects_republished_story(tmp_path):
+    """Test that the history index flags near-copies of published stories only."""
+    from agents.originality_index import OriginalityIndex
+
+    index = OriginalityIndex(str(tmp_path / 'history.sqlite3'))
+    story = 'My roommate kept eating my leftovers, so I labelled them with fake allergy warnings.'
+    index.add('old1', story)
+    index.add('old2', 'I accidentally sent my resignation letter to the whole company on Monday.')
+
+    assert index.find_duplicate(story.replace('roommate', 'flatmate')) == 'old1'
+    assert index.find_duplicate('A raccoon stole my car keys and I had to chase it across the park.') is None
+    assert index.find_duplicate(story) is None  # published by this run: not its own duplicate
+
+    # A later run picks old1 again: its new story is checked against the old one, which is kept.
+    later = OriginalityIndex(str(tmp_path / 'history.sqlite3'))
+    assert later.find_duplicate(story) == 'old1'
+    later.add('old1', 'A completely different take on the leftovers saga, told from the fridge.')
+    assert len(later) == 3
+    assert later.find_duplicate(story.replace('roommate', 'flatmate')) == 'old1'
+
+def test_async_gates_keep_order_and_retry_rate_limits():
+    """Test that async compliance keeps script order and retries 429s."""
+    import asyncio
+    import openai
+    from unittest.mock import AsyncMock
+
+    scripts = [
+        {'id': str(i), 'title': f'story {i}', 'story': f'{i} ' + word * 20}
+        for i, word in enumerate(['apple ', 'zebra ', 'quartz '])
+    ]
+    rate_limited = openai.RateLimitError.__new__(openai.RateLimitError)
+    rate_limited.response = MagicMock(headers={'retry-after': '0'})
+
+    async def score(model, messages, max_tokens, temperature):
+        # Finish out of order so the test catches order-dependent gathering.
+        idx = int(messages[1]['content'].split('Story: "')[1][0])
+        await asyncio.sleep(0.01 * (3 - idx))
+        return MagicMock(choices=[MagicMock(message=MagicMock(content=str(90 - idx * 15)))])
+
+    with patch('openai.OpenAI'), patch('openai.AsyncOpenAI') as mock_async:
+        client = mock_async.return_value
+        client.close = AsyncMock()
+        moderation_calls = []
+
+        async def moderate(input):
+            moderation_calls.append(input)
+            if len(moderation_calls) == 1:
+                raise rate_limited
+            return MagicMock(results=[MagicMock(flagged=False) for _ in input])
+        client.moderations.create = AsyncMock(side_effect=moderate)
+        client.chat.completions.create = AsyncMock(side_effect=score)
+
+        from agents.compliance_editor import ComplianceEditor
+        editor = ComplianceEditor(use_history=False, concurrency=4)
+        kept = asyncio.run(editor._run_gates_async(scripts))
+
+    assert len(moderation_calls) == 2 and len(moderation_calls[1]) == 3
+    assert [s['id'] for s in kept] == ['0', '1']
+    assert [s['quality_score'] for s in kept] == [90, 75]
+
+def test_batched_moderation_maps_results_and_categories():
+    """Test that one moderation request covers all scripts and records why."""
+    with patch('openai.OpenAI') as mock_openai:
+        clean = MagicMock(flagged=False)
+        flagged = MagicMock(flagged=True, categories={'harassment': False, 'violence': True})
+        mock_openai.return_value.moderations.create.return_value = MagicMock(
+            results=[clean, flagged, clean]
+        )
+
+        from agents.compliance_editor import ComplianceEditor
+        editor = ComplianceEditor(use_history=False)
+        scripts = [{'id': i, 'story': f'story {i}'} for i in 'abc']
+        verdicts = editor.moderate_batch(scripts)
+
+    assert verdicts == [True, False, True]
+    assert mock_openai.return_value.moderations.create.call_count == 1
+    assert editor.rejections == {'b': ['violence']}
+
+def tts_response(*chunks, headers=None):
+    """A 200 from the timestamps endpoint: one JSON line per base64 audio chunk."""
+    import base64
+    ok = MagicMock(status_code=200, headers=headers if headers is not None else {'Content-Type': 'application/json'})
+    ok.iter_lines.side_effect = lambda: iter(
+        [json.dumps({'audio_base64': base64.b64encode(c).decode()}).encode() for c in chunks])
+    return ok
+
+def test_narrator_parallel_run_honors_retry_after(tmp_path, monkeypatch):
+    """Test that narration shares one session and retries 429s per Retry-After."""
+    monkeypatch.chdir(tmp_path)
+    scripts = [{'id': f'n{i}', 'title': f'Title {i}', 'story': 'Once upon a time.'} for i in range(4)]
+    with open('clean.json', 'w') as f:
+        json.dump(scripts, f)
+
+    from agents.narrator import Narrator
+    narrator = Narrator(concurrency=3)
+    limited = MagicMock(status_code=429, headers={'Retry-After': '0'})
+    ok = tts_response(b'\0\0' * 100)
+    responses = iter([limited] + [ok] * 4)
+    with patch.object(narrator.session, 'post', side_effect=lambda *a, **k: next(responses)) as post, \
+         patch('agents.narrator.time.sleep') as sleep:
+        narrator.run()
+
+    assert post.call_count == 5
+    assert post.call_args.kwargs['timeout'] == (10, 60.0)
+    sleep.assert_called_once_with(0.0)
+    with open('clean.json') as f:
+        assert [s['audio_file'] for s in json.load(f)] == [f'n{i}.wav' for i in range(4)]
+
+def test_narrator_streams_pcm_into_wav_atomically(tmp_path, monkeypatch):
+    """Test that PCM chunks become a valid WAV and failed streams leave nothing behind."""
+    import wave
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('audio')
+
+    from agents.narrator import Narrator
+    narrator = Narrator()
+    # Uneven chunk sizes, and no Content-Type: the endpoint decides the parser.
+    ok = tts_response(b'\1' * 5, b'\2' * 7, b'\3' * 4, headers={})
+    with patch.object(narrator.session, 'post', return_value=ok):
+        assert narrator.generate_audio('hello', 'abc.wav') == 'abc.wav'
+    with wave.open('audio/abc.wav') as wav:
+        assert wav.getframerate() == 24000 and wav.getnframes() == 8
+        assert wav.readframes(8) == b'\1' * 5 + b'\2' * 7 + b'\3' * 4
+
+    broken = MagicMock(status_code=200, headers={'Content-Type': 'text/event-stream'})
+    broken.iter_lines.side_effect = lambda: (_ for _ in ()).throw(IOError('connection reset'))
+    with patch.object(narrator.session, 'post', return_value=broken), \
+         patch('agents.narrator.time.sleep'):
+        assert narrator.generate_audio('hello', 'xyz.wav') is None
+    assert sorted(os.listdir('audio')) == ['abc.wav']
+
+def test_narrator_reuses_cached_audio(tmp_path, monkeypatch):
+    """Test that identical narration requests are served from the TTS cache."""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('audio')
+    from agents.narrator import Narrator
+
+    ok = tts_response(b'\0\0' * 10)
+    first = {'id': 'a1', 'title': 'Same', 'story': 'Same words.'}
+    rerun = dict(first, id='a2')
+
+    narrator = Narrator()
+    with patch.object(narrator.session, 'post', return_value=ok) as post:
+        assert narrator.narrate(first)
+        assert Narrator().narrate(rerun)
+    assert post.call_count == 1
+    assert rerun['audio_file'] == 'a2.wav' and os.path.exists('audio/a2.wav')
+    assert rerun['audio_cache'] == first['audio_cache']
+
+    # A silent fallback over a placed clip replaces the link instead of writing through it.
+    with open(first['audio_cache'], 'rb') as f:
+        cached = f.read()
+    narrator.write_silence('Same words.', 'a2.wav')
+    with open(first['audio_cache'], 'rb') as f:
+        assert f.read() == cached
+
+
+def test_audio_cache_evicts_least_recently_used(tmp_path):
+    """Test that the TTS cache deletes the oldest clips once over its size cap."""
+    from agents.audio_cache import AudioCache
+
+    cache = AudioCache(str(tmp_path / 'cache'), max_mb=2500 / 2**20)
+    for name in 'abc':
+        src = tmp_path / f'{name}.wav'
+        src.write_bytes(b'x' * 1000)
+        cache.store(name, str(src))
+        if name == 'b':
+            cache.lookup('a')
+
+    assert cache.lookup('b') is None
+    assert cache.lookup('a') and cache.lookup('c')
+
+def test_story_writer_concurrent_generation_keeps_hook_order():
+    """Test that parallel story generation shares one client and keeps order."""
+    import time
+    hooks = [
+        {'id': str(i), 'title': f'Hook {i}', 'subreddit': 'tifu', 'engagement_score': '0.5'}
+        for i in range(5)
+    ]
+
+    def complete(model, messages, max_tokens, temperature):
+        idx = int(messages[1]['content'].split('Hook ')[1][0])
+        time.sleep(0.02 * (5 - idx))  # later hooks finish first
+        return MagicMock(choices=[MagicMock(message=MagicMock(content=f'story for {idx}'))])
+
+    with patch('openai.OpenAI') as mock_openai:
+        mock_openai.return_value.chat.completions.create.side_effect = complete
+        from agents.story_writer import StoryWriter
+        writer = StoryWriter(workers=5)
+        with patch.object(StoryWriter, 'read_hooks', return_value=hooks), \
+             patch.object(StoryWriter, 'save_scripts') as save:
+            writer.run()
+
+    assert mock_openai.call_count == 1
+    assert [s['story'] for s in save.call_args.args[0]] == [f'story for {i}' for i in range(5)]
+
+def test_llm_cache_replays_quality_scores():
+    """Test that repeated quality prompts are answered from the LLM cache."""
+    with patch('openai.OpenAI') as mock_openai:
+        create = mock_openai.return_value.chat.completions.create
+        create.return_value = MagicMock(choices=[MagicMock(message=MagicMock(content='82'))])
+
+        from agents.compliance_editor import ComplianceEditor
+        script = {'story': 'A story worth scoring once.'}
+        assert ComplianceEditor(use_history=False).check_quality(script) == 82
+        assert ComplianceEditor(use_history=False).check_quality(script) == 82
+        assert create.call_count == 1
+
+        ComplianceEditor(use_history=False).check_quality(script, use_cache=False)
+        assert create.call_count == 2
+
+
+def test_llm_cache_ttl_and_size_eviction(tmp_path):
+    """Test that expired and least recently used responses are dropped."""
+    from agents.llm_cache import LLMCache
+
+    cache = LLMCache(str(tmp_path / 'llm.sqlite3'), max_mb=25 / 2**20)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, 'm', 'x' * 10)
+    assert cache.get('a') is None
+    assert cache.get('b') == 'x' * 10 and cache.get('c') == 'x' * 10
+
+    expired = LLMCache(str(tmp_path / 'llm.sqlite3'), ttl=1e-9)
+    assert expired.get('c') is None
+
+def test_pipeline_streams_until_video_target(tmp_path, monkeypatch):
+    """Test that the in-process pipeline stops writing once enough stories pass."""
+    monkeypatch.chdir(tmp_path)
+    with patch('praw.Reddit'), patch('openai.OpenAI'):
+        from agents.pipeline import Pipeline
+        pipeline = Pipeline(videos=2, workers=2)
+    assert pipeline.scheduler.max_in_flight == 4  # two writing, two queued and cancellable
+
+    hooks = [{'id': str(i), 'title': f'Hook {i}', 'subreddit': 'tifu'} for i in range(20)]
+    written = []
+
+    def build(hook):
+        written.append(hook['id'])
+        return {'id': hook['id'], 'title': hook['title'], 'story': f"story {hook['id']}"}
+
+    def narrate(script):
+        script['audio_file'] = f"{script['id']}.wav"
+        return True
+
+    with patch.object(pipeline, 'hooks', return_value=hooks), \
+         patch.object(pipeline.writer, 'build_script', side_effect=build), \
+         patch.object(pipeline.editor, 'screen_batch',
+                      side_effect=lambda batch, kept: [s['id'] != '0' for s in batch]), \
+         patch.object(pipeline.narrator, 'narrate', side_effect=narrate):
+        clean = pipeline.run()
+
+    assert [s['id'] for s in clean] == ['1', '2']
+    assert len(written) < len(hooks)
+    with open('clean.json') as f:
+        assert [s['audio_file'] for s in json.load(f)] == ['1.wav', '2.wav']
+
+def test_pipeline_skips_rejected_posts_and_replayed_verdicts_skip_the_scheduler(tmp_path, monkeypatch):
+    """Test that a rerun doesn't rewrite rejected posts or recount earlier verdicts."""
+    monkeypatch.chdir(tmp_path)
+    from agents.state_store import COMPLIANCE, REJECTED, STORY, StateStore
+    state = StateStore()
+    for pid, status in (('r', REJECTED), ('a', 'done')):
+        state.complete(pid, STORY, {'id': pid, 'title': pid, 'subreddit': 'tifu', 'story': f'story {pid}'})
+        state.complete(pid, COMPLIANCE, status=status, text=f'story {pid}')
+    with patch('praw.Reddit'), patch('openai.OpenAI'):
+        from agents.pipeline import Pipeline
+        pipeline = Pipeline(videos=1, workers=1)
+
+    replayed = list(pipeline.screened([[state.get('a'), state.get('r')]]))
+    assert [s['id'] for s in replayed] == ['a'] and pipeline.scheduler.run == {}
+
+    hooks = [{'id': pid, 'title': f'Hook {pid}', 'subreddit': 'tifu'} for pid in ('r', 'n')]
+    written = []
+
+    def build(hook):
+        written.append(hook['id'])
+        return dict(hook, story=f"story {hook['id']}")
+
+    with patch.object(pipeline, 'unfinished', return_value=[]), \
+         patch.object(pipeline, 'hooks', return_value=hooks), \
+         patch.object(pipeline.writer, 'build_script', side_effect=build), \
+         patch.object(pipeline.editor, '_filter', side_effect=lambda screening, idxs: list(idxs)), \
+         patch.object(pipeline.narrator, 'narrate', return_value=True):
+        pipeline.run()
+    assert written == ['n']
+    assert pipeline.scheduler.history == {'tifu': {'seen': 1, 'accepted': 1}}
+
+
+def test_render_driver_bundles_once_and_renders_each_story(tmp_path, monkeypatch):
+    """Test that the render driver bundles once and renders every clean script."""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('audio')
+    scripts = [{'id': f'v{i}', 'title': f'T{i}', 'story': 'S', 'audio_file': f'v{i}.wav'} for i in range(3)]
+    for s in scripts:
+        open(f"audio/{s['audio_file']}", 'wb').close()
+    with open('clean.json', 'w') as f:
+        json.dump(scripts + [{'id': 'mute', 'title': 'no audio', 'story': 'S'}], f)
+
+    from agents.render import RenderDriver
+    with patch('agents.render.subprocess.run', return_value=MagicMock(returncode=0)) as run:
+        manifest = RenderDriver(workers=2).run()
+
+    commands = [c.args[0] for c in run.call_args_list]
+    assert sum(cmd[:3] == ['npx', 'remotion', 'bundle'] for cmd in commands) == 1
+    assert sorted(cmd[5] for cmd in commands if cmd[2] == 'render') == ['out/v0.mp4', 'out/v1.mp4', 'out/v2.mp4']
+    assert [e['id'] for e in manifest] == ['v0', 'v1', 'v2'] and all(e['ok'] for e in manifest)
+    assert os.path.exists('out/manifest.json') and os.path.exists('public/audio/v1.wav')
+
+def test_narrator_records_audio_duration(tmp_path, monkeypatch):
+    """Test that narration stores the exact clip length for the render step."""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('audio')
+    from agents.narrator import Narrator
+
+    ok = tts_response(b'\0\0' * 36000)  # 1.5 s at 24 kHz
+    narrator = Narrator(use_cache=False)
+    script = {'id': 'd1', 'title': 'Timing', 'story': 'Short.'}
+    with patch.object(narrator.session, 'post', return_value=ok):
+        assert narrator.narrate(script)
+    assert script['audio_duration'] == 1.5
+
+def test_narrator_writes_word_timings_from_alignment(tmp_path, monkeypatch):
+    """Test that streamed character alignment becomes a cached word-timing sidecar."""
+    import base64
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('audio')
+    from agents.narrator import Narrator
+
+    def line(text, offset, audio):
+        return json.dumps({'audio_base64': base64.b64encode(audio).decode(), 'alignment': {
+            'characters': list(text),
+            'character_start_times_seconds': [offset + 0.1 * i for i in range(len(text))],
+            'character_end_times_seconds': [offset + 0.1 * (i + 1) for i in range(len(text))],
+        }}).encode()
+
+    ok = MagicMock(status_code=200, headers={'Content-Type': 'application/json'})
+    ok.iter_lines.side_effect = lambda: iter([line('Hi. ', 0, b'\0\0' * 5), b'', line('Go on.', 0.4, b'\0' * 9)])
+    script = {'id': 'w1', 'title': 'Hi', 'story': 'Go on.'}
+    narrator = Narrator()
+    with patch.object(narrator.session, 'post', return_value=ok) as post:
+        assert narrator.narrate(script)
+        rerun = dict(script, id='w2')
+        assert Narrator().narrate(rerun)
+    assert post.call_count == 1 and post.call_args.args[0].endswith('/stream/with-timestamps')
+
+    with open('audio/w1.timings.json') as f:
+        timings = json.load(f)
+    assert timings == {'words': ['Hi.', 'Go', 'on.'], 'start': [0.0, 0.4, 0.7], 'end': [0.3, 0.6, 1.0]}
+    with open('audio/w2.timings.json') as f:
+        assert json.load(f) == timings
+    assert rerun['timings_file'] == 'w2.timings.json'
+
+def test_narrator_estimates_timings_without_alignment(tmp_path, monkeypatch):
+    """Test that fallback narration still gets monotonic word timings."""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('audio')
+    from agents.narrator import Narrator
+
+    narrator = Narrator(allow_fallback=True, use_cache=False)
+    script = {'id': 'f1', 'title': 'Quiet', 'story': 'Nothing to hear here.'}
+    with open('audio/f1.timings.json', 'w') as f:  # left by an earlier clip of other text
+        json.dump({'words': ['Stale'], 'start': [0.0], 'end': [9.0]}, f)
+    with patch.object(narrator, 'generate_audio', return_value=None):
+        assert narrator.narrate(script)
+    with open(f"audio/{script['timings_file']}") as f:
+        timings = json.load(f)
+    assert timings['words'] == ['Quiet.', 'Nothing', 'to', 'hear', 'here.']
+    assert timings['start'] == sorted(timings['start']) and timings['end'][-1] == script['audio_duration']
+
+def test_state_store_resumes_each_stage_where_it_stopped(tmp_path, monkeypatch):
+    """Test that a rerun skips stories, verdicts and audio already committed."""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('audio')
+    from agents.state_store import StateStore, COMPLIANCE, NARRATION, SCOUT, STORY
+
+    with patch('openai.OpenAI') as mock_openai:
+        mock_openai.return_value.chat.completions.create.return_value = MagicMock(
+            choices=[MagicMock(message=MagicMock(content='fresh story'))])
+        from agents.story_writer import StoryWriter
+        from agents.compliance_editor import ComplianceEditor, Screening
+        from agents.narrator import Narrator
+
+        state = StateStore()
+        hooks = [{'id': f'p{i}', 'title': f'Post {i}', 'subreddit': 'tifu'} for i in range(3)]
+        state.upsert(hooks, SCOUT)
+        state.complete('p0', STORY, {'story': 'kept story'})
+        assert StoryWriter().build_script(hooks[0])['story'] == 'kept story'
+        assert StoryWriter().build_script(hooks[1])['story'] == 'fresh story'
+        assert StoryWriter().llm_cache is None  # sampled stories aren't replayed across days
+        assert mock_openai.return_value.chat.completions.create.call_count == 1
+
+        state.complete('p0', COMPLIANCE, {'quality_score': 90}, text='story p0')
+        state.complete('p1', COMPLIANCE, status='rejected', text='story p1')
+        scripts = [dict(h, story=f'story {h["id"]}') for h in hooks]
+        todo, accepted = ComplianceEditor(use_history=False).split_judged(scripts)
+        assert [s['id'] for s in todo] == ['p2'] and accepted == {'p0': 90}
+        # A story rewritten since its verdict (fallback, --no-state writer) is screened again.
+        rewritten = [dict(s, story=s['story'] + ' rewritten') for s in scripts]
+        todo, accepted = ComplianceEditor(use_history=False).split_judged(rewritten)
+        assert [s['id'] for s in todo] == ['p0', 'p1', 'p2'] and accepted == {}
+
+    assert [r['id'] for r in state.pending(NARRATION, after=COMPLIANCE)] == ['p0']
+    ok = tts_response(b'\0\0' * 10)
+    narrator = Narrator(use_cache=False)
+    with patch.object(narrator.session, 'post', return_value=ok) as post:
+        first = dict(scripts[0])
+        assert narrator.narrate(first)
+        again = dict(scripts[0])
+        assert Narrator(use_cache=False).narrate(again)
+    assert post.call_count == 1 and again['audio_file'] == first['audio_file']
+    assert state.pending(NARRATION, after=COMPLIANCE) == []
+    assert not state.finished('p0', NARRATION, 'Post 0. another story')
+
+    # p0 is published now: a later run that meets it again skips it instead of re-accepting it.
+    with patch('openai.OpenAI'):
+        editor = ComplianceEditor(use_history=False)
+    assert editor.split_judged(scripts) == ([scripts[2]], {})
+    assert not editor.screen(dict(scripts[0]), Screening())
+
+def test_incremental_scout_only_embeds_new_posts():
+    """Test that posts used on an earlier run are skipped before embedding; merely ranked ones are not."""
+    def post(pid):
+        return MagicMock(title=f'A long enough title {pid}', score=1, url='u', id=pid, stickied=False)
+
+    listings = {'tifu': ['a', 'b'], 'confession': ['c'], 'aita': []}
+    with patch('praw.Reddit') as mock_reddit, patch('openai.OpenAI') as mock_openai, \
+         patch.dict(os.environ, {'OPENAI_KEY': 'test'}):
+        mock_reddit.return_value.subreddit.side_effect = lambda sub: MagicMock(
+            hot=lambda limit: [post(pid) for pid in listings[sub]])
+        embedded = []
+
+        def fake_embeddings(model, input):
+            embedded.extend(input[1:])
+            return MagicMock(data=[MagicMock(embedding=[1.0, 0.0]) for _ in input])
+        mock_openai.return_value.embeddings.create.side_effect = fake_embeddings
+
+        from agents.trend_scout import TrendScout
+        scout = TrendScout(incremental=True, use_cache=False)
+        first = scout.rank(scout.fetch_posts())
+        scout.seen.mark_used(['a', 'b'])  # c was ranked but its story never got a verdict
+        listings['aita'] = ['d']
+        second = scout.rank(scout.fetch_posts())
+
+    assert [p['id'] for p in first] == ['a', 'b', 'c']
+    assert [p['id'] for p in second] == ['c', 'd']
+    assert embedded == [f'A long enough title {pid}' for pid in 'abccd']
+    assert len(scout.seen) == 4
+
+def test_rank_cascade_embeds_only_local_top_k():
+    """Test that the local scorer limits embedding to its top-K titles."""
+    posts = [{'id': str(i), 'title': f'My boring lunch number {i}', 'score': 1} for i in range(30)]
+    posts[17] = {'id': 'hot', 'title': 'Shocking twist: the dramatic reveal changed my life', 'score': 5000}
+    with patch('praw.Reddit'), patch('openai.OpenAI') as mock_openai, \
+         patch.dict(os.environ, {'OPENAI_KEY': 'test'}):
+        mock_openai.return_value.embeddings.create.side_effect = lambda model, input: MagicMock(
+            data=[MagicMock(embedding=[1.0, float(i)]) for i in range(len(input))])
+        from agents.trend_scout import TrendScout, cascade_report, cheap_scores
+        import numpy as np
+        ranked = TrendScout(use_cache=False, top_k=5).rank(posts)
+
+    sent = mock_openai.return_value.embeddings.create.call_args.kwargs['input']
+    assert len(sent) == 6 and posts[17]['title'] in sent
+    scores = [p['engagement_score'] for p in ranked]
+    assert len(ranked) == 30 and None not in scores  # hooks.csv keeps a full score column
+    assert scores == sorted(scores, reverse=True)
+    assert int(np.argmax(cheap_scores(posts))) == 17
+
+    full = np.arange(10, dtype=float)
+    assert cascade_report(full, full, 3) == {'posts': 10, 'k': 3, 'recall_at_k': 1.0, 'spearman': 1.0}
+    assert cascade_report(-full, full, 3)['recall_at_k'] == 0.0
+
+def test_filter_planner_exits_early_without_changing_verdicts(tmp_path):
+    """Test that planned checks skip remote calls but keep the keep-first rule."""
+    story = 'I found a wallet on the train and returned it to a stranger who cried.'
+    scripts = [
+        {'id': 'bad', 'title': 'flagged', 'story': story},
+        {'id': 'copy', 'title': 'copy', 'story': story + ' The end.'},
+        {'id': 'tiny', 'title': 'tiny', 'story': 'Too short.'},
+        {'id': 'other', 'title': 'other', 'story': 'My cat learned to open the fridge while we all slept soundly.'},
+    ]
+    moderated = []
+
+    def moderate(input):
+        moderated.extend(input)
+        return MagicMock(results=[MagicMock(flagged=text == story, categories={'violence': text == story})
+                                  for text in input])
+
+    with patch('openai.OpenAI') as mock_openai:
+        client = mock_openai.return_value
+        client.moderations.create.side_effect = moderate
+        client.chat.completions.create.return_value = MagicMock(choices=[MagicMock(message=MagicMock(
+            content='{"scores": [{"id": 1, "score": 85}, {"id": 2, "score": 85}]}'))])
+        from agents.compliance_editor import ComplianceEditor
+        editor = ComplianceEditor(use_history=False, use_cache=False, use_state=False)
+        kept = editor._run_gates(scripts)
+        editor.report_checks()
+
+    # 'copy' survives: the story it copies failed moderation, as before.
+    assert [s['id'] for s in kept] == ['copy', 'other']
+    assert 'Too short.' not in moderated and len(moderated) == 3
+    assert client.chat.completions.create.call_count == 1
+    assert editor.planner.order()[:2] == ['length', 'readability']
+    with open(tmp_path / 'filter_stats.json') as f:
+        stats = json.load(f)
+    assert stats['length'] == {'seen': 4, 'rejected': 1, 'seconds': stats['length']['seconds']}
+    assert stats['moderation']['seen'] == 3 and stats['moderation']['rejected'] == 1
+
+    # The sync gates are plain calls: no event loop per run or per streamed script.
+    with patch('asyncio.run') as loop:
+        editor._run_gates(scripts[:1])
+    assert not loop.called
+
+def test_streamed_scripts_arriving_together_share_one_moderation_request():
+    """Test that screen_batch screens a group in one pass and keeps per-script verdicts."""
+    stories = ['My uncle spent the whole night rebuilding the garden shed alone.',
+               'Our dog ate a birthday cake and then hid under the stairs for a day.',
+               'The landlord changed every lock while we were away on holiday.']
+    scripts = [{'id': f's{i}', 'title': f't{i}', 'story': story} for i, story in enumerate(stories)]
+    with patch('openai.OpenAI') as mock_openai:
+        client = mock_openai.return_value
+        client.moderations.create.side_effect = lambda input: MagicMock(
+            results=[MagicMock(flagged='landlord' in t, categories={'hate': 'landlord' in t}) for t in input])
+        client.chat.completions.create.return_value = MagicMock(choices=[MagicMock(message=MagicMock(
+            content='{"scores": [{"id": 1, "score": 90}, {"id": 2, "score": 40}]}'))])
+        from agents.compliance_editor import ComplianceEditor, Screening
+        editor = ComplianceEditor(use_history=False, use_cache=False, use_state=False)
+        screening = Screening()
+        verdicts = editor.screen_batch(scripts[:2], screening) + editor.screen_batch(scripts[2:], screening)
+
+    assert verdicts == [True, False, False]
+    assert client.moderations.create.call_count == 2  # one per arriving group, not per script
+
+def test_batched_quality_scoring_falls_back_per_story_for_bad_entries():
+    """Test that stories are scored ten to a request and only bad entries retried."""
+    scripts = [{'id': str(i), 'title': f't{i}', 'story': f'Story number {i} about my neighbour.'} for i in range(12)]
+
+    def complete(model, messages, max_tokens, temperature, response_format=None):
+        content = messages[1]['content']
+        if response_format is None:  # per-story fallback
+            return MagicMock(choices=[MagicMock(message=MagicMock(content='71'))])
+        ids = [int(part.split('"')[0]) for part in content.split('<story id="')[1:]]
+        items = [{'id': n, 'score': 'n/a' if n == 3 else 80 + n} for n in ids]
+        return MagicMock(choices=[MagicMock(message=MagicMock(content=json.dumps({'scores': items})))])
+
+    with patch('openai.OpenAI') as mock_openai:
+        create = mock_openai.return_value.chat.completions.create
+        create.side_effect = complete
+        from agents.compliance_editor import ComplianceEditor
+        editor = ComplianceEditor(use_history=False, use_state=False)
+        scores = editor.score_batch(scripts)
+        assert create.call_count == 3  # two batches (10 + 2), story 3 retried alone
+        assert scores[:3] == [81, 82, 71] and scores[10:] == [81, 82]
+
+        create.reset_mock()
+        assert editor.score_batch(scripts[:2]) == [81, 82]
+        assert editor.score_batch(scripts[:2]) == [81, 82]
+        assert create.call_count == 1  # fully parsed batches replay from the LLM cache
+
+    assert ComplianceEditor.parse_batch_scores('{"scores": [{"id": 2, "score": 140}]}', 3) == [None, 100, None]
+    assert ComplianceEditor.parse_batch_scores('not json', 2) == [None, None]
+
+
+def test_work_queue_leases_retries_and_merges(tmp_path):
+    """Expired leases are retried, shards split by post id, and shard queues merge."""
+    from agents.work_queue import QueueWorker, WorkQueue, merge, shard_of
+
+    hooks = [{'id': f'p{i}', 'title': f'Title {i}', 'engagement_score': str(i)} for i in range(6)]
+    queues = [WorkQueue(str(tmp_path / f'shard{n}.sqlite3'), lease_seconds=60) for n in range(2)]
+    assert sum(q.seed(hooks, n, 2) for n, q in enumerate(queues)) == 6
+    assert queues[0].seed(hooks, 0, 2) == 0  # re-seeding is a no-op
+
+    # A worker that dies mid-job: its lease expires and the job is handed out again.
+    job = queues[0].lease('dead', shard=0, shards=2)
+    assert shard_of(job['post_id'], 2) == 0
+    assert not queues[0].heartbeat(dict(job, owner='someone-else'))
+    queues[0].db.execute("UPDATE jobs SET lease_expires = 0")
+    retried = queues[0].lease('alive', shard=0, shards=2)
+    assert (retried['post_id'], retried['attempts']) == (job['post_id'], 2)
+    assert not queues[0].complete(job, {'stale': True})  # the dead worker lost its lease
+    queues[0].fail(retried, 'boom')
+
+    def run(queue, n):
+        worker = QueueWorker(queue, shard=n, shards=2)
+        worker.write = lambda hook: (dict(hook, story='s'), dict(hook, story='s'))
+        worker.comply = lambda s: (s, s) if s['id'] != 'p2' else ({'id': s['id'], 'accepted': False}, None)
+        worker.narrate = lambda s: (dict(s, audio_file=f"{s['id']}.wav"),) * 2
+        worker.render = lambda s: ({'id': s['id'], 'ok': True}, None)
+        worker.handlers = {'write': worker.write, 'comply': worker.comply,
+                           'narrate': worker.narrate, 'render': worker.render}
+        return worker.run(f'w{n}')
+
+    for n, queue in enumerate(queues):
+        run(queue, n)
+        assert not queue.counts(n, 2).get('write', {}).get('pending')
+
+    scripts = merge([q.path for q in queues], str(tmp_path / 'clean.json'),
+                    str(tmp_path / 'manifest.json'))
+    assert [s['id'] for s in scripts] == ['p5', 'p4', 'p3', 'p1', 'p0']
+    with open(tmp_path / 'manifest.json') as f:
+        assert sorted(e['id'] for e in json.load(f)) == ['p0', 'p1', 'p3', 'p4', 'p5']
+
+
+def test_work_queue_scopes_targets_and_results_to_the_batch(tmp_path):
+    """A second day's batch on the same queue starts fresh and merges only its own stories."""
+    from agents.work_queue import QueueWorker, WorkQueue, merge
+
+    path = str(tmp_path / 'queue.sqlite3')
+
+    def run_day(batch, ids):
+        queue = WorkQueue(path)
+        assert queue.seed([{'id': i, 'title': i} for i in ids], batch=batch) == len(ids)
+        worker = QueueWorker(WorkQueue(path), stages=['write', 'comply', 'narrate'], videos=2)
+        worker.write = lambda hook: (dict(hook, story='s'),) * 2
+        worker.comply = lambda s: (s, s)
+        worker.narrate = lambda s: (s, s)
+        worker.handlers = {'write': worker.write, 'comply': worker.comply, 'narrate': worker.narrate}
+        worker.run('w')
+        return merge([path], str(tmp_path / 'clean.json'), str(tmp_path / 'manifest.json'))
+
+    assert [s['id'] for s in run_day('2026-01-01', ['a', 'b', 'c'])] == ['a', 'b']
+    assert [s['id'] for s in run_day('2026-01-02', ['d', 'e', 'a'])] == ['d', 'e']
+    assert WorkQueue(path, batch='2026-01-01').counts()['narrate'] == {'done': 2}
+
+
+def test_merge_state_folds_shard_caches_together(tmp_path):
+    """Each shard's published stories, verdicts, seen posts and stats survive the merge."""
+    import shutil
+    from agents.fileio import atomic_write_json, read_json
+    from agents.originality_index import OriginalityIndex
+    from agents.seen_posts import SeenPosts
+    from agents.state_store import COMPLIANCE, StateStore
+    from agents.work_queue import merge_state
+
+    base = tmp_path / 'base'
+    seen = SeenPosts(str(base / 'seen.sqlite3'))
+    seen.observe([{'id': i, 'subreddit': 'tifu'} for i in ('a', 'b', 'old')])
+    seen.close()
+    state = StateStore(str(base / 'pipeline.sqlite3'))
+    state.upsert([{'id': 'a'}, {'id': 'b'}])
+    state.close()  # closed stores have no -wal/-shm files left to race copytree
+    atomic_write_json(str(base / 'filter_stats.json'), {'quality': {'seen': 10, 'rejected': 4}})
+
+    stories = {'a': 'My neighbour mowed a giant question mark into his lawn and waited for me to ask.',
+               'b': 'The wedding cake collapsed and the groom blamed the dog, who looked guilty anyway.'}
+    shards = []
+    for n, post in enumerate(('a', 'b')):
+        shard = tmp_path / f'shard{n}'
+        shutil.copytree(base, shard)
+        index = OriginalityIndex(str(shard / 'originality.sqlite3'))
+        index.add(post, stories[post])
+        seen = SeenPosts(str(shard / 'seen.sqlite3'))
+        seen.mark_used([post])
+        state = StateStore(str(shard / 'pipeline.sqlite3'))
+        state.complete(post, COMPLIANCE, {'quality_score': 80 + n})
+        for store in (index, seen, state):
+            store.close()
+        atomic_write_json(str(shard / 'filter_stats.json'), {'quality': {'seen': 12, 'rejected': 5 + n}})
+        shards.append(str(shard))
+
+    merge_state(shards, str(base))
+    index = OriginalityIndex(str(base / 'originality.sqlite3'))
+    assert len(index) == 2 and index.find_duplicate(stories['b']) == 'b'
+    seen = SeenPosts(str(base / 'seen.sqlite3'))
+    assert [p['id'] for p in seen.observe([{'id': i, 'subreddit': 'tifu'} for i in 'abc'])] == ['c']
+    state = StateStore(str(base / 'pipeline.sqlite3'))
+    assert [state.get(p)['quality_score'] for p in 'ab'] == [80, 81]
+    assert state.status('b', COMPLIANCE) == 'done'
+    assert read_json(str(base / 'filter_stats.json')) == {'quality': {'seen': 14, 'rejected': 7}}
+
+
+def test_metrics_report_and_textfile(tmp_path):
+    """Instrumented calls land in the JSON run report and the Prometheus textfile."""
+    from agents import metrics
+    from agents.llm_cache import LLMCache, cached_chat
+
+    client = MagicMock()
+    client.chat.completions.create.return_value.choices = [MagicMock(message=MagicMock(content='hi'))]
+    client.chat.completions.create.return_value.usage = MagicMock(prompt_tokens=7, completion_tokens=2)
+    request = dict(model='gpt-4o-mini', messages=[{'role': 'user', 'content': 'x'}])
+
+    assert metrics.span('noop') is metrics.span('other')  # disabled: one shared no-op
+    metrics.configure(str(tmp_path / 'metrics'), run='test')
+    try:
+        cache = LLMCache()
+        with metrics.stage('story'):
+            cached_chat(client, cache, **request)
+            cached_chat(client, cache, **request)
+        path = metrics.export()
+    finally:
+        metrics.configure(None)
+
+    with open(path) as f:
+        report = json.load(f)
+    counters = {(c['name'], c.get('result') or c.get('kind') or c.get('op')): c['value']
+                for c in report['counters']}
+    assert counters[('requests', 'chat')] == 1
+    assert counters[('cache_lookups', 'hit')] == 1 and counters[('cache_lookups', 'miss')] == 1
+    assert counters[('tokens', 'prompt')] == 7
+    stage, call = (next(s for s in report['spans'] if s['name'] == n) for n in ('stage', 'call'))
+    assert call['parent'] == stage['id'] and call['provider'] == 'openai'
+
+    prom = (tmp_path / 'metrics' / 'test.prom').read_text()
+    assert 'factory_requests_total{run="test",op="chat",provider="openai"} 1' in prom
+    assert 'factory_call_seconds_count{run="test",op="chat",provider="openai",status="ok"} 1' in prom
+
+
+def test_governed_openai_client_counts_sdk_retries_and_429s(tmp_path):
+    """Sync callers leave retries to the SDK; the governor's hooks still count them."""
+    import openai
+    from agents import metrics
+    from agents.quota import governor
+    from bench.stubs import OpenAIStub, StubConfig
+
+    server = OpenAIStub(StubConfig(latency=0, jitter=0, rate_429=0.5), seed=1).start()
+    metrics.configure(str(tmp_path / 'metrics'), run='test')
+    try:
+        client = governor().openai_client(api_key='stub', base_url=server.url + '/v1', max_retries=20)
+        with patch.object(openai.OpenAI, '_calculate_retry_timeout', return_value=0):
+            for i in range(5):
+                client.moderations.create(input=f'story {i}')
+        path = metrics.export()
+    finally:
+        metrics.configure(None)
+        server.stop()
+
+    with open(path) as f:
+        counters = {c['name']: c['value'] for c in json.load(f)['counters'] if c.get('op') == 'moderation'}
+    assert server.limited['moderations'] > 0
+    assert counters['rate_limited'] == counters['retries'] == server.limited['moderations']
+
+
+def test_narrator_against_elevenlabs_stub(tmp_path, monkeypatch):
+    """The benchmark stub speaks the timestamps endpoint well enough to narrate, 429s included."""
+    from bench.stubs import ElevenLabsStub, StubConfig
+    from agents.narrator import Narrator
+
+    server = ElevenLabsStub(StubConfig(latency=0, jitter=0, rate_429=0.5, audio_seconds=0.5)).start()
+    try:
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setenv('E11_KEY', 'stub')
+        monkeypatch.setenv('E11_VOICE', 'stub')
+        monkeypatch.setenv('E11_BASE_URL', server.url + '/v1')
+        os.makedirs('audio')
+        with patch('agents.narrator.time.sleep'):
+            narrator = Narrator(use_cache=False, use_state=False)
+            saved = narrator.generate_audio('Hello there.', 'a.wav', max_retries=10)
+    finally:
+        server.stop()
+
+    assert saved == 'a.wav'
+    assert server.requests == {'tts': 1}
+    with open(tmp_path / 'audio' / 'a.timings.json') as f:
+        assert json.load(f)['words'] == ['Hello', 'there.']
+
+
+def test_quota_governor_shares_budget_and_adapts(tmp_path):
+    """Two governors on one store share buckets; 429s pause, headers teach limits, 5xx trip the circuit."""
+    from agents.quota import CIRCUIT_FAILURES, LEARNED_SECONDS, CircuitOpen, QuotaGovernor
+
+    path = str(tmp_path / 'quota.sqlite3')
+    limits = {'openai': {'requests': 60, 'units': 600}}  # burst: 10 requests, 100 tokens
+    first, second = QuotaGovernor(path, limits), QuotaGovernor(path, limits)
+    assert [first.reserve('openai', 1) for _ in range(5)] == [0.0] * 5
+    assert [second.reserve('openai', 1) for _ in range(5)] == [0.0] * 5
+    assert first.reserve('openai', 1) > 0  # the other process spent the rest
+    assert QuotaGovernor(path, limits).reserve('openai', 1) > 0
+
+    pacer = QuotaGovernor(path, {'elevenlabs': {'requests': 6000}})
+    assert pacer.reserve('elevenlabs') == 0.0
+    pacer.observe('elevenlabs', 429, {'Retry-After': '30'})
+    assert 29 < second.reserve('elevenlabs') <= 30
+    assert pacer.db.execute("SELECT scale FROM providers WHERE provider = 'elevenlabs'").fetchone()[0] < 1
+
+    learner = QuotaGovernor(path, {'reddit': {'requests': 6000}})
+    learner.observe('reddit', 200, {'x-ratelimit-limit-requests': '600', 'x-ratelimit-remaining-requests': '0'})
+    assert learner.db.execute(
+        "SELECT per_min, level FROM buckets WHERE provider = 'reddit'").fetchone() == (600, 0)
+    assert learner.reserve('reddit') > 0
+    # The learned limit expires; a changed configured limit then applies to the cached store.
+    learner.db.execute("UPDATE buckets SET learned_at = learned_at - ? WHERE provider = 'reddit'",
+                       (LEARNED_SECONDS,))
+    lowered = QuotaGovernor(path, {'reddit': {'requests': 6}})
+    assert lowered.reserve('reddit') > 5  # 0.1 requests per second
+    assert QuotaGovernor(path, {'reddit': {'requests': 6000}}).reserve('reddit') < 0.1
+
+    models = QuotaGovernor(path, {'openai': {'requests': 6}})  # burst: 1 request per model
+    models.observe('openai:text-embedding-3-small', 429, {'Retry-After': '30'})
+    assert models.reserve('openai:gpt-4o-mini') == 0.0
+    assert models.reserve('openai:gpt-4o-mini') > 0
+    assert models.reserve('openai:text-embedding-3-small') > 29
+
+    breaker = QuotaGovernor(path, {'flaky': {'requests': 6000}})
+    for _ in range(CIRCUIT_FAILURES):
+        breaker.observe('flaky', 503)
+    with pytest.raises(CircuitOpen):
+        first.reserve('flaky')
+
+
+def test_reddit_listings_report_back_to_the_governor():
+    """Test that a throttled Reddit listing pauses the shared reddit budget."""
+    import prawcore
+    from agents.quota import QuotaGovernor, governor
+
+    assert QuotaGovernor.retry_delay({'Retry-After': '7'}, 3) == 7.0
+    assert 0 <= QuotaGovernor.retry_delay({}, 1) <= 2
+    throttled = MagicMock(status_code=429, headers={'Retry-After': '30'})
+    with patch('praw.Reddit') as mock_reddit, patch('openai.OpenAI'), \
+         patch.dict(os.environ, {'OPENAI_KEY': 'test'}):
+        mock_reddit.return_value.subreddit.return_value.hot.side_effect = \
+            prawcore.exceptions.TooManyRequests(throttled)
+        from agents.trend_scout import TrendScout
+        scout = TrendScout(use_cache=False)
+        with pytest.raises(prawcore.exceptions.TooManyRequests):
+            scout.fetch_subreddit('tifu')
+    assert 29 < governor().reserve('reddit') <= 30
+
+
+def test_yield_scheduler_sizes_pool_from_pass_rates(tmp_path):
+    """Test that the scheduler starts enough candidates for the target and learns per subreddit."""
+    from agents.filter_planner import Check, FilterPlanner
+    from agents.yield_scheduler import YieldScheduler, at_least
+
+    assert at_least([0.5, 0.5], 1) == pytest.approx(0.75)
+    assert at_least([0.5, 0.5], 2) == pytest.approx(0.25)
+    assert at_least([], 0) == 1.0
+
+    planner = FilterPlanner([Check('a', 0.1, 0.5), Check('b', 0.1, 0.0)])
+    scheduler = YieldScheduler(planner, confidence=0.9, max_in_flight=8)
+    assert scheduler.probability({'subreddit': 'tifu'}) == pytest.approx(0.5)
+    assert scheduler.to_start(1, [], [0.5] * 10) == 4  # 1 - 0.5**4 ≥ 0.9
+    assert scheduler.to_start(1, [0.5] * 4, [0.5] * 10) == 0
+    assert scheduler.surplus(0, [0.5] * 3) == 3
+    assert scheduler.to_start(5, [], [0.5] * 10) == 8  # capped by max_in_flight
+
+    for _ in range(10):
+        scheduler.record('tifu', True)
+    scheduler.save()
+    reloaded = YieldScheduler(planner)
+    assert reloaded.probability({'subreddit': 'tifu'}) == pytest.approx(0.75)
+    assert reloaded.probability({'subreddit': 'aita'}) == pytest.approx(0.5)
+
+
 def test_file_cleanup():
     """Clean up test files after tests."""
     test_files = ['hooks.csv', 'scripts.json', 'clean.json']
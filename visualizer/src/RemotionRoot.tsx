@@ -1,6 +1,24 @@
 import React from 'react';
-import {Composition} from 'remotion';
-import {StoryVideo} from './StoryVideo';
+import {CalculateMetadataFunction, Composition} from 'remotion';
+import {StoryVideo, StoryVideoProps} from './StoryVideo';
+
+const FPS = 30;
+const MAX_FRAMES = FPS * 170; // cap at 2m50s for shorts
+const TAIL_PAD_SECONDS = 1;
+
+// Length follows the narration (audioDuration, measured by the narrator)
+// plus a short tail; without it, fall back to the full cap.
+const calculateMetadata: CalculateMetadataFunction<StoryVideoProps> = ({props}) => {
+  if (!props.audioDuration) {
+    return {durationInFrames: MAX_FRAMES};
+  }
+  return {
+    durationInFrames: Math.min(
+      MAX_FRAMES,
+      Math.ceil((props.audioDuration + TAIL_PAD_SECONDS) * FPS),
+    ),
+  };
+};
 
 export const RemotionRoot: React.FC = () => {
   return (
@@ -8,13 +26,16 @@ export const RemotionRoot: React.FC = () => {
       <Composition
         id="StoryVideo"
         component={StoryVideo}
-        durationInFrames={30 * 170} // cap at 2m50s for shorts
-        fps={30}
+        durationInFrames={MAX_FRAMES}
+        calculateMetadata={calculateMetadata}
+        fps={FPS}
         width={1080}
         height={1920}
         defaultProps={{
           storyText: "",
-          audioFile: ""
+          audioFile: "",
+          audioDuration: 0,
+          captions: null
         }}
       />
     </>
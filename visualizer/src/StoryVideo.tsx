@@ -1,4 +1,4 @@
-import React from 'react';
+import React, {useMemo} from 'react';
 import {
   AbsoluteFill,
   Audio,
@@ -9,18 +9,100 @@ import {
 } from 'remotion';
 import {VideoBackground} from './VideoBackground';
 
-interface StoryVideoProps {
+// Parallel arrays written by the narrator: word i is spoken from start[i]
+// to end[i] seconds, sorted by start.
+export type Captions = {
+  words: string[];
+  start: number[];
+  end: number[];
+};
+
+export type StoryVideoProps = {
   storyText: string;
   audioFile: string;
-}
+  audioDuration?: number; // seconds; drives the composition length
+  captions?: Captions | null; // word timings; fixed pace when absent
+};
+
+const WORDS_PER_SECOND = 2.5;
+const FADE_FRAMES = 5;
 
-export const StoryVideo: React.FC<StoryVideoProps> = ({storyText, audioFile}) => {
+// Fallback timings when the narrator provided none.
+const fixedPaceCaptions = (storyText: string): Captions => {
+  const words = storyText.split(' ');
+  return {
+    words,
+    start: words.map((_, i) => i / WORDS_PER_SECOND),
+    end: words.map((_, i) => (i + 1) / WORDS_PER_SECOND),
+  };
+};
+
+// Index of the last word starting at or before t, or -1.
+const wordAt = (start: number[], t: number): number => {
+  let lo = 0;
+  let hi = start.length - 1;
+  let found = -1;
+  while (lo <= hi) {
+    const mid = (lo + hi) >> 1;
+    if (start[mid] <= t) {
+      found = mid;
+      lo = mid + 1;
+    } else {
+      hi = mid - 1;
+    }
+  }
+  return found;
+};
+
+export const StoryVideo: React.FC<StoryVideoProps> = ({
+  storyText,
+  audioFile,
+  captions,
+}) => {
   const frame = useCurrentFrame();
   const {fps} = useVideoConfig();
 
-  const words = storyText.split(' ');
-  const wordsPerSecond = 2.5;
-  const framesPerWord = fps / wordsPerSecond;
+  const timings = useMemo(
+    () => (captions && captions.words.length ? captions : fixedPaceCaptions(storyText)),
+    [captions, storyText],
+  );
+
+  // Only the word being spoken is laid out, so per-frame work is a binary
+  // search rather than an interpolate() per word in the story.
+  const i = wordAt(timings.start, frame / fps);
+  let word: React.ReactNode = null;
+  if (i >= 0) {
+    const start = timings.start[i] * fps;
+    // Hold each word until the next one starts, so short pauses don't blank
+    // the screen; the last word holds until its own end.
+    const end = Math.max(
+      start + 2,
+      i + 1 < timings.start.length ? timings.start[i + 1] * fps : timings.end[i] * fps,
+    );
+    const fade = Math.min(FADE_FRAMES, (end - start) / 3);
+    const opacity = interpolate(
+      frame,
+      [start, start + fade, end - fade, end],
+      [0, 1, 1, 0],
+      {extrapolateLeft: 'clamp', extrapolateRight: 'clamp'},
+    );
+    const scale = interpolate(frame, [start, start + fade, end], [0.8, 1, 1], {
+      extrapolateLeft: 'clamp',
+      extrapolateRight: 'clamp',
+    });
+    word = (
+      <span
+        key={i}
+        style={{
+          opacity,
+          transform: `scale(${scale})`,
+          display: 'inline-block',
+        }}
+      >
+        {timings.words[i]}
+      </span>
+    );
+  }
 
   return (
     <AbsoluteFill>
@@ -44,38 +126,7 @@ export const StoryVideo: React.FC<StoryVideoProps> = ({storyText, audioFile}) =>
             textShadow: '0 0 20px #000',
           }}
         >
-          {words.map((word, i) => {
-            const start = i * framesPerWord;
-            const end = (i + 1) * framesPerWord;
-            const opacity = interpolate(
-              frame,
-              [start, start + 5, end - 5, end],
-              [0, 1, 1, 0],
-              {
-                extrapolateLeft: 'clamp',
-                extrapolateRight: 'clamp',
-              },
-            );
-            const scale = interpolate(
-              frame,
-              [start, start + 5, end],
-              [0.8, 1, 1],
-              {extrapolateLeft: 'clamp', extrapolateRight: 'clamp'},
-            );
-            return (
-              <span
-                key={i}
-                style={{
-                  marginRight: '0.35em',
-                  opacity,
-                  transform: `scale(${scale})`,
-                  display: 'inline-block',
-                }}
-              >
-                {word}
-              </span>
-            );
-          })}
+          {word}
         </div>
       </AbsoluteFill>
     </AbsoluteFill>